@@ -0,0 +1,178 @@
+import argparse
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+# 📌 Spread-bewusste Ausführung aus gespeicherten Quotes statt pauschaler Slippage: Käufe zum Ask, Verkäufe zum
+# Bid, Stop-/Target-Exits um den halben Spread ungünstiger als das Level, dazu ein Impact-Term proportional zum
+# Anteil der Order an der angezeigten Größe (Durchlaufen des Orderbuchs). Die Zuordnung Kerze -> letzte Quote
+# (as-of) wird je Datensatz einmal vektorisiert berechnet; pro Trade bleiben Array-Zugriffe.
+QUOTE_COLUMNS = ("bid_price", "ask_price", "bid_size", "ask_size")
+DEFAULT_IMPACT = 1.0
+DEFAULT_MAX_AGE = "5min"
+
+
+def quotes_from_bars(df, what_to_show="BID_ASK", spread=0.01):
+    """
+    Quote-Spalten aus IB-Kerzen (z.B. über MarketDataService mit what_to_show="BID_ASK" geladen).
+
+    - BID_ASK: open = zeitgewichtetes Bid, close = zeitgewichtetes Ask (IB-Definition der Kerze)
+    - MIDPOINT: nur die Mitte ist bekannt, der Spread wird als fester Wert `spread` angenommen
+
+    Größen liefern IB-Kerzen nicht; der Impact nutzt dann das Volumen (falls vorhanden).
+    """
+    if what_to_show == "BID_ASK":
+        quotes = pd.DataFrame({"bid_price": df["open"], "ask_price": df["close"]}, index=df.index)
+    elif what_to_show == "MIDPOINT":
+        quotes = pd.DataFrame({"bid_price": df["close"] - spread / 2, "ask_price": df["close"] + spread / 2},
+                              index=df.index)
+    else:
+        raise ValueError(f"Unbekannte Datenart: {what_to_show}")
+    if "volume" in df:
+        quotes["volume"] = df["volume"]
+    return quotes
+
+
+def _bar_length(index):
+    """Kerzenlänge in Nanosekunden (kleinster positiver Abstand, wie Backtester._prepare_intrabar_index)."""
+    gaps = np.diff(index)
+    return gaps[gaps > 0].min() if gaps.size and (gaps > 0).any() else pd.Timedelta("5min").value
+
+
+class AlignedQuotes:
+    __slots__ = ("bid", "ask", "half_spread", "buy_impact", "sell_impact", "valid", "coverage")
+
+    def __init__(self, bid, ask, half_spread, buy_impact, sell_impact, valid):
+        """
+        Ausführungsdaten je Kerze (as-of Schlusszeit). Kerzen ohne gültige Quote tragen die pauschale Slippage
+        (Bid/Ask = close -/+ slippage, halber Spread = slippage, kein Impact); Umkehr-Exits handeln dort wie ohne
+        Fill-Modell zum Schlusskurs (siehe `valid`).
+
+        :param buy_impact: Preisaufschlag je gekaufter Stückzahl (Spread / Ask-Größe * Impact-Koeffizient)
+        :param sell_impact: Preisabschlag je verkaufter Stückzahl
+        :param valid: Boolesches Array "gültige Quote" je Kerze
+        """
+        self.bid = bid
+        self.ask = ask
+        self.half_spread = half_spread
+        self.buy_impact = buy_impact
+        self.sell_impact = sell_impact
+        self.valid = valid
+        self.coverage = float(valid.mean()) if len(valid) else 0.0  # Anteil der Kerzen mit gültiger Quote
+
+    def apply(self, base, buying, bar_index, shares):
+        """Ausführungspreis einer Order über `shares` Stück: Käufe teurer, Verkäufe billiger als `base`."""
+        if buying:
+            return base + self.buy_impact[bar_index] * shares
+        return base - self.sell_impact[bar_index] * shares
+
+
+class QuoteFillModel:
+    def __init__(self, quotes, impact=DEFAULT_IMPACT, max_age=DEFAULT_MAX_AGE):
+        """
+        Fill-Modell aus Quote-Daten für den Backtester (Parameter `fill_model`).
+
+        Die Quote zu einer Kerze ist die letzte mit Zeitstempel vor dem Schlusszeitpunkt der Kerze (Einstiege und
+        Umkehr-Exits handeln zum Schlusskurs). Impact: Preisaufschlag = impact * Spread * Stückzahl / Größe der
+        Gegenseite (ask_size für Käufe, bid_size für Verkäufe; ohne Größen das Volumen der Quote-Zeile, ohne
+        beides kein Impact).
+
+        :param quotes: DataFrame mit bid_price/ask_price (optional bid_size/ask_size bzw. volume), zeitlich sortiert
+                       (z.B. die Archiv-Ausgabe von process_market_data oder `quotes_from_bars`)
+        :param impact: Impact-Koeffizient (1.0 = eine Order in Höhe der angezeigten Größe kostet einen Spread mehr)
+        :param max_age: Ältere Quotes gelten als veraltet, die Kerze fällt auf die pauschale Slippage zurück
+        """
+        missing = [name for name in QUOTE_COLUMNS[:2] if name not in quotes]
+        if missing:
+            raise ValueError(f"Quote-Spalten fehlen: {missing}")
+        self.impact = impact
+        self.max_age = pd.Timedelta(max_age)
+        self.timezone = quotes.index.tz
+        self.times = quotes.index.asi8
+        self.bid = quotes["bid_price"].to_numpy(dtype=np.float64)
+        self.ask = quotes["ask_price"].to_numpy(dtype=np.float64)
+        fallback = quotes["volume"].to_numpy(dtype=np.float64) if "volume" in quotes else np.full(len(quotes), np.nan)
+        self.bid_depth = quotes["bid_size"].to_numpy(dtype=np.float64) if "bid_size" in quotes else fallback
+        self.ask_depth = quotes["ask_size"].to_numpy(dtype=np.float64) if "ask_size" in quotes else fallback
+        self._fingerprint = None
+        self._aligned = None   # (df_5min, slippage, AlignedQuotes) der letzten Zuordnung
+
+    def align(self, df_5min, slippage=0.0):
+        """
+        As-of-Zuordnung der Quotes zu allen Kerzen in einem searchsorted. Das Ergebnis wird für denselben
+        DataFrame wiederverwendet (Optimierungsläufe erzeugen viele Backtester auf denselben Daten).
+        """
+        cached = self._aligned
+        if cached is not None and cached[0] is df_5min and cached[1] == slippage:
+            return cached[2]
+        if (self.timezone is None) != (df_5min.index.tz is None):
+            raise ValueError("Quotes und Kerzen müssen beide mit oder beide ohne Zeitzone vorliegen")
+
+        index = df_5min.index.asi8
+        closes = index + _bar_length(index)
+        position = np.searchsorted(self.times, closes, side="left") - 1
+        row = np.maximum(position, 0)
+        bid, ask = self.bid[row], self.ask[row]
+        valid = (position >= 0) & (closes - self.times[row] <= self.max_age.value) & (ask >= bid)
+        close = df_5min["close"].to_numpy(dtype=np.float64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spread = ask - bid
+            buy_impact = np.where(valid & (self.ask_depth[row] > 0), self.impact * spread / self.ask_depth[row], 0.0)
+            sell_impact = np.where(valid & (self.bid_depth[row] > 0), self.impact * spread / self.bid_depth[row], 0.0)
+        aligned = AlignedQuotes(np.where(valid, bid, close - slippage), np.where(valid, ask, close + slippage),
+                                np.where(valid, spread / 2, slippage), buy_impact, sell_impact, valid)
+        self._aligned = (df_5min, slippage, aligned)
+        return aligned
+
+    def config(self):
+        """Einstellungen und Fingerabdruck der Quotes (für die Checkpoint-Konfiguration des Backtesters)."""
+        if self._fingerprint is None:
+            digest = hashlib.sha1()
+            for values in (self.times, self.bid, self.ask, self.bid_depth, self.ask_depth):
+                digest.update(np.ascontiguousarray(values).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return {"impact": self.impact, "max_age": str(self.max_age), "quotes": self._fingerprint}
+
+    def __getstate__(self):
+        # Die Zuordnung hält den DataFrame der Kerzen; Worker-Prozesse berechnen sie einmal selbst
+        return {**self.__dict__, "_aligned": None}
+
+
+def main(argv=None):
+    from backtester import Backtester
+    from MomentumBreakoutAgent import MomentumBreakoutAgent
+    from storage import load_frame
+
+    parser = argparse.ArgumentParser(description="Backtest mit pauschaler Slippage und mit Quote-Fills vergleichen")
+    parser.add_argument("--quotes", required=True, help="Datei mit Quote-Spalten oder IB-Kerzen (siehe --kind)")
+    parser.add_argument("--kind", choices=["quotes", "BID_ASK", "MIDPOINT"], default="quotes",
+                        help="quotes = Spalten bid_price/ask_price, sonst IB-Kerzen dieser Datenart")
+    parser.add_argument("--spread", type=float, default=0.01, help="Angenommener Spread für MIDPOINT")
+    parser.add_argument("--impact", type=float, default=DEFAULT_IMPACT)
+    parser.add_argument("--max-age", default=DEFAULT_MAX_AGE)
+    parser.add_argument("--results", default="optimization_results.csv")
+    parser.add_argument("--row", type=int, default=0, help="Zeile der Ergebnisdatei (nach --sort sortiert)")
+    parser.add_argument("--sort", default="sharpe_ratio", help="Spalte, nach der absteigend sortiert wird")
+    parser.add_argument("--data-5min", default="saved_data/SPY_train_5min.parquet")
+    parser.add_argument("--data-15min", default="saved_data/SPY_train_15min.parquet")
+    args = parser.parse_args(argv)
+
+    quotes = load_frame(args.quotes)
+    if args.kind != "quotes":
+        quotes = quotes_from_bars(quotes, args.kind, args.spread)
+    fill_model = QuoteFillModel(quotes, args.impact, args.max_age)
+
+    df_results = pd.read_csv(args.results).sort_values(args.sort, ascending=False)
+    agent_params = {name: value for name, value in df_results.iloc[args.row].items()
+                    if name in MomentumBreakoutAgent.__init__.__code__.co_varnames}
+    df_5min, df_15min = load_frame(args.data_5min), load_frame(args.data_15min)
+    for name, model in (("Slippage", None), ("Quotes", fill_model)):
+        backtester = Backtester(MomentumBreakoutAgent(**agent_params), df_5min, df_15min, fill_model=model)
+        print(f"📊 {name}: {backtester.run_backtest()}")
+    print(f"🔎 Kerzen mit gültiger Quote: {fill_model.align(df_5min, backtester.slippage).coverage * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,142 @@
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import queue
+import threading
 import time
-from ib_insync import IB, Stock
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from numpy.lib.stride_tricks import sliding_window_view
+from profiling import profiler
+from storage import DEFAULT_FORMAT, FrameWriter, file_extension, load_frame, save_frame
+
+# Maximale Anzahl wartender Elemente zwischen zwei Pipeline-Stufen (Backpressure)
+PIPELINE_QUEUE_SIZE = 2
+_END_OF_STREAM = object()
+
+# Vorlauf (Zeilen) für fensterbasierte Indikatoren im Blockbetrieb; längste Abhängigkeit: ADX mit 2 * 14 + 1 Zeilen
+INDICATOR_WARMUP = 64
+# Standard-Blockgröße (1-Min-Zeilen) für die blockweise Verarbeitung
+DEFAULT_CHUNK_ROWS = 500_000
+
+
+def _rolling_mean(series, window):
+    """
+    Gleitender Mittelwert (wie rolling(window).mean()) als Summe je Fenster. Das Ergebnis hängt nur von den
+    Werten im Fenster ab, nicht von der Vorgeschichte - blockweise und vollständig gerechnet ist es bitgleich.
+    """
+    values = series.to_numpy(dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        result[window - 1:] = sliding_window_view(values, window).sum(axis=1) / window
+    return pd.Series(result, index=series.index)
+
+
+def _ema(close, span, seed=None):
+    """
+    EMA (adjust=False). Mit `seed` (ungerundeter EMA-Wert der Zeile vor `close`) wird die Rekursion exakt
+    fortgesetzt, als wäre die Vorgeschichte mitgerechnet worden.
+    """
+    if seed is None:
+        return close.ewm(span=span, adjust=False).mean()
+    seeded = pd.Series(np.concatenate(([seed], close.to_numpy(dtype=np.float64))))
+    return pd.Series(seeded.ewm(span=span, adjust=False).mean().to_numpy()[1:], index=close.index)
+
+
+class _PipelineStage:
+    def __init__(self, func, maxsize=PIPELINE_QUEUE_SIZE, name="pipeline"):
+        """
+        Hintergrund-Thread, der Elemente aus einer begrenzten Queue mit `func(*item)` verarbeitet.
+        `put` blockiert, solange die Queue voll ist; `close` wartet auf das Ende und reicht Fehler
+        des Threads weiter. Die Ergebnisse stehen danach in `results` (in Eingangsreihenfolge).
+        """
+        self.func = func
+        self.results = []
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._error = None
+        self._thread = threading.Thread(target=self._work, name=name, daemon=True)
+        self._thread.start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _END_OF_STREAM:
+                return
+            if self._error is None:
+                try:
+                    self.results.append(self.func(*item))
+                except Exception as e:
+                    self._error = e
+
+    def put(self, *item):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(item)
+
+    def close(self):
+        self._queue.put(_END_OF_STREAM)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._queue.put(_END_OF_STREAM)
+        return False
 
 
 class MarketDataFetcher:
-    def __init__(self, symbol, days, train_ratio):
+    def __init__(self, symbol, days, train_ratio, save_dir="saved_data", data_format=DEFAULT_FORMAT,
+                 data_service=None):
+        """
+        :param data_format: Speicherformat der Ausgabedateien (siehe storage.FORMATS)
+        :param data_service: Adresse eines laufenden MarketDataService; None = eigene IB-Verbindung (clientId=1)
+        """
         self.symbol = symbol
         self.days = days
         self.train_ratio = train_ratio
-        self.ib = IB()
-
-    def process_and_save_data(self):
-        print("🔄 Connecting to IBKR API...")
-        self.ib.connect('127.0.0.1', 7497, clientId=1)
+        self.save_dir = save_dir
+        self.data_format = data_format
+        self.data_service = data_service
+        self.ib = None  # IB-Verbindung, wird erst beim Download angelegt (ib_insync nur für den Online-Abruf nötig)
+
+    def process_and_save_data(self, pipelined=False):
+        """
+        Lädt, verarbeitet und speichert die Daten.
+
+        :param pipelined: Überlappt Download, Parsing, Indikatorberechnung und Schreiben über begrenzte Queues
+        """
+        if self.data_service:
+            from MarketDataService import MarketDataClient
+
+            print(f"🔄 Connecting to market data service ({self.data_service})...")
+            self.ib = self.ib or MarketDataClient(self.data_service)
+        else:
+            from ib_insync import IB
+
+            print("🔄 Connecting to IBKR API...")
+            self.ib = self.ib or IB()
+            self.ib.connect('127.0.0.1', 7497, clientId=1)
         print("✅ Connected successfully!")
 
         # 1-Minuten-Daten abrufen (30-Tage-Blöcke)
-        df_1min = self._fetch_1min_data_in_chunks()
+        df_1min = self._fetch_1min_data_in_chunks(pipelined)
+        self.process_data(df_1min, pipelined)
+
+        print("✅ Data processing complete!")
+
+    def process_data(self, df_1min, pipelined=False):
+        """ Resampling, Indikatoren, Synchronisierung, Train-Test-Split und Speichern von 1-Minuten-Rohdaten """
+        if pipelined:
+            return self._process_data_pipelined(df_1min)
+
         df_5min = self._resample_data(df_1min, '5T')
         df_15min = self._resample_data(df_1min, '15T')
 
@@ -51,14 +169,128 @@ class MarketDataFetcher:
         self._save_data(df_5min_test, "test_5min")
         self._save_data(df_15min_test, "test_15min")
 
-        print("✅ Data processing complete!")
-
-    def _fetch_1min_data_in_chunks(self):
-        """ Lädt 1-Minuten-Daten in 30-Tage-Blöcken und fügt sie zusammen. """
-        contract = Stock(self.symbol, 'SMART', 'USD')
-        self.ib.qualifyContracts(contract)
+    def _process_data_pipelined(self, df_1min):
+        """
+        Wie `process_data`, aber überlappend: 5- und 15-Min-Resampling laufen parallel, danach die Indikatoren
+        aller drei Zeitebenen. Sobald die 15-Min-Daten (Referenz für Synchronisierung und Split) fertig sind,
+        werden fertige Zeitebenen im Hintergrund geschrieben, während die übrigen noch berechnet werden.
+        Die geschriebenen Dateien sind identisch zum sequentiellen Pfad.
+        """
+        with ThreadPoolExecutor(max_workers=3) as pool, \
+                _PipelineStage(self._save_data, name="fetch-writer") as writer:
+            resampled = [pool.submit(self._resample_data, df_1min, timeframe) for timeframe in ('5T', '15T')]
+            df_5min, df_15min = (future.result() for future in resampled)
+
+            # 1-Min-Indikatoren erst nach dem Resampling (sie ergänzen df_1min um Spalten)
+            indicators_1min = pool.submit(self._calculate_indicators, df_1min)
+            indicators_5min = pool.submit(self._calculate_indicators, df_5min)
+            df_15min = self._calculate_indicators(df_15min).iloc[50:]
+
+            first_timestamp = df_15min.index[0]
+            train_timestamp = df_15min.index[int(len(df_15min) * self.train_ratio)]
+            for timeframe, df in (("15min", df_15min), ("5min", indicators_5min), ("1min", indicators_1min)):
+                if timeframe != "15min":
+                    df = df.result()
+                    df = df[df.index >= first_timestamp]
+                writer.put(df[df.index < train_timestamp], f"train_{timeframe}")
+                writer.put(df[df.index >= train_timestamp], f"test_{timeframe}")
+
+    def process_parquet(self, path, chunk_rows=None):
+        """
+        Verarbeitet gespeicherte 1-Minuten-Rohdaten (zeitlich sortiert) wie `process_data`.
+
+        :param chunk_rows: None = vollständig im Speicher; sonst blockweise mit dieser Anzahl Zeilen je Block.
+                           Der Speicherbedarf hängt dann nur von der Blockgröße ab, die Ergebnisse sind bitgleich.
+        """
+        if chunk_rows is None:
+            return self.process_data(load_frame(path))
+        return self._process_parquet_chunked(path, chunk_rows)
+
+    def _iter_1min_chunks(self, path, chunk_rows, columns=None):
+        """
+        Liest die Rohdaten blockweise und liefert nur vollständige 15-Min-Intervalle; die Zeilen des letzten,
+        evtl. unvollständigen Intervalls werden in den nächsten Block übernommen.
+        """
+        parquet_file = pq.ParquetFile(path)
+        carry = None
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            df = pa.Table.from_batches([batch]).to_pandas()
+            if carry is not None:
+                df = pd.concat([carry, df])
+            cut = df.index[-1].floor('15min')
+            complete = df.index < cut
+            carry = df[~complete]
+            if complete.any():
+                yield df[complete]
+        if carry is not None and len(carry):
+            yield carry
+
+    def _process_parquet_chunked(self, path, chunk_rows):
+        """
+        Blockweise Variante von `process_data` in zwei Durchläufen:
+        1. Anzahl der 15-Min-Kerzen zählen (bestimmt den Train-Test-Split)
+        2. Resampling und Indikatoren je Block mit übertragenem Zustand (Vorlauf-Zeilen, EMA-Werte),
+           Synchronisierung, Split und inkrementelles Schreiben der sechs Dateien.
+        """
+        index_column = pq.ParquetFile(path).schema_arrow.pandas_metadata["index_columns"]
+        with profiler.stage("fetch.chunked_count"):
+            num_15min = sum(len(self._resample_data(chunk, '15T'))
+                            for chunk in self._iter_1min_chunks(path, chunk_rows,
+                                                                index_column + ['open', 'high', 'low', 'close', 'volume']))
+        num_15min -= 100  # Indikator-Vorlauf und die zusätzlich entfernten ersten 50 Zeilen
+        if num_15min <= 0:
+            raise ValueError("Zu wenige Daten für die Verarbeitung")
+        train_position = int(num_15min * self.train_ratio)
+
+        timeframes = {"1min": _ChunkedTimeframe(self, None, skip=50),
+                      "5min": _ChunkedTimeframe(self, '5T', skip=50),
+                      "15min": _ChunkedTimeframe(self, '15T', skip=100)}
+        writer = _ChunkedWriter(self)
+        first_timestamp = train_timestamp = None
+        emitted_15min = 0
+        for chunk in self._iter_1min_chunks(path, chunk_rows):
+            results = {name: timeframe.process(chunk) for name, timeframe in timeframes.items()}
+
+            df_15min = results["15min"]
+            if first_timestamp is None and len(df_15min):
+                first_timestamp = df_15min.index[0]
+            if train_timestamp is None and emitted_15min + len(df_15min) > train_position:
+                train_timestamp = df_15min.index[train_position - emitted_15min]
+            emitted_15min += len(df_15min)
+            if first_timestamp is None:
+                continue  # alle bisherigen Zeilen liegen vor dem 15-Min-Startzeitpunkt
+
+            for name, df in results.items():
+                df = df[df.index >= first_timestamp]
+                if train_timestamp is None:
+                    writer.write(df, f"train_{name}")
+                else:
+                    writer.write(df[df.index < train_timestamp], f"train_{name}")
+                    writer.write(df[df.index >= train_timestamp], f"test_{name}")
+        writer.close()
+
+    def _fetch_1min_data_in_chunks(self, pipelined=False):
+        """
+        Lädt 1-Minuten-Daten in 30-Tage-Blöcken und fügt sie zusammen.
+        Mit `pipelined` werden die Blöcke in einem Hintergrund-Thread geparst, während weitere Blöcke geladen
+        werden (die IB-Aufrufe selbst bleiben im aufrufenden Thread). Über den Marktdaten-Dienst entfällt die
+        Wartezeit zwischen den Blöcken, das Pacing übernimmt dort der Sitzungs-Pool für alle Prozesse gemeinsam.
+        """
+        if self.data_service:
+            def request(end):
+                return self.ib.historical(self.symbol, end=end, duration="30 D", bar_size="1 min")
+        else:
+            from ib_insync import Stock
+
+            contract = Stock(self.symbol, 'SMART', 'USD')
+            self.ib.qualifyContracts(contract)
+
+            def request(end):
+                return self.ib.reqHistoricalData(contract, endDateTime=end, durationStr="30 D", barSizeSetting="1 min",
+                                                 whatToShow="TRADES", useRTH=True, formatDate=1)
 
         all_data = []
+        parser = _PipelineStage(self._parse_bars, name="fetch-parser") if pipelined else None
         end_date_dt = datetime.now()  # Startpunkt: Heute
         num_batches = self.days // 30  # Anzahl der 30-Tage-Blöcke
 
@@ -68,46 +300,66 @@ class MarketDataFetcher:
 
             print(f"🔄 Fetching 1-Min data from {start_date_str} to {end_date_str}...")
 
-            bars = self.ib.reqHistoricalData(
-                contract, endDateTime=end_date_dt.strftime("%Y%m%d %H:%M:%S"), durationStr="30 D",
-                barSizeSetting="1 min", whatToShow="TRADES", useRTH=True, formatDate=1
-            )
+            with profiler.stage("fetch.download"):
+                bars = request(end_date_dt.strftime("%Y%m%d %H:%M:%S"))
 
             if not bars:
                 print("❌ No more data available.")
                 break
 
-            df = pd.DataFrame(bars)
-            df.set_index("date", inplace=True)
-            all_data.append(df)
+            if parser is not None:
+                parser.put(bars)
+            else:
+                all_data.append(self._parse_bars(bars))
 
             # Setze neues Enddatum (30 Tage weiter in die Vergangenheit)
             end_date_dt -= pd.Timedelta(days=30)
 
-            time.sleep(10)  # IBKR-Limit beachten
+            if not self.data_service:
+                with profiler.stage("fetch.rate_limit_wait"):
+                    time.sleep(10)  # IBKR-Limit beachten
+
+        if parser is not None:
+            all_data = parser.close()
 
         # Alle geladenen Daten kombinieren
         df_1min = pd.concat(all_data).sort_index()
         df_1min = df_1min[~df_1min.index.duplicated(keep="first")]  # Doppelte Einträge entfernen
         return df_1min
 
+    def _parse_bars(self, bars):
+        """ Wandelt die Bars eines Blocks in einen DataFrame mit Zeitindex um """
+        with profiler.stage("fetch.parse"):
+            df = pd.DataFrame(bars)
+            df.set_index("date", inplace=True)
+        return df
+
     def _resample_data(self, df, timeframe):
         """ Aggregiert Daten auf das gewünschte Zeitintervall """
-        return df.resample(timeframe).agg({
-            'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
-        }).dropna()
+        with profiler.stage("fetch.resample"):
+            return df.resample(timeframe).agg({
+                'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
+            }).dropna()
 
     def _calculate_indicators(self, df):
         """ Berechnet technische Indikatoren und entfernt erste Zeilen mit NaN-Werten """
-        df['EMA_20'] = df['close'].ewm(span=20, adjust=False).mean().round(2)
-        df['EMA_50'] = df['close'].ewm(span=50, adjust=False).mean().round(2)
-        df['ATR_14'] = self._calculate_atr(df, 14).round(2)
-        df['Momentum_14'] = df['close'].diff(14).round(2)
-        df['ADX_14'] = self._calculate_adx(df, 14).round(2)
+        self._add_indicators(df)
 
         # Entferne die ersten 50 Zeilen mit NaN-Werten
         return df.iloc[50:]
 
+    def _add_indicators(self, df, ema_seeds=None):
+        """ Ergänzt die Indikator-Spalten; liefert die ungerundeten EMAs (Zustand für die blockweise Fortsetzung) """
+        ema_seeds = ema_seeds or {}
+        with profiler.stage("fetch.indicators"):
+            emas = {span: _ema(df['close'], span, ema_seeds.get(span)) for span in (20, 50)}
+            df['EMA_20'] = emas[20].round(2)
+            df['EMA_50'] = emas[50].round(2)
+            df['ATR_14'] = self._calculate_atr(df, 14).round(2)
+            df['Momentum_14'] = df['close'].diff(14).round(2)
+            df['ADX_14'] = self._calculate_adx(df, 14).round(2)
+        return emas
+
     def _calculate_atr(self, df, period=14):
         """ Berechnet den Average True Range (ATR) """
         high_low = df['high'] - df['low']
@@ -115,7 +367,7 @@ class MarketDataFetcher:
         low_close = abs(df['low'] - df['close'].shift())
 
         tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        return tr.rolling(period).mean()
+        return _rolling_mean(tr, period)
 
     def _calculate_adx(self, df, period=14):
         """ Berechnet den Average Directional Index (ADX) """
@@ -126,15 +378,80 @@ class MarketDataFetcher:
         minus_dm[minus_dm > 0] = 0
 
         tr = self._calculate_atr(df, period)
-        plus_di = 100 * (plus_dm.rolling(period).mean() / tr)
-        minus_di = abs(100 * (minus_dm.rolling(period).mean() / tr))
+        plus_di = 100 * (_rolling_mean(plus_dm, period) / tr)
+        minus_di = abs(100 * (_rolling_mean(minus_dm, period) / tr))
         dx = (abs(plus_di - minus_di) / (plus_di + minus_di)) * 100
-        return dx.rolling(period).mean()
+        return _rolling_mean(dx, period)
 
     def _save_data(self, df, filename):
-        """ Speichert die Daten im Parquet-Format """
-        df.to_parquet(f"saved_data/SPY_{filename}.parquet")
-        print(f"✅ Saved {filename}.parquet")
+        """ Speichert die Daten im gewählten Format (Standard: Parquet) """
+        with profiler.stage("fetch.save"):
+            save_frame(df, f"{self.save_dir}/{self.symbol}_{filename}", self.data_format)
+        print(f"✅ Saved {filename}{file_extension(self.data_format)}")
+
+
+class _ChunkedTimeframe:
+    def __init__(self, fetcher, timeframe, skip):
+        """
+        Zustand einer Zeitebene bei der blockweisen Verarbeitung: die letzten Rohzeilen als Vorlauf für
+        fensterbasierte Indikatoren, die EMA-Werte vor diesem Vorlauf und die Anzahl bereits ausgegebener Zeilen
+        (die ersten `skip` Zeilen entfallen wie im Speicher-Pfad).
+        """
+        self.fetcher = fetcher
+        self.timeframe = timeframe
+        self.skip = skip
+        self.warmup = None
+        self.ema_seeds = None
+        self.rows = 0
+
+    def process(self, chunk):
+        """Resampling und Indikatoren für einen Block vollständiger Intervalle; liefert die neuen Zeilen."""
+        new = chunk if self.timeframe is None else self.fetcher._resample_data(chunk, self.timeframe)
+        num_warmup = 0 if self.warmup is None else len(self.warmup)
+        combined = new if self.warmup is None else pd.concat([self.warmup, new])
+        combined = combined.copy()
+
+        # Vorlauf für den nächsten Block (Rohzeilen) und EMA-Werte der Zeile davor sichern
+        warmup = combined.iloc[-INDICATOR_WARMUP:].copy()
+        emas = self.fetcher._add_indicators(combined, self.ema_seeds)
+        if len(combined) > INDICATOR_WARMUP:
+            self.ema_seeds = {span: ema.iloc[-INDICATOR_WARMUP - 1] for span, ema in emas.items()}
+        self.warmup = warmup
+
+        result = combined.iloc[num_warmup:]
+        drop = min(len(result), max(0, self.skip - self.rows))
+        self.rows += len(result)
+        return result.iloc[drop:]
+
+
+class _ChunkedWriter:
+    def __init__(self, fetcher):
+        """Schreibt die Ausgabedateien inkrementell (ein Row-Group bzw. Record-Batch je Block)."""
+        self.fetcher = fetcher
+        self.writers = {}
+        self.empty = {}
+
+    def write(self, df, filename):
+        if filename not in self.writers:
+            if len(df) == 0:
+                self.empty[filename] = df
+                return
+            self.writers[filename] = FrameWriter(
+                f"{self.fetcher.save_dir}/{self.fetcher.symbol}_{filename}{file_extension(self.fetcher.data_format)}",
+                pa.Schema.from_pandas(df), self.fetcher.data_format)
+        elif len(df) == 0:
+            return
+        with profiler.stage("fetch.save"):
+            self.writers[filename].write(df)
+
+    def close(self):
+        for filename, writer in self.writers.items():
+            writer.close()
+            print(f"✅ Saved {filename}{file_extension(self.fetcher.data_format)}")
+        # Leere Teile (z.B. Test-Split ohne Daten) wie im Speicher-Pfad als leere Datei schreiben
+        for filename, df in self.empty.items():
+            if filename not in self.writers:
+                self.fetcher._save_data(df, filename)
 
 
 # Test
@@ -0,0 +1,598 @@
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import socket
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+from PaperBroker import start_server
+
+# 📌 Langlebiger Marktdaten-Dienst: ein Prozess hält einen Pool von IB-Sitzungen offen (die Client-IDs vergibt
+# der Dienst, statt sie in jedem Skript fest zu verdrahten) und bedient lokale Prozesse über einen Unix-Socket
+# (oder TCP "host:port") mit JSON-Zeilen. Gleichzeitige identische Anfragen teilen sich einen IB-Aufruf, Ergebnisse
+# historischer Anfragen werden zwischengespeichert und Streams werden je (Symbol, Datenart) nur einmal bei IB
+# abonniert und an alle lokalen Abonnenten verteilt.
+# Nachrichten an den Dienst:
+#   {"type": "historical", "id", "symbol", "end", "duration", "bar_size", "what_to_show", "use_rth"}
+#   {"type": "subscribe", "id", "symbol", "what_to_show", "use_rth"} / {"type": "unsubscribe", "id"}
+#   {"type": "stats", "id"}
+# Nachrichten vom Dienst: historical (Spalten-Dictionary "bars"), bar (je neuer Stream-Kerze), stats und error
+# (jeweils mit der "id" der Anfrage bzw. des Abonnements).
+DEFAULT_ADDRESS = "/tmp/tradehive_marketdata.sock"
+DEFAULT_CLIENT_IDS = range(20, 24)
+BAR_FIELDS = ("open", "high", "low", "close", "volume", "average", "barCount")
+CACHE_ENTRIES = 256
+LIVE_CACHE_SECONDS = 60.0     # Anfragen bis "jetzt" (end="") veralten, Anfragen mit festem Ende nicht
+REQUEST_INTERVAL = 10.0       # Mindestabstand zwischen historischen IB-Anfragen (wie bisher im MarketDataFetcher)
+MAX_CLIENT_BUFFER = 1 << 20   # Stream-Kerzen an Abonnenten mit mehr ungesendeten Bytes werden verworfen
+
+
+def _stock(symbol):
+    from ib_insync import Stock
+
+    return Stock(symbol, 'SMART', 'USD')
+
+
+def _bar_record(bar):
+    """Vereinheitlicht BarData (historisch) und RealTimeBar (Stream) zu einem Dictionary mit BAR_FIELDS."""
+    if hasattr(bar, "open_"):
+        return {"date": bar.time.isoformat(), "open": bar.open_, "high": bar.high, "low": bar.low,
+                "close": bar.close, "volume": bar.volume, "average": bar.wap, "barCount": bar.count}
+    return {"date": bar.date.isoformat(), **{name: getattr(bar, name) for name in BAR_FIELDS}}
+
+
+def _columns(bars):
+    """Spalten-Dictionary; die Zeitzone wird separat übertragen (isoformat enthält nur den UTC-Versatz)."""
+    records = [_bar_record(bar) for bar in bars]
+    timezone = getattr(bars[0].date, "tzinfo", None) if bars else None
+    return {"timezone": str(timezone) if timezone else None,
+            **{name: [record[name] for record in records] for name in ("date",) + BAR_FIELDS}}
+
+
+class _Session:
+    __slots__ = ("ib", "client_id", "active", "streams")
+
+    def __init__(self, ib, client_id):
+        self.ib = ib
+        self.client_id = client_id
+        self.active = 0
+        self.streams = 0
+
+
+class SessionPool:
+    def __init__(self, host="127.0.0.1", port=7497, client_ids=DEFAULT_CLIENT_IDS, ib_factory=None,
+                 contract_factory=None, max_concurrent=2, request_interval=REQUEST_INTERVAL):
+        """
+        Pool dauerhaft verbundener IB-Sitzungen. Nur der Dienst verbindet sich mit TWS/Gateway, dadurch kann es
+        keine Kollisionen der Client-IDs zwischen parallel laufenden Skripten mehr geben.
+
+        :param client_ids: Client-IDs der Sitzungen (eine Sitzung je ID)
+        :param ib_factory: Erzeugt das IB-Objekt je Sitzung (Standard: ib_insync.IB, offline: ReplayIB)
+        :param contract_factory: Symbol -> Kontrakt (Standard: ib_insync.Stock an SMART in USD)
+        :param max_concurrent: Gleichzeitig laufende historische Anfragen je Sitzung
+        :param request_interval: Mindestabstand in Sekunden zwischen historischen Anfragen über alle Sitzungen
+                                 (IB-Pacing gilt je Konto, nicht je Verbindung)
+        """
+        self.host = host
+        self.port = port
+        self.client_ids = list(client_ids)
+        self.ib_factory = ib_factory
+        self.contract_factory = contract_factory or _stock
+        self.max_concurrent = max_concurrent
+        self.request_interval = request_interval
+        self.sessions = []
+        self.contracts = {}
+        self._slots = {}
+        self._pacing = asyncio.Lock()
+        self._last_request = float("-inf")
+
+    async def start(self):
+        if self.ib_factory is None:
+            from ib_insync import IB
+
+            self.ib_factory = IB
+        for client_id in self.client_ids:
+            session = _Session(self.ib_factory(), client_id)
+            self.sessions.append(session)
+            self._slots[client_id] = asyncio.Semaphore(self.max_concurrent)
+            await self._connect(session)
+        if not self.connected():
+            raise ConnectionError(f"Keine IB-Sitzung erreichbar ({self.host}:{self.port})")
+
+    async def _connect(self, session):
+        try:
+            await session.ib.connectAsync(self.host, self.port, clientId=session.client_id)
+            print(f"✅ IB-Sitzung verbunden (clientId={session.client_id})")
+        except (OSError, asyncio.TimeoutError, ConnectionError) as e:
+            print(f"⚠️ IB-Sitzung clientId={session.client_id} nicht verbunden: {e}")
+
+    def connected(self):
+        return [session for session in self.sessions if session.ib.isConnected()]
+
+    async def session(self, streaming=False):
+        """Verbundene Sitzung mit der geringsten Last; getrennte Sitzungen werden bei Bedarf neu verbunden."""
+        sessions = self.connected()
+        if not sessions:
+            for session in self.sessions:
+                await self._connect(session)
+            sessions = self.connected()
+            if not sessions:
+                raise ConnectionError("Alle IB-Sitzungen getrennt")
+        return min(sessions, key=(lambda s: s.streams) if streaming else (lambda s: s.active))
+
+    async def contract(self, symbol):
+        """Qualifizierter Kontrakt je Symbol (einmal je Dienst-Laufzeit)."""
+        contract = self.contracts.get(symbol)
+        if contract is None:
+            session = await self.session()
+            qualified = await session.ib.qualifyContractsAsync(self.contract_factory(symbol))
+            if not qualified:
+                raise ValueError(f"Unbekanntes Symbol: {symbol}")
+            contract = self.contracts[symbol] = qualified[0]
+        return contract
+
+    async def historical(self, contract, **request):
+        session = await self.session()
+        session.active += 1
+        try:
+            async with self._slots[session.client_id]:
+                async with self._pacing:
+                    wait = self._last_request + self.request_interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    self._last_request = time.monotonic()
+                return await session.ib.reqHistoricalDataAsync(contract, formatDate=1, **request)
+        finally:
+            session.active -= 1
+
+    def close(self):
+        for session in self.sessions:
+            session.ib.disconnect()
+
+
+class _Stream:
+    __slots__ = ("session", "handle", "subscribers", "last")
+
+    def __init__(self, session, handle):
+        self.session = session
+        self.handle = handle
+        self.subscribers = set()   # (Verbindung, Abonnement-ID)
+        self.last = None           # JSON der letzten Kerze (sofort an neue Abonnenten)
+
+
+class _Connection:
+    __slots__ = ("writer", "subscriptions", "tasks")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.subscriptions = {}    # Abonnement-ID -> Stream-Schlüssel
+        self.tasks = set()
+
+
+class MarketDataService:
+    def __init__(self, pool, cache_entries=CACHE_ENTRIES, live_cache_seconds=LIVE_CACHE_SECONDS):
+        """
+        Beantwortet historische Anfragen und Streams lokaler Prozesse über den Sitzungs-Pool.
+
+        - Historische Anfragen werden nach allen Parametern geschlüsselt: läuft dieselbe Anfrage bereits, warten
+          weitere Anfragen auf deren Ergebnis; fertige Ergebnisse liegen als fertig kodiertes JSON im LRU-Cache.
+        - Streams (5-Sekunden-Kerzen) werden je (Symbol, Datenart, RTH) einmal abonniert und verteilt; das
+          IB-Abonnement endet mit dem letzten lokalen Abonnenten.
+
+        :param cache_entries: Maximale Anzahl zwischengespeicherter historischer Ergebnisse
+        :param live_cache_seconds: Gültigkeit von Ergebnissen ohne festes Ende (end="")
+        """
+        self.pool = pool
+        self.cache_entries = cache_entries
+        self.live_cache_seconds = live_cache_seconds
+        self.cache = collections.OrderedDict()   # Schlüssel -> (gültig bis, JSON der Spalten)
+        self.pending = {}                        # Schlüssel -> laufender IB-Abruf (Task)
+        self.streams = {}                        # Stream-Schlüssel -> _Stream
+        self.connections = set()
+        self.counts = {"historical": 0, "cache_hits": 0, "shared": 0, "ib_requests": 0, "subscriptions": 0,
+                       "ib_subscriptions": 0, "bars": 0, "dropped": 0}
+
+    # 📌 Historische Daten
+    async def historical(self, symbol, end="", duration="1 D", bar_size="1 min", what_to_show="TRADES",
+                         use_rth=True):
+        """Kerzen als JSON-Text der Spalten (so zwischengespeichert, wie er verschickt wird)."""
+        key = (symbol, end, duration, bar_size, what_to_show, bool(use_rth))
+        self.counts["historical"] += 1
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.cache.move_to_end(key)
+            self.counts["cache_hits"] += 1
+            return cached[1]
+        task = self.pending.get(key)
+        if task is None:
+            task = self.pending[key] = asyncio.ensure_future(self._fetch(key))
+            task.add_done_callback(lambda done: self._store(key, done))
+        else:
+            self.counts["shared"] += 1
+        # shield: bricht ein Client ab, läuft der Abruf für die übrigen Wartenden weiter
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key):
+        symbol, end, duration, bar_size, what_to_show, use_rth = key
+        contract = await self.pool.contract(symbol)
+        self.counts["ib_requests"] += 1
+        bars = await self.pool.historical(contract, endDateTime=end, durationStr=duration,
+                                          barSizeSetting=bar_size, whatToShow=what_to_show, useRTH=use_rth)
+        return json.dumps(_columns(bars))
+
+    def _store(self, key, task):
+        self.pending.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        expires = time.monotonic() + self.live_cache_seconds if key[1] == "" else float("inf")
+        self.cache[key] = (expires, task.result())
+        while len(self.cache) > self.cache_entries:
+            self.cache.popitem(last=False)
+
+    # 📌 Streams
+    async def subscribe(self, connection, subscription_id, symbol, what_to_show="TRADES", use_rth=True):
+        key = (symbol, what_to_show, bool(use_rth))
+        self.counts["subscriptions"] += 1
+        stream = self.streams.get(key)
+        if stream is None:
+            contract = await self.pool.contract(symbol)
+            stream = self.streams.get(key)   # während des Qualifizierens evtl. von einem anderen Client angelegt
+            if stream is None:
+                session = await self.pool.session(streaming=True)
+                handle = session.ib.reqRealTimeBars(contract, 5, what_to_show, use_rth)
+                stream = self.streams[key] = _Stream(session, handle)
+                session.streams += 1
+                handle.updateEvent += lambda bars, has_new_bar: self._publish(stream, bars, has_new_bar)
+                self.counts["ib_subscriptions"] += 1
+        stream.subscribers.add((connection, subscription_id))
+        connection.subscriptions[subscription_id] = key
+        if stream.last is not None:
+            self._send_bar(connection, subscription_id, stream.last)
+
+    def unsubscribe(self, connection, subscription_id):
+        key = connection.subscriptions.pop(subscription_id, None)
+        stream = self.streams.get(key)
+        if stream is None:
+            return
+        stream.subscribers.discard((connection, subscription_id))
+        if not stream.subscribers:
+            del self.streams[key]
+            stream.session.streams -= 1
+            stream.session.ib.cancelRealTimeBars(stream.handle)
+
+    def _publish(self, stream, bars, has_new_bar):
+        if not has_new_bar or not bars:
+            return
+        stream.last = json.dumps(_bar_record(bars[-1]))   # einmal kodiert für alle Abonnenten
+        self.counts["bars"] += 1
+        for connection, subscription_id in list(stream.subscribers):
+            self._send_bar(connection, subscription_id, stream.last)
+
+    def _send_bar(self, connection, subscription_id, bar):
+        if connection.writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            self.counts["dropped"] += 1   # langsamer Abonnent: Kerze verwerfen statt den Dienst zu blockieren
+            return
+        connection.writer.write(f'{{"type": "bar", "id": {json.dumps(subscription_id)}, "bar": {bar}}}\n'.encode())
+
+    # 📌 Verbindungen
+    async def serve(self, address=DEFAULT_ADDRESS):
+        server = await start_server(self._handle, address)
+        print(f"📡 Marktdaten-Dienst bereit: {address} "
+              f"(IB-Sitzungen: {', '.join(str(s.client_id) for s in self.pool.connected())})")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        connection = _Connection(writer)
+        self.connections.add(connection)
+        try:
+            while line := await reader.readline():
+                message = json.loads(line)
+                # Jede Anfrage als eigener Task: ein Client kann mehrere Anfragen gleichzeitig offen haben
+                task = asyncio.ensure_future(self._dispatch(connection, message))
+                connection.tasks.add(task)
+                task.add_done_callback(connection.tasks.discard)
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            self.connections.discard(connection)
+            for task in list(connection.tasks):
+                task.cancel()
+            for subscription_id in list(connection.subscriptions):
+                self.unsubscribe(connection, subscription_id)
+            writer.close()
+
+    async def _dispatch(self, connection, message):
+        kind, request_id = message.get("type"), message.get("id")
+        try:
+            if kind == "historical":
+                bars = await self.historical(message["symbol"], message.get("end", ""),
+                                             message.get("duration", "1 D"), message.get("bar_size", "1 min"),
+                                             message.get("what_to_show", "TRADES"), message.get("use_rth", True))
+                reply = f'{{"type": "historical", "id": {json.dumps(request_id)}, "bars": {bars}}}\n'
+            elif kind == "subscribe":
+                await self.subscribe(connection, request_id, message["symbol"],
+                                     message.get("what_to_show", "TRADES"), message.get("use_rth", True))
+                return
+            elif kind == "unsubscribe":
+                self.unsubscribe(connection, request_id)
+                return
+            elif kind == "stats":
+                reply = json.dumps({"type": "stats", "id": request_id, **self.stats()}) + "\n"
+            else:
+                raise ValueError(f"Unbekannter Nachrichtentyp: {kind}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            reply = json.dumps({"type": "error", "id": request_id, "message": f"{type(e).__name__}: {e}"}) + "\n"
+        if connection in self.connections:
+            connection.writer.write(reply.encode())
+
+    def stats(self):
+        return {"counts": dict(self.counts), "cached": len(self.cache), "pending": len(self.pending),
+                "streams": {" ".join(map(str, key)): len(stream.subscribers) for key, stream in self.streams.items()},
+                "clients": len(self.connections),
+                "sessions": [{"client_id": s.client_id, "connected": s.ib.isConnected(), "active": s.active,
+                              "streams": s.streams} for s in self.pool.sessions]}
+
+
+class MarketDataClient:
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=None):
+        """
+        Synchroner Client für Skripte (z.B. MarketDataFetcher). Anfragen laufen nacheinander über eine
+        Verbindung; für einen Stream zusätzlich zu historischen Anfragen einen zweiten Client verwenden.
+
+        :param timeout: Sekunden je Socket-Operation (None = unbegrenzt; ein Abruf kann im Pacing warten)
+        """
+        host, _, port = address.rpartition(":")
+        if host and port.isdigit():
+            self._socket = socket.create_connection((host, int(port)), timeout)
+        else:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            self._socket.connect(address)
+        self._file = self._socket.makefile("rb")
+        self._ids = itertools.count(1)
+
+    def _send(self, message):
+        self._socket.sendall((json.dumps(message) + "\n").encode())
+
+    def _receive(self, request_id):
+        while line := self._file.readline():
+            message = json.loads(line)
+            if message.get("id") != request_id:
+                continue   # z.B. Kerzen eines bereits beendeten Streams
+            if message["type"] == "error":
+                raise RuntimeError(f"Marktdaten-Dienst: {message['message']}")
+            return message
+        raise ConnectionError("Marktdaten-Dienst hat die Verbindung beendet")
+
+    def historical(self, symbol, end="", duration="1 D", bar_size="1 min", what_to_show="TRADES", use_rth=True):
+        """
+        Historische Kerzen wie `IB.reqHistoricalData` (gleiche Parameterformate, formatDate=1).
+
+        :return: Liste von Dictionaries mit date (datetime) und BAR_FIELDS, direkt für pd.DataFrame geeignet
+        """
+        request_id = next(self._ids)
+        self._send({"type": "historical", "id": request_id, "symbol": symbol, "end": end, "duration": duration,
+                    "bar_size": bar_size, "what_to_show": what_to_show, "use_rth": use_rth})
+        columns = self._receive(request_id)["bars"]
+        dates = [datetime.fromisoformat(date) for date in columns["date"]]
+        if columns["timezone"]:
+            timezone = ZoneInfo(columns["timezone"])
+            dates = [date.astimezone(timezone) for date in dates]
+        return [dict(zip(("date",) + BAR_FIELDS, row)) for row in zip(dates, *(columns[name] for name in BAR_FIELDS))]
+
+    def stream(self, symbol, what_to_show="TRADES", use_rth=True):
+        """Generator über neue 5-Sekunden-Kerzen; das Beenden des Generators beendet das Abonnement."""
+        subscription_id = next(self._ids)
+        self._send({"type": "subscribe", "id": subscription_id, "symbol": symbol, "what_to_show": what_to_show,
+                    "use_rth": use_rth})
+        try:
+            while True:
+                bar = self._receive(subscription_id)["bar"]
+                bar["date"] = datetime.fromisoformat(bar["date"])
+                yield bar
+        finally:
+            try:
+                self._send({"type": "unsubscribe", "id": subscription_id})
+            except OSError:
+                pass
+
+    def stats(self):
+        request_id = next(self._ids)
+        self._send({"type": "stats", "id": request_id})
+        return self._receive(request_id)
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+# 📌 Offline-Ersatz für TWS/Gateway
+class _Event:
+    """Minimaler Ersatz für eventkit.Event (`+=`, `-=`, `emit`)."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        self.handlers.remove(handler)
+        return self
+
+    def emit(self, *args):
+        for handler in list(self.handlers):
+            handler(*args)
+
+
+class _ReplayBars(list):
+    def __init__(self):
+        super().__init__()
+        self.updateEvent = _Event()
+        self.task = None
+
+
+def _parse_end(text, index):
+    """IB-Enddatum ("" = jetzt, "YYYYMMDD HH:MM:SS [Zeitzone]" oder UTC "YYYYMMDD-HH:MM:SS") als Timestamp."""
+    import pandas as pd
+
+    text = text.strip()
+    if not text:
+        return index[-1]
+    if text[8] == "-":
+        end = pd.Timestamp(datetime.strptime(text[:17], "%Y%m%d-%H:%M:%S")).tz_localize("UTC")
+        return end.tz_convert(index.tz) if index.tz else end.tz_localize(None)
+    end = pd.Timestamp(datetime.strptime(text[:17], "%Y%m%d %H:%M:%S"))
+    if index.tz is None:
+        return end
+    return end.tz_localize(text[17:].strip() or index.tz).tz_convert(index.tz)
+
+
+def _parse_duration(text):
+    import pandas as pd
+
+    count, unit = text.split()
+    days = {"D": 1, "W": 7, "M": 30, "Y": 365}
+    if unit == "S":
+        return pd.Timedelta(seconds=int(count))
+    return pd.Timedelta(days=int(count) * days[unit])
+
+
+def _parse_bar_size(text):
+    count, unit = text.split()
+    units = {"min": "min", "mins": "min", "hour": "h", "hours": "h", "day": "D"}
+    if unit not in units:
+        raise ValueError(f"Kerzengröße nicht unterstützt: {text}")
+    return f"{count}{units[unit]}"
+
+
+class ReplayIB:
+    def __init__(self, frames, latency=0.0, bar_interval=1.0):
+        """
+        Ersatz für ib_insync.IB ohne TWS/Gateway (gleiche asynchrone Methoden, soweit der Dienst sie nutzt).
+        Historische Anfragen werden aus gespeicherten 1-Min-Daten beantwortet (Kerzengröße per Resampling, die
+        Datenart wird ignoriert), Streams spielen die letzten gespeicherten Kerzen im Takt `bar_interval` ab.
+
+        :param frames: Dictionary Symbol -> DataFrame mit 1-Min-OHLCV (DatetimeIndex)
+        :param latency: Simulierte Antwortzeit je historischer Anfrage in Sekunden
+        :param bar_interval: Sekunden je abgespielter Stream-Kerze
+        """
+        self.frames = frames
+        self.latency = latency
+        self.bar_interval = bar_interval
+        self.client_id = None
+        self.requests = 0
+
+    async def connectAsync(self, host, port, clientId, timeout=None):
+        self.client_id = clientId
+        return self
+
+    def isConnected(self):
+        return self.client_id is not None
+
+    def disconnect(self):
+        self.client_id = None
+
+    async def qualifyContractsAsync(self, *contracts):
+        return [contract for contract in contracts if contract.symbol in self.frames]
+
+    async def reqHistoricalDataAsync(self, contract, endDateTime, durationStr, barSizeSetting, whatToShow, useRTH,
+                                     formatDate=1):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        df = self.frames[contract.symbol]
+        end = _parse_end(endDateTime, df.index)
+        df = df[(df.index > end - _parse_duration(durationStr)) & (df.index <= end)]
+        rule = _parse_bar_size(barSizeSetting)
+        if rule != "1min":
+            df = df.resample(rule).agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last',
+                                        'volume': 'sum'}).dropna()
+        return [SimpleNamespace(date=date.to_pydatetime(), open=o, high=h, low=l, close=c, volume=v, average=c,
+                                barCount=0)
+                for date, o, h, l, c, v in zip(df.index, df["open"], df["high"], df["low"], df["close"],
+                                               df["volume"])]
+
+    def reqRealTimeBars(self, contract, barSize, whatToShow, useRTH):
+        bars = _ReplayBars()
+        bars.task = asyncio.get_running_loop().create_task(self._play(self.frames[contract.symbol], bars))
+        return bars
+
+    async def _play(self, df, bars):
+        for date, row in df.iloc[-390:].iterrows():
+            await asyncio.sleep(self.bar_interval)
+            bars.append(SimpleNamespace(time=date.to_pydatetime(), open_=row["open"], high=row["high"],
+                                        low=row["low"], close=row["close"], volume=row["volume"],
+                                        wap=row["close"], count=0))
+            bars.updateEvent.emit(bars, True)
+
+    def cancelRealTimeBars(self, bars):
+        bars.task.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lokaler Marktdaten-Dienst mit gemeinsamem IB-Sitzungs-Pool")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Pfad des Unix-Sockets oder host:port")
+    parser.add_argument("--host", default="127.0.0.1", help="TWS/Gateway")
+    parser.add_argument("--port", type=int, default=7497)
+    parser.add_argument("--client-ids", type=int, nargs="+", default=list(DEFAULT_CLIENT_IDS),
+                        help="Client-IDs der Sitzungen im Pool")
+    parser.add_argument("--max-concurrent", type=int, default=2, help="Gleichzeitige Anfragen je Sitzung")
+    parser.add_argument("--request-interval", type=float, default=REQUEST_INTERVAL,
+                        help="Mindestabstand historischer IB-Anfragen in Sekunden")
+    parser.add_argument("--cache-entries", type=int, default=CACHE_ENTRIES)
+    parser.add_argument("--replay", nargs="+", metavar="SYMBOL=PFAD",
+                        help="Gespeicherte 1-Min-Daten statt IB verwenden (offline, ohne Pacing)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Antwortzeit je Anfrage (nur mit --replay)")
+    parser.add_argument("--bar-interval", type=float, default=1.0, help="Sekunden je Stream-Kerze (nur mit --replay)")
+    parser.add_argument("--stats", action="store_true", help="Statistik eines laufenden Dienstes ausgeben")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        with MarketDataClient(args.address, timeout=5) as client:
+            print(f"📊 {json.dumps(client.stats(), indent=2)}")
+        return
+
+    pool_options = {"request_interval": args.request_interval}
+    if args.replay:
+        from storage import load_frame
+
+        frames = {}
+        for item in args.replay:
+            symbol, _, path = item.partition("=")
+            frames[symbol] = load_frame(path)
+        pool_options = {"ib_factory": lambda: ReplayIB(frames, args.latency, args.bar_interval),
+                        "contract_factory": lambda symbol: SimpleNamespace(symbol=symbol), "request_interval": 0.0}
+
+    async def run():
+        pool = SessionPool(args.host, args.port, args.client_ids, max_concurrent=args.max_concurrent, **pool_options)
+        await pool.start()
+        service = MarketDataService(pool, args.cache_entries)
+        try:
+            await service.serve(args.address)
+        finally:
+            print(f"🛑 Marktdaten-Dienst beendet: {service.counts}")
+            pool.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
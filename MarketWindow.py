@@ -0,0 +1,49 @@
+import numpy as np
+
+
+class MarketWindow:
+    def __init__(self, df):
+        """
+        Read-only, DataFrame-ähnliches Fenster auf die Spalten eines DataFrames.
+
+        Die Spalten werden einmalig als zusammenhängende, schreibgeschützte NumPy-Arrays vorgehalten.
+        `set_bounds` verschiebt nur Start und Ende des Fensters; `window['close']` liefert eine View auf
+        den aktuellen Ausschnitt, ohne Daten zu kopieren. Unterstützt werden `len()`, `.empty`,
+        `.columns`, `.index` und Spaltenzugriff per `[]`, was für Agenten mit NumPy-Logik genügt.
+        """
+        self.columns = list(df.columns)
+        self._arrays = {}
+        for column in self.columns:
+            array = np.ascontiguousarray(df[column].to_numpy())
+            array.flags.writeable = False
+            self._arrays[column] = array
+        self._full_index = df.index
+        self._start = 0
+        self._stop = len(df)
+
+    def set_bounds(self, start, stop):
+        """Setzt das Fenster auf die Zeilen [start, stop)."""
+        self._start = start
+        self._stop = stop
+
+    def __len__(self):
+        return self._stop - self._start
+
+    @property
+    def empty(self):
+        return self._stop <= self._start
+
+    def __getitem__(self, column):
+        return self._arrays[column][self._start:self._stop]
+
+    def __contains__(self, column):
+        return column in self._arrays
+
+    @property
+    def index(self):
+        """Zeitstempel des aktuellen Fensters (wird nur bei Zugriff erzeugt)."""
+        return self._full_index[self._start:self._stop]
+
+    def full_array(self, column):
+        """Gesamte Spalte unabhängig vom aktuellen Fenster (z.B. für vektorisierte Vorberechnungen)."""
+        return self._arrays[column]
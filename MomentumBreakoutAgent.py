@@ -1,4 +1,6 @@
-import pandas as pd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from profiling import profiler
 
 class MomentumBreakoutAgent:
     def __init__(self,
@@ -26,9 +28,71 @@ class MomentumBreakoutAgent:
         self.slippage_adjustment = slippage_adjustment
         self.debug = debug
 
+    def get_params(self):
+        """Parameter des Agenten (Checkpoint-Konfiguration des Backtesters; ohne `debug`)."""
+        return {name: getattr(self, name) for name in (
+            "breakout_window", "ema_trend_filter", "atr_multiplier_sl", "atr_multiplier_tp", "volume_confirmation",
+            "min_candle_body_ratio", "min_adx_15m", "min_atr_threshold", "slippage_adjustment")}
+
+    def get_lookback(self):
+        """
+        Maximal benötigte Historie (Anzahl Kerzen je Zeitebene) von get_signal. Der Backtester übergibt damit
+        Fenster fester Länge statt der vollständigen Historie.
+        """
+        return {"5min": self.breakout_window + 2, "15min": 50}
+
+    def get_candidate_mask(self, df_5min, df_15min, last_15min):
+        """
+        Vektorisierte notwendige Bedingungen von get_signal für jede 5-Min-Kerze: Ausbruch aus der Range,
+        ATR-/ADX-Schwellen, Kerzenkörper-Anteil und Trendfilter. Der Volumenfilter bleibt get_signal überlassen.
+
+        Achtung: Wie in get_signal enthält die Range die aktuelle Kerze. Wegen low <= close <= high ist
+        close > Range-Hoch bzw. close < Range-Tief nie erfüllt, die Maske ist daher immer False (der Agent handelt
+        nie). Sie bildet get_signal exakt ab, ist aber kein wirksamer Vorfilter für einen handelnden Agenten.
+
+        :param df_5min: 5-Min-Daten (vollständige Historie, DataFrame oder MarketWindow)
+        :param df_15min: 15-Min-Daten (vollständige Historie, DataFrame oder MarketWindow)
+        :param last_15min: je 5-Min-Kerze der Index der zuletzt sichtbaren 15-Min-Kerze (-1 = keine)
+        :return: Boolesches Array, True wo get_signal ein Handelssignal liefern kann
+        """
+        open_5m = np.asarray(df_5min['open'])
+        high_5m = np.asarray(df_5min['high'])
+        low_5m = np.asarray(df_5min['low'])
+        close_5m = np.asarray(df_5min['close'])
+        atr_5m = np.asarray(df_5min['ATR_14'])
+
+        # Breakout-Range über die letzten breakout_window Kerzen (inkl. aktueller Kerze, wie in get_signal;
+        # close liegt damit immer innerhalb der Range)
+        breakout_high = np.full(len(close_5m), np.nan)
+        breakout_low = np.full(len(close_5m), np.nan)
+        if len(close_5m) >= self.breakout_window:
+            breakout_high[self.breakout_window - 1:] = sliding_window_view(high_5m, self.breakout_window).max(axis=1)
+            breakout_low[self.breakout_window - 1:] = sliding_window_view(low_5m, self.breakout_window).min(axis=1)
+
+        # 15-Min-Werte der jeweils zuletzt sichtbaren Kerze
+        visible = last_15min >= 0
+        position = np.maximum(last_15min, 0)
+        adx_15m = np.where(visible, np.asarray(df_15min['ADX_14'])[position], np.nan)
+        ema_20_15m = np.where(visible, np.asarray(df_15min['EMA_20'])[position], np.nan)
+        ema_50_15m = np.where(visible, np.asarray(df_15min['EMA_50'])[position], np.nan)
+
+        body_size_5m = np.abs(close_5m - open_5m)
+        candle_size_5m = np.abs(high_5m - low_5m)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            valid_candle_body = (candle_size_5m != 0) & (body_size_5m / candle_size_5m >= self.min_candle_body_ratio)
+
+        valid = (atr_5m > self.min_atr_threshold) & (adx_15m >= self.min_adx_15m) & valid_candle_body
+        long_setup = close_5m > breakout_high
+        short_setup = close_5m < breakout_low
+        if self.ema_trend_filter:
+            long_setup &= ema_20_15m > ema_50_15m
+            short_setup &= ema_20_15m < ema_50_15m
+        return valid & (long_setup | short_setup)
+
     def get_signal(self, df_5min, df_15min):
         """
-        Determines a trading signal based on the provided 5min and 15min market data.
+        Determines a trading signal based on the provided 5min and 15min market data
+        (DataFrames or MarketWindow views, only the last candles are used).
         """
         # Prüfen, ob genügend Daten vorhanden sind
         if df_5min is None or df_15min is None or df_5min.empty or df_15min.empty or len(df_5min) < self.breakout_window + 2 or len(df_15min) < 50:
@@ -36,16 +100,22 @@ class MomentumBreakoutAgent:
 
         try:
             # 🎯 Extract latest values
-            last_low_5m = df_5min['low'].iloc[-1]
-            last_close_5m = df_5min['close'].iloc[-1]
-            last_high_5m = df_5min['high'].iloc[-1]
-            last_atr_5m = df_5min['ATR_14'].iloc[-1]
-            last_volume_5m = df_5min['volume'].iloc[-1]
-            last_adx_15m = df_15min['ADX_14'].iloc[-1]
-            ema_20_15m = df_15min['EMA_20'].iloc[-1]
-            ema_50_15m = df_15min['EMA_50'].iloc[-1]
-            breakout_high = df_5min['high'].rolling(self.breakout_window).max().iloc[-1]
-            breakout_low = df_5min['low'].rolling(self.breakout_window).min().iloc[-1]
+            open_5m = np.asarray(df_5min['open'])
+            high_5m = np.asarray(df_5min['high'])
+            low_5m = np.asarray(df_5min['low'])
+            close_5m = np.asarray(df_5min['close'])
+            volume_5m = np.asarray(df_5min['volume'])
+            last_low_5m = low_5m[-1]
+            last_close_5m = close_5m[-1]
+            last_high_5m = high_5m[-1]
+            last_atr_5m = np.asarray(df_5min['ATR_14'])[-1]
+            last_volume_5m = volume_5m[-1]
+            last_adx_15m = np.asarray(df_15min['ADX_14'])[-1]
+            ema_20_15m = np.asarray(df_15min['EMA_20'])[-1]
+            ema_50_15m = np.asarray(df_15min['EMA_50'])[-1]
+            with profiler.stage("agent.breakout_range"):
+                breakout_high = high_5m[-self.breakout_window:].max()
+                breakout_low = low_5m[-self.breakout_window:].min()
 
             # ✅ Trendbestätigung (15-Min-Chart)
             trend_long = ema_20_15m > ema_50_15m if self.ema_trend_filter else True
@@ -54,10 +124,11 @@ class MomentumBreakoutAgent:
             # ✅ Weitere Bedingungen
             valid_atr = last_atr_5m > self.min_atr_threshold
             valid_adx = last_adx_15m >= self.min_adx_15m
-            body_size_5m = abs(last_close_5m - df_5min['open'].iloc[-1])
+            body_size_5m = abs(last_close_5m - open_5m[-1])
             candle_size_5m = abs(last_high_5m - last_low_5m)
             valid_candle_body = (body_size_5m / candle_size_5m) >= self.min_candle_body_ratio if candle_size_5m != 0 else False
-            valid_volume = last_volume_5m > df_5min['volume'].rolling(self.breakout_window).mean().iloc[-1] if self.volume_confirmation else True
+            with profiler.stage("agent.volume_filter"):
+                valid_volume = last_volume_5m > volume_5m[-self.breakout_window:].mean() if self.volume_confirmation else True
 
             # 📌 Korrektur der Slippage in Stop-Loss und Take-Profit Berechnung
             entry_price_long = last_close_5m + self.slippage_adjustment
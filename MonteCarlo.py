@@ -0,0 +1,127 @@
+import argparse
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+METHODS = ("shuffle", "bootstrap", "original")
+DEFAULT_BATCH_SIZE = 10000
+
+
+def _simulate_batch(task):
+    """
+    Simuliert einen Block von Kapitalkurven als (Simulationen x Trades)-Matrix und liefert Endkapital und
+    maximalen Drawdown je Simulation.
+    """
+    (trades, method, simulations, initial_balance, slippage, fee_range, seed) = task
+    rng = np.random.default_rng(seed)
+    num_trades = len(trades["returns"])
+
+    # Trade-Reihenfolge je Simulation: Permutation, Ziehen mit Zurücklegen oder Originalreihenfolge
+    if method == "shuffle":
+        index = rng.permuted(np.tile(np.arange(num_trades), (simulations, 1)), axis=1)
+    elif method == "bootstrap":
+        index = rng.integers(0, num_trades, size=(simulations, num_trades))
+    else:
+        index = np.broadcast_to(np.arange(num_trades), (simulations, num_trades))
+
+    if slippage == 0 and fee_range is None:
+        returns = trades["returns"][index]
+    else:
+        # Zufällige zusätzliche Slippage (gegen die Position, je Ein- und Ausstieg) und Gebühren je Trade
+        direction = trades["direction"][index]
+        entry_price = trades["entry_price"][index] + direction * rng.uniform(0, slippage, size=index.shape)
+        exit_price = trades["exit_price"][index] - direction * rng.uniform(0, slippage, size=index.shape)
+        fee = trades["fee"] if fee_range is None else rng.uniform(fee_range[0], fee_range[1], size=index.shape)
+        returns = 1 + direction * (exit_price - entry_price) / entry_price - fee
+
+    equity = initial_balance * np.cumprod(returns, axis=1)
+    running_max = np.maximum(np.maximum.accumulate(equity, axis=1), initial_balance)
+    max_drawdown = np.max((running_max - equity) / running_max, axis=1) * 100
+    return equity[:, -1], max_drawdown
+
+
+def simulate(ledger, method="shuffle", simulations=10000, initial_balance=10000, fee_per_trade=0.0001, slippage=0.0,
+             fee_range=None, seed=None, batch_size=DEFAULT_BATCH_SIZE, processes=1):
+    """
+    Monte-Carlo-Robustheitsanalyse über das Trade-Journal eines Backtests (ohne erneute Backtests).
+
+    Jeder Trade wird als Kapitalfaktor exit_balance / entry_balance behandelt (der Backtester setzt jeweils das
+    gesamte Kapital ein). Die Simulationen laufen blockweise als NumPy-Matrizen, optional auf mehrere Prozesse
+    verteilt. Der Drawdown bezieht sich auf die Kapitalkurve nach abgeschlossenen Trades.
+
+    :param ledger: TradeLedger des Backtesters
+    :param method: "shuffle" (Reihenfolge permutieren), "bootstrap" (Trades mit Zurücklegen ziehen)
+                   oder "original" (nur Störungen von Slippage/Gebühren)
+    :param slippage: Maximale zusätzliche Slippage je Ein- und Ausstieg (gleichverteilt, gegen die Position)
+    :param fee_range: Optionales (min, max) der Gebühr je Trade (Anteil des Kapitals), gleichverteilt
+    :return: Dictionary mit Arrays "final_balance" und "max_drawdown" (in %)
+    """
+    if method not in METHODS:
+        raise ValueError(f"Ungültige Methode: {method}")
+    if len(ledger) == 0:
+        return {"final_balance": np.full(simulations, float(initial_balance)), "max_drawdown": np.zeros(simulations)}
+
+    trades = {
+        "returns": ledger["exit_balance"] / ledger["entry_balance"],
+        "direction": ledger["direction"].astype(np.float64),
+        "entry_price": ledger["entry_price"],
+        "exit_price": ledger["exit_price"],
+        "fee": fee_per_trade,
+    }
+    sizes = [min(batch_size, simulations - start) for start in range(0, simulations, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(trades, method, size, initial_balance, slippage, fee_range, s) for size, s in zip(sizes, seeds)]
+
+    if processes > 1:
+        with multiprocessing.Pool(processes) as pool:
+            batches = pool.map(_simulate_batch, tasks)
+    else:
+        batches = [_simulate_batch(task) for task in tasks]
+
+    return {"final_balance": np.concatenate([final for final, _ in batches]),
+            "max_drawdown": np.concatenate([drawdown for _, drawdown in batches])}
+
+
+def summarize(results, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+    """Quantile (Konfidenzintervalle) von Endkapital und maximalem Drawdown."""
+    return pd.DataFrame({name: np.quantile(values, quantiles) for name, values in results.items()},
+                        index=[f"q{int(q * 100)}" for q in quantiles])
+
+
+def main():
+    from backtester import Backtester
+    from MomentumBreakoutAgent import MomentumBreakoutAgent
+    from storage import load_frame
+
+    parser = argparse.ArgumentParser(description="Monte-Carlo-Robustheitsanalyse einer Konfiguration")
+    parser.add_argument("--results", default="optimization_results.csv")
+    parser.add_argument("--row", type=int, default=0, help="Zeile der Ergebnisdatei (nach --sort sortiert)")
+    parser.add_argument("--sort", default="sharpe_ratio", help="Spalte, nach der absteigend sortiert wird")
+    parser.add_argument("--data-5min", default="saved_data/SPY_train_5min.parquet")
+    parser.add_argument("--data-15min", default="saved_data/SPY_train_15min.parquet")
+    parser.add_argument("--simulations", type=int, default=100000)
+    parser.add_argument("--slippage", type=float, default=0.0)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    df_results = pd.read_csv(args.results).sort_values(args.sort, ascending=False)
+    agent_params = {name: value for name, value in df_results.iloc[args.row].items()
+                    if name in MomentumBreakoutAgent.__init__.__code__.co_varnames}
+    backtester = Backtester(MomentumBreakoutAgent(**agent_params), load_frame(args.data_5min),
+                            load_frame(args.data_15min))
+    metrics = backtester.run_backtest()
+    print(f"📊 Backtest: {metrics}")
+
+    for method in METHODS:
+        if method == "original" and args.slippage == 0:
+            continue
+        results = simulate(backtester.ledger, method, args.simulations, backtester.initial_balance,
+                           backtester.fee_per_trade, args.slippage, seed=args.seed, processes=args.processes)
+        print(f"🎲 {method}:")
+        print(summarize(results).round(2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import math
+
+import numpy as np
+import pandas as pd
+
+# Strike-Abstände relativ zum Kurs beim Einstieg, in Signalrichtung (> 0 = aus dem Geld, < 0 = im Geld)
+DEFAULT_STRIKES = (-0.01, -0.005, 0.0, 0.005, 0.01)
+# Kalendertage bis zum Verfall (0 = Verfall am Einstiegstag um 16:00 Uhr Börsenzeit, Wochenende -> Freitag)
+DEFAULT_EXPIRIES = (0, 1, 7, 30)
+EXPIRY_TIME = pd.Timedelta(hours=16)
+YEAR_NS = 365 * 24 * 3600 * 10 ** 9
+TRADING_DAYS = 252
+TRADING_MINUTES = 390
+# Renditen über diesen Abstand (Nacht/Wochenende) gehen nicht in die realisierte Volatilität ein
+SESSION_BREAK_NS = 4 * 3600 * 10 ** 9
+# Obergrenze für Trades x Kontrakte x Kerzen je Block (Speicherbedarf)
+MAX_BLOCK_ELEMENTS = 4_000_000
+
+
+def realized_volatility(index, close, window=78):
+    """
+    Annualisierte realisierte Volatilität je Kerze als Proxy für die implizite Volatilität.
+
+    Berechnet aus den Log-Renditen der letzten `window` Kerzen innerhalb der Handelssitzungen (Kurslücken über
+    Nacht/Wochenende werden ausgelassen), ohne Blick in die Zukunft: der Wert an Kerze i nutzt nur Kurse bis i.
+
+    :return: Array je Kerze (NaN, solange noch keine Rendite vorliegt)
+    """
+    timestamps = index.asi8
+    close = np.asarray(close, dtype=np.float64)
+    if len(close) < 2:
+        return np.full(len(close), np.nan)
+    diffs = np.diff(timestamps)
+    intraday = diffs < SESSION_BREAK_NS
+    interval_min = float(np.median(diffs[intraday])) / 60e9 if intraday.any() else 5.0
+    bars_per_year = TRADING_DAYS * TRADING_MINUTES / interval_min
+
+    # Rollende Summen über kumulierte Summen (Mittelwert null, üblich für kurze Intervalle)
+    squared = np.concatenate(([0.0], np.where(intraday, np.log(close[1:] / close[:-1]) ** 2, 0.0)))
+    counts = np.concatenate(([0], intraday.astype(np.int64)))
+    cum_squared, cum_counts = np.cumsum(squared), np.cumsum(counts)
+    start = np.maximum(np.arange(len(close)) - window, 0)
+    total = cum_squared - cum_squared[start]
+    count = cum_counts - cum_counts[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.sqrt(total / count * bars_per_year)
+
+
+def norm_cdf(x):
+    """Standardnormalverteilung (komplementäre Fehlerfunktion nach Numerical Recipes, relativer Fehler < 1.2e-7)."""
+    z = np.abs(x) / math.sqrt(2)
+    t = 1 / (1 + 0.5 * z)
+    erfc = t * np.exp(-z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (-0.82215223 + t * 0.17087277)))))))))
+    return np.where(x >= 0, 1 - 0.5 * erfc, 0.5 * erfc)
+
+
+def black_scholes(spot, strike, years, volatility, rate, is_call):
+    """
+    Black-Scholes-Preis europäischer Optionen, vollständig vektorisiert (alle Argumente broadcastbar).
+    Bei Restlaufzeit 0 (Verfall) wird der innere Wert geliefert.
+    """
+    expired = years <= 0
+    years = np.where(expired, 1.0, years)
+    sqrt_years = np.sqrt(years)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1 = (np.log(spot / strike) + (rate + 0.5 * volatility ** 2) * years) / (volatility * sqrt_years)
+    d2 = d1 - volatility * sqrt_years
+    # Call: S N(d1) - K e^(-rT) N(d2), Put: K e^(-rT) N(-d2) - S N(-d1) -> mit Vorzeichen w = +1 / -1 zusammengefasst
+    sign = np.where(is_call, 1.0, -1.0)
+    discounted_strike = strike * np.exp(-rate * years)
+    price = sign * (spot * norm_cdf(sign * d1) - discounted_strike * norm_cdf(sign * d2))
+    intrinsic = np.maximum(sign * (spot - strike), 0.0)
+    return np.where(expired, intrinsic, price)
+
+
+def price_trades(ledger, df_5min, strikes=DEFAULT_STRIKES, expiries=DEFAULT_EXPIRIES, rate=0.04, vol_window=78,
+                 iv_multiplier=1.1, min_volatility=0.05, strike_step=1.0, spread=0.02, tick=0.01):
+    """
+    Bewertet jeden Trade des Journals als Option (BUY CALL -> Call, BUY PUT -> Put) für eine Leiter aus
+    Strikes und Laufzeiten. Alle Trades, Kontrakte und gehaltenen Kerzen werden als ein (Trades x Kontrakte x
+    Kerzen)-Array in einem vektorisierten Durchlauf bewertet (bei Bedarf blockweise über die Trades).
+
+    Der Basiswert folgt den Schlusskursen der gehaltenen Kerzen, der Ausstieg erfolgt zum Exit-Preis des
+    Journals. Volatilität je Kerze: realisierte Volatilität * `iv_multiplier` (mindestens `min_volatility`).
+    Verfällt eine Option vor dem Ausstieg, wird sie zum inneren Wert an der letzten Kerze vor dem Verfall
+    abgerechnet.
+
+    :param ledger: TradeLedger des Backtesters
+    :param df_5min: Kerzen des Backtests (Index und Schlusskurse)
+    :param strikes: Strike-Abstände relativ zum Einstiegskurs in Signalrichtung (0.01 = 1 % aus dem Geld)
+    :param expiries: Kalendertage bis zum Verfall (Verfall jeweils um 16:00 Uhr Börsenzeit, fällt der Tag auf ein
+                     Wochenende, am Freitag davor)
+    :param strike_step: Raster der Strikes (z.B. 1.0 für SPY)
+    :param spread: Halber Geld-Brief-Spread als Anteil der Prämie (bei Ein- und Ausstieg)
+    :param tick: Kursraster der Prämien, zugleich Mindestprämie (kein Kauf wertloser Optionen zu 0)
+    :return: Dictionary mit "contracts" (DataFrame je Kontrakt) und (Trades x Kontrakte)-Arrays
+             "entry_premium", "exit_premium", "worst_premium" und "return" (NaN = Kontrakt beim Einstieg verfallen)
+    """
+    close = df_5min["close"].to_numpy(dtype=np.float64)
+    timestamps = df_5min.index.asi8
+    bar_close = timestamps + (int(np.median(np.diff(timestamps[:1000]))) if len(timestamps) > 1 else 0)
+    volatility = np.maximum(np.nan_to_num(realized_volatility(df_5min.index, close, vol_window) * iv_multiplier,
+                                          nan=min_volatility), min_volatility)
+
+    moneyness, expiry_days = (a.ravel() for a in np.meshgrid(np.asarray(strikes, dtype=np.float64),
+                                                             np.asarray(expiries, dtype=np.int64), indexing="ij"))
+    contracts = pd.DataFrame({"strike_offset": moneyness, "expiry_days": expiry_days})
+    num_trades, num_contracts = len(ledger), len(contracts)
+    result = {name: np.empty((num_trades, num_contracts)) for name in
+              ("entry_premium", "exit_premium", "worst_premium", "return")}
+    result["contracts"] = contracts
+    if num_trades == 0:
+        return result
+
+    direction = ledger["direction"].astype(np.float64)
+    entry_index, exit_index = ledger["entry_index"], ledger["exit_index"]
+    entry_spot = close[entry_index]
+    strike = np.round(entry_spot[:, None] * (1 + direction[:, None] * moneyness) / strike_step) * strike_step
+
+    # Verfall: Einstiegstag + Laufzeit in Wanduhrzeit (16:00 Uhr Börsenzeit auch über eine Zeitumstellung hinweg),
+    # Verfallstage am Wochenende werden auf den Freitag davor gelegt
+    entry_day = df_5min.index[entry_index].normalize()
+    timezone = entry_day.tz
+    expiry = np.empty((num_trades, num_contracts), dtype=np.int64)
+    for column, days in enumerate(expiry_days):
+        expiry_day = entry_day.tz_localize(None) + pd.Timedelta(days=int(days))
+        expiry_day -= pd.to_timedelta(np.maximum(expiry_day.dayofweek - 4, 0), unit="D")
+        expiry_time = expiry_day + EXPIRY_TIME
+        expiry[:, column] = (expiry_time if timezone is None else expiry_time.tz_localize(timezone)).asi8
+    settle_index = np.searchsorted(bar_close, expiry, side="right") - 1
+
+    held = exit_index - entry_index + 1
+    block = max(1, MAX_BLOCK_ELEMENTS // (num_contracts * int(held.max())))
+    for start in range(0, num_trades, block):
+        rows = slice(start, min(start + block, num_trades))
+        steps = np.arange(int(held[rows].max()))
+        # Kerze je (Trade, Kontrakt, Schritt): bis zum Ausstieg bzw. zur Abrechnung bei Verfall
+        bar = np.minimum(entry_index[rows, None, None] + steps,
+                         np.minimum(exit_index[rows, None, None], np.maximum(settle_index[rows, :, None],
+                                                                             entry_index[rows, None, None])))
+        is_exit = bar == exit_index[rows, None, None]
+        spot = np.where(is_exit, ledger["exit_price"][rows, None, None], close[bar])
+        years = np.maximum(expiry[rows, :, None] - bar_close[bar], 0) / YEAR_NS
+        premium = black_scholes(spot, strike[rows, :, None], years, volatility[bar], rate,
+                                direction[rows, None, None] > 0)
+        premium = np.maximum(np.round(premium / tick) * tick, tick)
+
+        # Nach Ausstieg bzw. Verfall bleibt die Kerze stehen: der letzte Schritt ist der Ausstiegswert
+        result["entry_premium"][rows] = premium[:, :, 0]
+        result["exit_premium"][rows] = premium[:, :, -1]
+        result["worst_premium"][rows] = premium.min(axis=2)
+
+    # Beim Einstieg bereits verfallene Kontrakte (z.B. 0 Tage bei Einstieg an der letzten Kerze) sind nicht handelbar
+    tradable = expiry > bar_close[entry_index, None]
+    paid = result["entry_premium"] * (1 + spread)
+    result["return"] = np.where(tradable, result["exit_premium"] * (1 - spread) / paid - 1, np.nan)
+    return result
+
+
+def option_metrics(result, initial_balance=10000, allocation=0.1, fee_per_trade=0.0001):
+    """
+    Kennzahlen je Kontrakt: je Trade wird der Anteil `allocation` des Kapitals als Prämie eingesetzt,
+    der Rest bleibt unverändert (Kapitalkurve nach abgeschlossenen Trades).
+
+    :return: DataFrame mit einer Zeile pro Kontrakt (Strike-Abstand, Laufzeit)
+    """
+    contracts = result["contracts"].copy()
+    returns = result["return"]
+    traded = ~np.isnan(returns)
+    num_trades = traded.sum(axis=0)
+    returns = np.where(traded, returns, 0.0)
+
+    factors = np.where(traded, 1 + allocation * returns - fee_per_trade, 1.0)
+    equity = initial_balance * np.cumprod(factors, axis=0)
+    running_max = np.maximum(np.maximum.accumulate(equity, axis=0), initial_balance)
+    gains = np.where(returns > 0, returns, 0).sum(axis=0)
+    losses = -np.where(returns < 0, returns, 0).sum(axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        contracts["Total Trades"] = num_trades
+        contracts["Final Balance"] = (equity[-1] if len(equity) else np.full(len(contracts), initial_balance,
+                                                                             dtype=np.float64)).round(2)
+        contracts["Win Rate (%)"] = np.nan_to_num((returns > 0).sum(axis=0) / num_trades * 100).round(2)
+        contracts["Avg Return (%)"] = np.nan_to_num(returns.sum(axis=0) / num_trades * 100).round(2)
+        contracts["Max Drawdown"] = (((running_max - equity) / running_max).max(axis=0, initial=0) * 100).round(2)
+        contracts["Profit Factor"] = np.where(losses > 0, gains / losses, np.where(gains > 0, np.inf, 0)).round(2)
+    return contracts
+
+
+def main(argv=None):
+    from backtester import Backtester
+    from MomentumBreakoutAgent import MomentumBreakoutAgent
+    from storage import load_frame
+
+    parser = argparse.ArgumentParser(description="Options-P&L der Signale eines Backtests (Black-Scholes)")
+    parser.add_argument("--results", default="optimization_results.csv")
+    parser.add_argument("--row", type=int, default=0, help="Zeile der Ergebnisdatei (nach --sort sortiert)")
+    parser.add_argument("--sort", default="sharpe_ratio", help="Spalte, nach der absteigend sortiert wird")
+    parser.add_argument("--data-5min", default="saved_data/SPY_train_5min.parquet")
+    parser.add_argument("--data-15min", default="saved_data/SPY_train_15min.parquet")
+    parser.add_argument("--strikes", type=float, nargs="+", default=DEFAULT_STRIKES)
+    parser.add_argument("--expiries", type=int, nargs="+", default=DEFAULT_EXPIRIES)
+    parser.add_argument("--allocation", type=float, default=0.1, help="Anteil des Kapitals als Prämie je Trade")
+    parser.add_argument("--rate", type=float, default=0.04)
+    parser.add_argument("--iv-multiplier", type=float, default=1.1)
+    parser.add_argument("--spread", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    df_results = pd.read_csv(args.results).sort_values(args.sort, ascending=False)
+    agent_params = {name: value for name, value in df_results.iloc[args.row].items()
+                    if name in MomentumBreakoutAgent.__init__.__code__.co_varnames}
+    df_5min = load_frame(args.data_5min)
+    backtester = Backtester(MomentumBreakoutAgent(**agent_params), df_5min, load_frame(args.data_15min))
+    print(f"📊 Backtest (Basiswert): {backtester.run_backtest()}")
+
+    result = price_trades(backtester.ledger, df_5min, args.strikes, args.expiries, rate=args.rate,
+                          iv_multiplier=args.iv_multiplier, spread=args.spread)
+    print(f"📈 Optionen ({args.allocation:.0%} des Kapitals je Trade):")
+    print(option_metrics(result, backtester.initial_balance, args.allocation, backtester.fee_per_trade)
+          .to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from PaperBroker import DEFAULT_ADDRESS, open_connection
+
+# Status einer Order
+PENDING = "pending"        # in der Sende-Queue
+SUBMITTED = "submitted"    # übertragen, noch nicht bestätigt
+ACKNOWLEDGED = "acknowledged"
+FILLED = "filled"
+CANCELLED = "cancelled"
+REJECTED = "rejected"
+FINAL_STATES = (FILLED, CANCELLED, REJECTED)
+
+# Signal des Agenten -> Richtung der Einstiegsorder im Basiswert
+SIGNAL_ACTIONS = {"BUY CALL": "BUY", "BUY PUT": "SELL"}
+DEFAULT_RATE_LIMIT = 50  # Nachrichten je Sekunde (Grenze der IB-API)
+
+
+class Order:
+    __slots__ = ("order_id", "symbol", "action", "quantity", "order_type", "price", "parent_id", "transmit",
+                 "status", "fill_price", "queued_at", "submitted_at", "acked_at", "filled_at", "reason", "done")
+
+    def __init__(self, order_id, symbol, action, quantity, order_type="MKT", price=None, parent_id=None,
+                 transmit=True):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.action = action
+        self.quantity = quantity
+        self.order_type = order_type
+        self.price = price
+        self.parent_id = parent_id
+        self.transmit = transmit
+        self.status = PENDING
+        self.fill_price = None
+        self.queued_at = time.perf_counter()
+        self.submitted_at = self.acked_at = self.filled_at = None
+        self.reason = None
+        self.done = asyncio.get_running_loop().create_future()
+
+    def to_message(self):
+        return {"order_id": self.order_id, "symbol": self.symbol, "action": self.action, "quantity": self.quantity,
+                "order_type": self.order_type, "price": self.price, "parent_id": self.parent_id,
+                "transmit": self.transmit}
+
+    def __repr__(self):
+        return f"Order({self.order_id}, {self.symbol} {self.action} {self.quantity} {self.order_type}, {self.status})"
+
+
+class Bracket:
+    __slots__ = ("entry", "take_profit", "stop_loss")
+
+    def __init__(self, entry, take_profit, stop_loss):
+        """Einstiegsorder mit Take-Profit (Limit) und Stop-Loss (Stop) als OCA-Kind-Orders."""
+        self.entry = entry
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+
+    @property
+    def orders(self):
+        return self.entry, self.take_profit, self.stop_loss
+
+    @property
+    def exit(self):
+        """Ausgeführte Ausstiegsorder oder None."""
+        return next((order for order in (self.take_profit, self.stop_loss) if order.status == FILLED), None)
+
+    async def wait_closed(self):
+        """Wartet, bis keine Order der Bracket mehr aktiv ist."""
+        await asyncio.gather(*(order.done for order in self.orders))
+
+
+class OrderManager:
+    def __init__(self, address=DEFAULT_ADDRESS, rate_limit=DEFAULT_RATE_LIMIT, max_batch=20, on_fill=None,
+                 monitor=None):
+        """
+        Asynchrone Orderverwaltung: Orders werden sofort (ohne Warten auf den Broker) in eine Sende-Queue gelegt;
+        ein Sende-Task überträgt sie gebündelt unter einem Rate-Limit (Token-Bucket), ein Lese-Task verarbeitet
+        Bestätigungen, Ausführungen und Stornierungen. Die Signalverarbeitung wird dadurch nie blockiert.
+
+        :param address: Adresse des Brokers (Unix-Socket-Pfad oder host:port, z.B. PaperBroker)
+        :param rate_limit: Maximale Orders bzw. Stornierungen je Sekunde
+        :param max_batch: Maximale Orders je übertragener Nachricht
+        :param on_fill: Optionaler Callback on_fill(order) für jede Ausführung
+        :param monitor: Optionaler latency.LatencyMonitor (Stufen "order_ack" und "order_fill" je Symbol)
+        """
+        self.address = address
+        self.rate_limit = rate_limit
+        self.max_batch = max_batch
+        self.on_fill = on_fill
+        self.monitor = monitor
+        self.orders = {}
+        self.brackets = {}  # order_id -> Bracket (für jede der drei Orders)
+        self.positions = {}
+        self.last_prices = {}
+        self._ids = itertools.count(1)
+        self._queue = None
+        self._tasks = []
+        self._reader = self._writer = None
+
+    async def start(self):
+        self._reader, self._writer = await open_connection(self.address)
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._send_loop()), asyncio.create_task(self._read_loop())]
+        return self
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._writer is not None:
+            self._writer.close()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    # 📌 Orders erteilen (nicht blockierend)
+    def submit(self, symbol, action, quantity, order_type="MKT", price=None):
+        order = self._new_order(symbol, action, quantity, order_type, price)
+        self._queue.put_nowait(("submit", [order]))
+        return order
+
+    def submit_bracket(self, symbol, action, quantity, stop_loss, take_profit, limit_price=None):
+        """
+        Einstieg (Market oder Limit) mit Stop-Loss und Take-Profit als Bracket. Die drei Orders werden gemeinsam
+        übertragen; erst die letzte Kind-Order gibt die Bracket beim Broker frei (transmit).
+        """
+        exit_action = "SELL" if action == "BUY" else "BUY"
+        entry = self._new_order(symbol, action, quantity, "MKT" if limit_price is None else "LMT", limit_price,
+                                transmit=False)
+        take_profit = self._new_order(symbol, exit_action, quantity, "LMT", take_profit, entry.order_id, False)
+        stop = self._new_order(symbol, exit_action, quantity, "STP", stop_loss, entry.order_id, True)
+        self._queue.put_nowait(("submit", [entry, take_profit, stop]))
+        bracket = Bracket(entry, take_profit, stop)
+        for order in bracket.orders:
+            self.brackets[order.order_id] = bracket
+        return bracket
+
+    def on_signal(self, symbol, signal, stop_loss, take_profit, quantity):
+        """Setzt ein Signal von get_signal als Bracket im Basiswert um; HOLD liefert None."""
+        action = SIGNAL_ACTIONS.get(signal)
+        if action is None:
+            return None
+        return self.submit_bracket(symbol, action, quantity, stop_loss, take_profit)
+
+    def cancel(self, order):
+        if order.status not in FINAL_STATES:
+            self._queue.put_nowait(("cancel", order))
+
+    def cancel_bracket(self, bracket):
+        for order in bracket.orders:
+            self.cancel(order)
+
+    def modify(self, order, price):
+        if order.status not in FINAL_STATES:
+            self._queue.put_nowait(("modify", (order, price)))
+
+    def request_bars(self, bars=1):
+        """Fordert beim PaperBroker die nächsten Kerzen an (Wiedergabe im Takt der Clients)."""
+        self._writer.write((json.dumps({"type": "advance", "bars": bars}) + "\n").encode())
+
+    def open_orders(self):
+        return [order for order in self.orders.values() if order.status not in FINAL_STATES]
+
+    def _new_order(self, symbol, action, quantity, order_type, price, parent_id=None, transmit=True):
+        order = Order(next(self._ids), symbol, action, quantity, order_type, price, parent_id, transmit)
+        self.orders[order.order_id] = order
+        return order
+
+    # 📌 Senden und Empfangen
+    async def _send_loop(self):
+        tokens, refilled_at = float(self.rate_limit), time.monotonic()
+        while True:
+            items = [await self._queue.get()]
+            while not self._queue.empty() and sum(_cost(item) for item in items) < self.max_batch:
+                items.append(self._queue.get_nowait())
+
+            # Token-Bucket: Brackets werden nie aufgeteilt, bei Bedarf wird bis zum Auffüllen gewartet
+            cost = sum(_cost(item) for item in items)
+            while True:
+                now = time.monotonic()
+                tokens = min(float(self.rate_limit), tokens + (now - refilled_at) * self.rate_limit)
+                refilled_at = now
+                if tokens >= min(cost, self.rate_limit):
+                    break
+                await asyncio.sleep((min(cost, self.rate_limit) - tokens) / self.rate_limit)
+            tokens -= cost
+
+            orders = []
+            lines = []
+            for kind, payload in items:
+                if kind == "submit":
+                    orders.extend(payload)
+                elif kind == "cancel":
+                    lines.append({"type": "cancel", "order_id": payload.order_id})
+                else:
+                    lines.append({"type": "modify", "order_id": payload[0].order_id, "price": payload[1]})
+            submitted_at = time.perf_counter()
+            for order in orders:
+                order.status = SUBMITTED
+                order.submitted_at = submitted_at
+            if orders:
+                lines.insert(0, {"type": "submit", "orders": [order.to_message() for order in orders]})
+            self._writer.write("".join(json.dumps(line) + "\n" for line in lines).encode())
+            await self._writer.drain()
+
+    async def _read_loop(self):
+        try:
+            await self._read_messages()
+        finally:
+            # Verbindung beendet: offene Orders erhalten keine Nachricht mehr, ihre Futures werden aufgelöst
+            for order in self.open_orders():
+                order.reason = "Verbindung getrennt"
+                self._finish(order, REJECTED)
+
+    async def _read_messages(self):
+        while line := await self._reader.readline():
+            message = json.loads(line)
+            if message["type"] == "bar":
+                self.last_prices.update(message["close"])
+                continue
+            order = self.orders.get(message.get("order_id"))
+            if order is None:
+                continue
+            kind = message["type"]
+            now = time.perf_counter()
+            if kind == "ack":
+                order.acked_at = now
+                if self.monitor is not None:
+                    self.monitor.record("order_ack", order.symbol, int((now - order.submitted_at) * 1e9))
+                if order.status == SUBMITTED:
+                    order.status = ACKNOWLEDGED
+            elif kind == "fill":
+                order.fill_price = message["price"]
+                order.filled_at = now
+                if self.monitor is not None and order.order_type == "MKT":
+                    self.monitor.record("order_fill", order.symbol, int((now - order.submitted_at) * 1e9))
+                signed = order.quantity if order.action == "BUY" else -order.quantity
+                self.positions[order.symbol] = self.positions.get(order.symbol, 0) + signed
+                self._finish(order, FILLED)
+                if self.on_fill is not None:
+                    self.on_fill(order)
+            elif kind == "cancelled":
+                self._finish(order, CANCELLED)
+            elif kind == "rejected":
+                # Abgelehnte Stornierung/Änderung (Order bereits ausgeführt) ändert den Status nicht
+                if message.get("request") == "submit" and order.status not in FINAL_STATES:
+                    order.reason = message.get("reason")
+                    self._finish(order, REJECTED)
+                    self._abandon_bracket(order)
+            elif kind == "modified":
+                order.price = message["price"]
+
+    def _abandon_bracket(self, rejected):
+        """
+        Ohne alle drei Orders ist eine Bracket unvollständig: übrige Orders stornieren. Ihr Status folgt erst der
+        Antwort des Brokers (cancelled bzw. rejected), ihre Futures lösen sich dann oder beim Verbindungsende.
+        """
+        bracket = self.brackets.get(rejected.order_id)
+        if bracket is None:
+            return
+        for order in bracket.orders:
+            self.cancel(order)
+
+    def _finish(self, order, status):
+        order.status = status
+        if not order.done.done():
+            order.done.set_result(status)
+
+    def latency_stats(self):
+        """Latenzen in Millisekunden (Median, p99): Warten in der Queue, Übertragung bis Bestätigung / Ausführung."""
+        orders = list(self.orders.values())
+        samples = {
+            "queue": [o.submitted_at - o.queued_at for o in orders if o.submitted_at is not None],
+            "ack": [o.acked_at - o.submitted_at for o in orders if o.acked_at is not None],
+            "fill": [o.filled_at - o.submitted_at for o in orders
+                     if o.filled_at is not None and o.order_type == "MKT"],
+        }
+        return {name: {"count": len(values), "p50_ms": round(float(np.percentile(values, 50)) * 1000, 3),
+                       "p99_ms": round(float(np.percentile(values, 99)) * 1000, 3)}
+                for name, values in samples.items() if values}
+
+
+def _cost(item):
+    kind, payload = item
+    return len(payload) if kind == "submit" else 1
+
+
+async def run_benchmark(address, symbols, brackets, rate_limit=DEFAULT_RATE_LIMIT, max_batch=20, advance_every=0):
+    """
+    Durchsatz und Latenz gegen einen laufenden Broker: erteilt `brackets` Brackets reihum über die Symbole,
+    wartet auf alle Einstiege und storniert danach offene Ausstiegsorders.
+
+    :param advance_every: Nach je so vielen Brackets eine Kerze beim PaperBroker anfordern (0 = nie)
+    """
+    async with OrderManager(address, rate_limit, max_batch) as manager:
+        while not manager.last_prices:
+            await asyncio.sleep(0.001)  # Schlusskurse der aktuellen Kerze (erste Nachricht des Brokers)
+        start = time.perf_counter()
+        submitted = []
+        for i in range(brackets):
+            symbol = symbols[i % len(symbols)]
+            price = manager.last_prices[symbol]
+            action, sign = ("BUY", 1) if i % 2 == 0 else ("SELL", -1)
+            submitted.append(manager.submit_bracket(symbol, action, 1, stop_loss=round(price * (1 - 0.002 * sign), 2),
+                                                    take_profit=round(price * (1 + 0.004 * sign), 2)))
+            if advance_every and (i + 1) % advance_every == 0:
+                manager.request_bars()
+            if i % max_batch == 0:
+                await asyncio.sleep(0)  # Signalverarbeitung läuft weiter, Sende-Task überträgt im Hintergrund
+        await asyncio.gather(*(bracket.entry.done for bracket in submitted))
+        elapsed = time.perf_counter() - start
+
+        for bracket in submitted:
+            manager.cancel_bracket(bracket)
+        await asyncio.gather(*(bracket.wait_closed() for bracket in submitted))
+        statuses = {}
+        for order in manager.orders.values():
+            statuses[order.status] = statuses.get(order.status, 0) + 1
+        return {"brackets": brackets, "seconds": round(elapsed, 3),
+                "brackets_per_second": round(brackets / elapsed, 1), "statuses": statuses,
+                "exits": sum(bracket.exit is not None for bracket in submitted),
+                "latency": manager.latency_stats()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Durchsatz- und Latenzmessung der Orderverwaltung")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Adresse des Brokers (Unix-Socket oder host:port)")
+    parser.add_argument("--spawn", action="store_true", help="PaperBroker als eigenen Prozess starten")
+    parser.add_argument("--symbols", nargs="+", default=["SPY"])
+    parser.add_argument("--brackets", type=int, default=1000)
+    parser.add_argument("--rate-limit", type=float, default=DEFAULT_RATE_LIMIT)
+    parser.add_argument("--max-batch", type=int, default=20)
+    parser.add_argument("--advance-every", type=int, default=0, help="Kerze je N Brackets anfordern")
+    parser.add_argument("--ack-latency", type=float, default=0.0, help="Nur mit --spawn")
+    parser.add_argument("--fill-latency", type=float, default=0.0, help="Nur mit --spawn")
+    parser.add_argument("--broker-rate-limit", type=float, help="Rate-Limit des Brokers (nur mit --spawn)")
+    args, broker_args = parser.parse_known_args(argv)
+
+    broker = None
+    if args.spawn:
+        if os.path.exists(args.address):
+            os.remove(args.address)
+        broker = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                "PaperBroker.py"),
+                                   "--address", args.address, "--ack-latency", str(args.ack_latency),
+                                   "--fill-latency", str(args.fill_latency), *broker_args,
+                                   *(["--rate-limit", str(args.broker_rate_limit)] if args.broker_rate_limit else [])])
+        while not os.path.exists(args.address):
+            if broker.poll() is not None:
+                raise RuntimeError("PaperBroker konnte nicht gestartet werden")
+            time.sleep(0.05)
+    try:
+        result = asyncio.run(run_benchmark(args.address, args.symbols, args.brackets, args.rate_limit,
+                                           args.max_batch, args.advance_every))
+        print(f"📊 {result['brackets']} Brackets in {result['seconds']} s ({result['brackets_per_second']}/s), "
+              f"Ausstiege: {result['exits']}, Status: {result['statuses']}")
+        for name, stats in result["latency"].items():
+            print(f"   ⏱️ {name:<6} n={stats['count']:<6} p50 {stats['p50_ms']:>8.3f} ms   p99 {stats['p99_ms']:>8.3f} ms")
+    finally:
+        if broker is not None:
+            broker.terminate()
+            broker.wait()
+
+
+if __name__ == "__main__":
+    main()
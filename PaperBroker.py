@@ -0,0 +1,323 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import time
+
+import numpy as np
+
+# 📌 Lokaler Paper-Broker als eigener Prozess: nimmt Orders über einen Unix-Socket (oder TCP "host:port") als
+# JSON-Zeilen entgegen, bestätigt sie mit konfigurierbarer Latenz und füllt sie anhand abgespielter Kerzen.
+# Nachrichten an den Broker:
+#   {"type": "submit", "orders": [{"order_id", "symbol", "action", "quantity", "order_type", "price", "parent_id",
+#                                  "transmit"}]}
+#   {"type": "cancel", "order_id"} / {"type": "modify", "order_id", "price"} / {"type": "advance", "bars"}
+# Nachrichten vom Broker: ack, fill, cancelled, modified, rejected (jeweils mit "order_id"; rejected zusätzlich mit
+# "request" = abgelehnte Anfrage submit/cancel/modify) und bar (Schlusskurse je Symbol, beim Verbinden und nach
+# jeder abgespielten Kerze). Nachrichten einer Verbindung kommen in der Reihenfolge an, in der sie erzeugt wurden.
+ORDER_TYPES = ("MKT", "LMT", "STP")
+ACTIONS = ("BUY", "SELL")
+DEFAULT_ADDRESS = "/tmp/tradehive_paperbroker.sock"
+
+
+async def open_connection(address):
+    """Verbindung zu einer Adresse: "host:port" für TCP, sonst Pfad eines Unix-Sockets."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return await asyncio.open_connection(host, int(port))
+    return await asyncio.open_unix_connection(address)
+
+
+async def start_server(handler, address):
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return await asyncio.start_server(handler, host, int(port))
+    if os.path.exists(address):
+        os.remove(address)
+    return await asyncio.start_unix_server(handler, address)
+
+
+class _Session:
+    __slots__ = ("writer", "tokens", "refilled_at", "outbox", "last_due")
+
+    def __init__(self, writer, rate_limit):
+        self.writer = writer
+        self.tokens = rate_limit
+        self.refilled_at = time.monotonic()
+        self.outbox = collections.deque()  # (Sendezeitpunkt, Daten) in Erzeugungsreihenfolge
+        self.last_due = 0.0
+
+
+class PaperBroker:
+    def __init__(self, bars, ack_latency=0.0, fill_latency=0.0, bar_interval=0.0, rate_limit=None):
+        """
+        Simulierter Broker für Offline-Tests der Orderverwaltung.
+
+        - Market-Orders werden zum Schlusskurs der aktuellen Kerze gefüllt.
+        - Limit- und Stop-Orders werden bei jeder neuen Kerze gegen High/Low geprüft (Kurslücken zum Open).
+          Lösen Stop und Limit derselben Bracket in einer Kerze aus, gewinnt der Stop (wie im Backtester).
+        - Kind-Orders (parent_id) sind erst nach der Ausführung der Eltern-Order aktiv; die Ausführung einer
+          Kind-Order storniert ihre Geschwister (OCA-Gruppe). Orders mit transmit=False warten auf die Freigabe
+          durch eine nachfolgende Kind-Order mit transmit=True.
+
+        :param bars: Dictionary Symbol -> DataFrame mit open/high/low/close (abgespielt Kerze für Kerze)
+        :param ack_latency: Sekunden bis zur Bestätigung einer Order
+        :param fill_latency: Zusätzliche Sekunden bis zur Ausführungsmeldung
+        :param bar_interval: Sekunden je abgespielter Kerze (0 = nur auf "advance"-Nachricht)
+        :param rate_limit: Maximale Orders je Sekunde und Verbindung (darüber: "rejected"), None = unbegrenzt
+        """
+        self.bars = {symbol: {"time": df.index.astype("int64").to_numpy() // 10 ** 9,
+                              **{name: df[name].to_numpy(dtype=np.float64) for name in ("open", "high", "low", "close")}}
+                     for symbol, df in bars.items()}
+        self.position = {symbol: 0 for symbol in bars}
+        self.ack_latency = ack_latency
+        self.fill_latency = fill_latency
+        self.bar_interval = bar_interval
+        self.rate_limit = rate_limit
+        self.orders = {}      # aktive Orders: order_id -> Order-Dictionary
+        self.children = {}    # parent_id -> Liste der Kind-Order-IDs
+        self.sessions = set()
+        self.bar_index = 0
+        self.counts = {"orders": 0, "fills": 0, "rejected": 0, "cancelled": 0}
+
+    # 📌 Verbindungen
+    async def serve(self, address=DEFAULT_ADDRESS):
+        server = await start_server(self._handle, address)
+        print(f"📡 Paper-Broker bereit: {address} ({', '.join(self.bars)})")
+        async with server:
+            if self.bar_interval > 0:
+                asyncio.get_running_loop().create_task(self._replay())
+            await server.serve_forever()
+
+    async def _replay(self):
+        while self.advance():
+            await asyncio.sleep(self.bar_interval)
+
+    async def _handle(self, reader, writer):
+        session = _Session(writer, self.rate_limit or 0)
+        self.sessions.add(session)
+        self._send(session, self._bar_message())
+        try:
+            while line := await reader.readline():
+                self._dispatch(session, json.loads(line))
+        except (ConnectionError, json.JSONDecodeError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+    def _dispatch(self, session, message):
+        kind = message.get("type")
+        if kind == "submit":
+            # Eine Bracket (Eltern-Order mit ihren Kind-Orders) wird als Einheit angenommen oder abgelehnt
+            units = {}
+            for order in message["orders"]:
+                units.setdefault(order.get("parent_id") or order["order_id"], []).append(order)
+            for orders in units.values():
+                self._submit(session, orders)
+        elif kind == "cancel":
+            self._cancel(message["order_id"], session)
+        elif kind == "modify":
+            order = self.orders.get(message["order_id"])
+            if order is None:
+                self._send(session, {"type": "rejected", "order_id": message["order_id"], "request": "modify",
+                                     "reason": "unbekannt"}, self.ack_latency)
+            else:
+                order["price"] = message["price"]
+                self._send(session, {"type": "modified", "order_id": order["order_id"], "price": order["price"]},
+                           self.ack_latency)
+        elif kind == "advance":
+            for _ in range(message.get("bars", 1)):
+                self.advance()
+
+    def _send(self, session, message, delay=0.0):
+        """
+        Sendet nach `delay` Sekunden, aber nie vor einer früher erzeugten Nachricht derselben Verbindung: eine
+        sofortige Ablehnung kann so eine verzögerte Bestätigung oder Ausführung nicht überholen.
+        """
+        loop = asyncio.get_running_loop()
+        due = max(loop.time() + delay, session.last_due)
+        session.last_due = due
+        session.outbox.append((due, (json.dumps(message) + "\n").encode()))
+        if len(session.outbox) == 1:
+            self._flush(session)
+
+    def _flush(self, session):
+        loop = asyncio.get_running_loop()
+        while session.outbox and session.outbox[0][0] <= loop.time():
+            self._write(session, session.outbox.popleft()[1])
+        if session.outbox:
+            loop.call_at(session.outbox[0][0], self._flush, session)
+
+    def _write(self, session, data):
+        if session in self.sessions:
+            session.writer.write(data)
+
+    def _take_token(self, session, count=1):
+        if not self.rate_limit:
+            return True
+        now = time.monotonic()
+        session.tokens = min(self.rate_limit, session.tokens + (now - session.refilled_at) * self.rate_limit)
+        session.refilled_at = now
+        if session.tokens < count:
+            return False
+        session.tokens -= count
+        return True
+
+    # 📌 Orders
+    def _submit(self, session, orders):
+        """Nimmt zusammengehörige Orders (Einzelorder oder Bracket) ganz oder gar nicht an."""
+        reason = None
+        if not self._take_token(session, len(orders)):
+            reason = "Rate-Limit überschritten"
+        for order in orders if reason is None else ():
+            if order.get("symbol") not in self.bars:
+                reason = f"Unbekanntes Symbol: {order.get('symbol')}"
+            elif order.get("action") not in ACTIONS or order.get("order_type") not in ORDER_TYPES:
+                reason = "Ungültige Order"
+            elif order.get("parent_id") is not None and order["parent_id"] not in self.orders \
+                    and order["parent_id"] != orders[0]["order_id"]:
+                reason = "Eltern-Order nicht aktiv"
+            if reason:
+                break
+        if reason:
+            self.counts["rejected"] += len(orders)
+            for order in orders:
+                self._send(session, {"type": "rejected", "order_id": order["order_id"], "request": "submit",
+                                     "reason": reason}, self.ack_latency)
+            return
+        for order in orders:
+            self._accept(session, order)
+
+    def _accept(self, session, order):
+        order_id = order["order_id"]
+        self.counts["orders"] += 1
+        parent_id = order.get("parent_id")
+        order = dict(order, session=session, active=parent_id is None and order.get("transmit", True))
+        self.orders[order_id] = order
+        if parent_id is not None:
+            self.children.setdefault(parent_id, []).append(order_id)
+        self._send(session, {"type": "ack", "order_id": order_id}, self.ack_latency)
+
+        # Wie bei IB: eine Bracket wird mit transmit=False für Eltern- und erste Kind-Order übertragen und erst
+        # mit der letzten Kind-Order freigegeben
+        if parent_id is not None and order.get("transmit", True):
+            parent = self.orders[parent_id]
+            if not parent["active"]:
+                parent["active"] = True
+                order = parent
+        if order["active"] and order["order_type"] == "MKT":
+            self._fill(order, self._bar(order["symbol"])["close"])
+
+    def _cancel(self, order_id, session=None):
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            if session is not None:
+                self._send(session, {"type": "rejected", "order_id": order_id, "request": "cancel",
+                                     "reason": "nicht aktiv"}, self.ack_latency)
+            return
+        self.counts["cancelled"] += 1
+        self._send(order["session"], {"type": "cancelled", "order_id": order_id}, self.ack_latency)
+        for child_id in self.children.pop(order_id, []):
+            self._cancel(child_id)
+
+    def _fill(self, order, price):
+        del self.orders[order["order_id"]]
+        self.counts["fills"] += 1
+        quantity = order["quantity"] if order["action"] == "BUY" else -order["quantity"]
+        self.position[order["symbol"]] += quantity
+        bar = self._bar(order["symbol"])
+        self._send(order["session"], {"type": "fill", "order_id": order["order_id"], "price": price,
+                                      "quantity": order["quantity"], "bar_time": bar["time"]},
+                   self.ack_latency + self.fill_latency)
+
+        # Geschwister stornieren (OCA) bzw. Kind-Orders aktivieren (Bracket)
+        for sibling_id in order.get("oca", ()):
+            if sibling_id != order["order_id"] and sibling_id in self.orders:
+                self._cancel(sibling_id)
+        children = self.children.pop(order["order_id"], [])
+        for child_id in children:
+            child = self.orders.get(child_id)
+            if child is not None:
+                child["active"] = True
+                child["oca"] = children
+        for child_id in children:
+            child = self.orders.get(child_id)
+            if child is not None and child["order_type"] == "MKT":
+                self._fill(child, bar["close"])
+
+    def _bar(self, symbol):
+        data = self.bars[symbol]
+        position = min(self.bar_index, len(data["close"]) - 1)
+        return {name: values[position].item() for name, values in data.items()}
+
+    def _bar_message(self):
+        return {"type": "bar", "bar_index": self.bar_index,
+                "close": {symbol: self._bar(symbol)["close"] for symbol in self.bars}}
+
+    def advance(self):
+        """Spielt die nächste Kerze ab und prüft alle aktiven Limit-/Stop-Orders; False am Ende der Daten."""
+        if all(self.bar_index + 1 >= len(data["close"]) for data in self.bars.values()):
+            return False
+        self.bar_index += 1
+        bars = {symbol: self._bar(symbol) for symbol in self.bars}
+        message = self._bar_message()
+        for session in list(self.sessions):
+            self._send(session, message)
+
+        # Stops vor Limits prüfen: lösen beide einer Bracket in derselben Kerze aus, gewinnt der Stop
+        for order_type in ("STP", "LMT"):
+            for order in [o for o in self.orders.values() if o["active"] and o["order_type"] == order_type]:
+                if order["order_id"] not in self.orders:
+                    continue  # bereits durch OCA storniert
+                price = _trigger_price(order, bars[order["symbol"]])
+                if price is not None:
+                    self._fill(order, price)
+        return True
+
+
+def _trigger_price(order, bar):
+    """Ausführungspreis einer Limit-/Stop-Order in der Kerze (bei Kurslücke zum Open) oder None."""
+    buy = order["action"] == "BUY"
+    price = order["price"]
+    if order["order_type"] == "LMT":
+        if buy and bar["low"] <= price:
+            return min(price, bar["open"])
+        if not buy and bar["high"] >= price:
+            return max(price, bar["open"])
+    else:
+        if buy and bar["high"] >= price:
+            return max(price, bar["open"])
+        if not buy and bar["low"] <= price:
+            return min(price, bar["open"])
+    return None
+
+
+def main(argv=None):
+    from storage import load_frame
+
+    parser = argparse.ArgumentParser(description="Lokaler Paper-Broker (Unix-Socket oder TCP)")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="Pfad des Unix-Sockets oder host:port")
+    parser.add_argument("--data", nargs="+", default=["SPY=saved_data/SPY_test_5min.parquet"],
+                        metavar="SYMBOL=PFAD", help="Abgespielte Kerzen je Symbol")
+    parser.add_argument("--ack-latency", type=float, default=0.0, help="Sekunden bis zur Bestätigung")
+    parser.add_argument("--fill-latency", type=float, default=0.0, help="Zusätzliche Sekunden bis zur Ausführung")
+    parser.add_argument("--bar-interval", type=float, default=0.0,
+                        help="Sekunden je Kerze (0 = Kerzen nur auf Anforderung der Clients)")
+    parser.add_argument("--rate-limit", type=float, help="Maximale Orders je Sekunde und Verbindung")
+    args = parser.parse_args(argv)
+
+    bars = {}
+    for item in args.data:
+        symbol, _, path = item.partition("=")
+        bars[symbol] = load_frame(path)
+    broker = PaperBroker(bars, args.ack_latency, args.fill_latency, args.bar_interval, args.rate_limit)
+    try:
+        asyncio.run(broker.serve(args.address))
+    except KeyboardInterrupt:
+        print(f"🛑 Paper-Broker beendet: {broker.counts}")
+
+
+if __name__ == "__main__":
+    main()
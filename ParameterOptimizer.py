@@ -1,3 +1,5 @@
+import argparse
+import math
 import pandas as pd
 import numpy as np
 import multiprocessing
@@ -6,11 +8,29 @@ import random
 import time
 import threading
 from backtester import Backtester
+from FillModel import DEFAULT_IMPACT, QuoteFillModel
 from MomentumBreakoutAgent import MomentumBreakoutAgent
-
-# Laden der Marktdaten
-df_5min = pd.read_parquet("saved_data/SPY_train_5min.parquet")
-df_15min = pd.read_parquet("saved_data/SPY_train_15min.parquet")
+from profiling import profiler, merge_snapshots, export_profile
+from SearchStrategies import STRATEGIES, Real, Integer, Categorical, run_search
+from storage import load_frame
+
+# Marktdaten der Worker-Prozesse (load_market_data als Pool-Initializer, funktioniert mit fork und spawn)
+df_5min = None
+df_15min = None
+fill_model = None
+
+
+def load_market_data(path_5min="saved_data/SPY_train_5min.parquet", path_15min="saved_data/SPY_train_15min.parquet",
+                     path_quotes=None, impact=DEFAULT_IMPACT):
+    """
+    Lädt die Trainingsdaten für die Optimierung. Mit `path_quotes` rechnen alle Backtests mit Quote-Fills; die
+    As-of-Zuordnung zu den Kerzen berechnet jeder Worker einmal und verwendet sie für alle weiteren Backtests.
+    """
+    global df_5min, df_15min, fill_model
+    with profiler.stage("optimizer.load"):
+        df_5min = load_frame(path_5min)
+        df_15min = load_frame(path_15min)
+        fill_model = QuoteFillModel(load_frame(path_quotes), impact) if path_quotes else None
 
 # Parameterbereiche für die Optimierung
 param_grid = {
@@ -24,21 +44,80 @@ param_grid = {
 }
 
 num_combinations = 100
-param_combinations = random.sample(list(itertools.product(*param_grid.values())), num_combinations)
+
+
+def sample_param_combinations(count=num_combinations, seed=None):
+    """Zufällige Stichprobe aus param_grid (erst bei Bedarf, nicht beim Import)."""
+    combinations = list(itertools.product(*param_grid.values()))
+    return random.Random(seed).sample(combinations, min(count, len(combinations)))
+
+
+# Suchraum für die adaptiven Strategien (--strategy evolution/tpe/random) mit kontinuierlichen Bereichen
+param_space = {
+    "breakout_window": Integer(5, 60),
+    "ema_trend_filter": Categorical([True, False]),
+    "atr_multiplier_sl": Real(1.0, 5.0, step=0.05),
+    "atr_multiplier_tp": Real(1.5, 8.0, step=0.05),
+    "volume_confirmation": Categorical([True, False]),
+    "min_candle_body_ratio": Real(0.1, 0.9, step=0.05),
+    "min_adx_15m": Integer(5, 40),
+    "min_atr_threshold": Real(0.01, 0.5, step=0.01),
+    "slippage_adjustment": Real(0.0, 0.05, step=0.005)
+}
+
+
+def _require_market_data():
+    if df_5min is None:
+        raise RuntimeError("Marktdaten nicht geladen: load_market_data() (bzw. als Pool-Initializer) aufrufen")
 
 
 def is_valid_params(params):
-    param_dict = dict(zip(param_grid.keys(), params))
-    return param_dict["atr_multiplier_sl"] < param_dict["atr_multiplier_tp"]
+    return is_valid_agent_params(dict(zip(param_grid.keys(), params)))
+
+
+def is_valid_agent_params(agent_params):
+    """Nebenbedingung der Suche: Stop-Loss enger als Take-Profit."""
+    return agent_params["atr_multiplier_sl"] < agent_params["atr_multiplier_tp"]
+
+
+def run_params_with_timeout(agent_params, timeout=60):
+    """Wie run_backtest_with_timeout, aber für Parameter als Dictionary (adaptive Suchstrategien)."""
+    if not is_valid_agent_params(agent_params):
+        return None
+    _require_market_data()
+    return evaluate_params(agent_params, df_5min, df_15min, timeout)
+
+
+def make_objective(column="sharpe_ratio", min_trades=10):
+    """Bewertung eines Ergebnisses für die Suchstrategien; zu wenige Trades gelten als ungültig."""
+    def objective(result):
+        if result["num_trades"] < min_trades:
+            return -math.inf
+        return float(result[column])
+    return objective
+
+
+def run_profiled_backtest(task):
+    """Worker-Einstieg bei aktivem Profiling: misst Wartezeit in der Queue und hängt das Worker-Profil an."""
+    params, submitted_at = task
+    profiler.reset()
+    profiler.add("optimizer.queue_wait", max(0.0, time.time() - submitted_at))
+    with profiler.stage("optimizer.execute"):
+        result = run_backtest_with_timeout(params)
+    return result, profiler.snapshot()
 
 
 def run_backtest_with_timeout(params, timeout=60):
     if not is_valid_params(params):
         return None
+    _require_market_data()
+    return evaluate_params(dict(zip(param_grid.keys(), params)), df_5min, df_15min, timeout)
+
 
-    agent_params = dict(zip(param_grid.keys(), params))
+def evaluate_params(agent_params, data_5min, data_15min, timeout=60):
+    """Backtest einer Parameterkombination (Dictionary) auf den übergebenen Daten, Ergebnis als Tabellenzeile."""
     agent = MomentumBreakoutAgent(**agent_params)
-    backtester = Backtester(agent, df_5min, df_15min, visualize=False)
+    backtester = Backtester(agent, data_5min, data_15min, visualize=False, fill_model=fill_model)
     result = {}
 
     def target():
@@ -66,28 +145,93 @@ def run_backtest_with_timeout(params, timeout=60):
         "sharpe_ratio": result.get("Sharpe Ratio", 0),
         "num_trades": result.get("Total Trades", 0),
         "max_drawdown": result.get("Max Drawdown", 0),
-        "win_rate": result.get("Win Rate (%)", 0)  # Winrate hinzufügen
+        "win_rate": result.get("Win Rate (%)", 0),  # Winrate hinzufügen
+        "exposure": result.get("Exposure (%)", 0),
+        "profit_factor": result.get("Profit Factor", 0)
     }
 
 
-if __name__ == '__main__':
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameteroptimierung für den MomentumBreakoutAgent")
+    parser.add_argument("--strategy", choices=["grid", *STRATEGIES], default="grid",
+                        help="grid = Stichprobe aus param_grid, sonst adaptive Suche über param_space")
+    parser.add_argument("--trials", type=int, default=num_combinations, help="Anzahl Backtests")
+    parser.add_argument("--objective", default="sharpe_ratio", help="Zu maximierende Ergebnisspalte")
+    parser.add_argument("--min-trades", type=int, default=10)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--data-5min", default="saved_data/SPY_train_5min.parquet")
+    parser.add_argument("--data-15min", default="saved_data/SPY_train_15min.parquet")
+    parser.add_argument("--quotes", help="Quote-Daten (bid_price/ask_price) für spread-bewusste Fills")
+    parser.add_argument("--impact", type=float, default=DEFAULT_IMPACT, help="Impact-Koeffizient der Quote-Fills")
+    parser.add_argument("--output", default="optimization_results.csv")
+    parser.add_argument("--start-method", choices=multiprocessing.get_all_start_methods(),
+                        help="Startmethode der Worker-Prozesse (Standard der Plattform)")
+    args = parser.parse_args(argv)
+
     num_cores = max(1, multiprocessing.cpu_count() - 1)
     print(f"🔄 Starte Parameteroptimierung mit {num_cores} Kernen...")
 
     start_time = time.time()
     results = []
+    total = args.trials
+
+    worker_profiles = {}
 
-    with multiprocessing.Pool(num_cores) as pool:
-        for i, res in enumerate(pool.imap_unordered(run_backtest_with_timeout, param_combinations), 1):
+    # Jeder Worker lädt die Daten selbst (mit spawn erbt er keine globalen Variablen des Hauptprozesses)
+    context = multiprocessing.get_context(args.start_method)
+    with context.Pool(num_cores, initializer=load_market_data,
+                      initargs=(args.data_5min, args.data_15min, args.quotes, args.impact)) as pool:
+        if args.strategy != "grid":
+            strategy = STRATEGIES[args.strategy](param_space, seed=args.seed, constraint=is_valid_agent_params)
+
+            def report(i, params, res):
+                elapsed_time = time.time() - start_time
+                remaining_time = elapsed_time / i * (args.trials - i)
+                print(f"🚀 Fortschritt: {i / args.trials * 100:.2f}% - Verstrichen: {elapsed_time:.1f}s - "
+                      f"Geschätzt: {remaining_time:.1f}s verbleibend")
+
+            results = run_search(strategy, run_params_with_timeout, make_objective(args.objective, args.min_trades),
+                                 args.trials, pool, num_cores, on_result=report)
+            best_score, best_params = strategy.best()
+            print(f"🏆 Beste Bewertung ({args.objective}): {best_score} - {best_params}")
+            iterator = []  # Ergebnisse liegen bereits vor
+        else:
+            param_combinations = sample_param_combinations(args.trials, args.seed)
+            total = len(param_combinations)
+            if profiler.enabled:
+                tasks = ((params, time.time()) for params in param_combinations)
+                iterator = pool.imap_unordered(run_profiled_backtest, tasks)
+            else:
+                iterator = pool.imap_unordered(run_backtest_with_timeout, param_combinations)
+
+        for i, res in enumerate(iterator, 1):
+            if profiler.enabled:
+                res, snapshot = res
+                pid = str(snapshot["pid"])
+                if pid in worker_profiles:
+                    snapshot = {**merge_snapshots([worker_profiles[pid], snapshot]), "pid": snapshot["pid"]}
+                worker_profiles[pid] = snapshot
             if res:
                 results.append(res)
-                progress = (i / num_combinations) * 100
+                progress = (i / total) * 100
                 elapsed_time = time.time() - start_time
-                estimated_total_time = (elapsed_time / i) * num_combinations
+                estimated_total_time = (elapsed_time / i) * total
                 remaining_time = estimated_total_time - elapsed_time
                 print(
                     f"🚀 Fortschritt: {progress:.2f}% - Verstrichen: {elapsed_time:.1f}s - Geschätzt: {remaining_time:.1f}s verbleibend")
 
-    df_results = pd.DataFrame(results)
-    df_results.to_csv("optimization_results.csv", index=False)
-    print(f"✅ Optimierung abgeschlossen! Ergebnisse gespeichert: optimization_results.csv")
+    with profiler.stage("optimizer.serialize"):
+        df_results = pd.DataFrame(results)
+        df_results.to_csv(args.output, index=False)
+    print(f"✅ Optimierung abgeschlossen! Ergebnisse gespeichert: {args.output}")
+
+    if profiler.enabled:
+        wall_time = time.time() - start_time
+        total_profile = merge_snapshots([profiler.snapshot(), *worker_profiles.values()])
+        export_profile("optimization_profile.json", total_profile, worker_profiles, wall_time_s=round(wall_time, 3),
+                       configs_per_sec=round(total / wall_time, 3))
+        print(f"📊 Profil gespeichert: optimization_profile.json")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+import heapq
+import numpy as np
+import pandas as pd
+from profiling import profiler
+from MarketWindow import MarketWindow
+from backtester import (TradeLedger, CALL, PUT, TRADE_DIRECTIONS, calculate_max_drawdown,
+                        calculate_trade_metrics)
+
+FLAT = 0
+
+
+class PortfolioLedger(TradeLedger):
+    # Trade-Journal mit zusätzlicher Symbol-Spalte
+    FIELDS = {**TradeLedger.FIELDS, "symbol": np.int32}
+
+    def append(self, symbol, *values):
+        row = len(self)
+        super().append(*values)
+        self._columns["symbol"][row] = symbol
+
+
+class PortfolioBacktester:
+    def __init__(self, agent, data, initial_balance=100000, slippage=0.01, fee_per_trade=0.0001, max_positions=10):
+        """
+        Portfolio-Backtester für viele Symbole mit gemeinsamem Kapital in einem zeitlich geordneten Durchlauf.
+
+        Die 5- und 15-Min-Daten aller Symbole werden zu je einem zusammenhängenden Array-Block verbunden
+        (Symbol s belegt die Zeilen offsets[s]:offsets[s+1]); Positionen werden in Arrays je Symbol geführt.
+        Freies Kapital wird bei jedem Einstieg gleichmäßig auf die freien Positionsplätze verteilt.
+
+        :param agent: Ein Agent für alle Symbole oder Dictionary Symbol -> Agent
+        :param data: Dictionary Symbol -> (df_5min, df_15min)
+        :param max_positions: Maximale Anzahl gleichzeitig offener Positionen
+        """
+        self.symbols = list(data)
+        self.agents = [agent[symbol] if isinstance(agent, dict) else agent for symbol in self.symbols]
+        self.data = data
+        self.initial_balance = initial_balance
+        self.slippage = slippage
+        self.fee_per_trade = fee_per_trade
+        self.max_positions = max_positions
+
+        self.cash = initial_balance
+        self.ledger = PortfolioLedger()
+        self.equity_curve = None
+        self.timeline = None
+
+        num_symbols = len(self.symbols)
+        # Positionszustand je Symbol (Array-basiert)
+        self.position = np.zeros(num_symbols, dtype=np.int8)
+        self.entry_index = np.zeros(num_symbols, dtype=np.int64)
+        self.entry_price = np.zeros(num_symbols, dtype=np.float64)
+        self.stop_loss = np.zeros(num_symbols, dtype=np.float64)
+        self.take_profit = np.zeros(num_symbols, dtype=np.float64)
+        self.size = np.zeros(num_symbols, dtype=np.float64)
+        self.allocation = np.zeros(num_symbols, dtype=np.float64)
+        self.trade_id = np.zeros(num_symbols, dtype=np.int64)
+
+    def _prepare_data(self):
+        """Verbindet die Daten aller Symbole zu Array-Blöcken und berechnet Offsets und 15-Min-Sichtbarkeit."""
+        frames_5min = [self.data[symbol][0] for symbol in self.symbols]
+        frames_15min = [self.data[symbol][1] for symbol in self.symbols]
+        self.offsets_5min = np.concatenate(([0], np.cumsum([len(df) for df in frames_5min])))
+        self.offsets_15min = np.concatenate(([0], np.cumsum([len(df) for df in frames_15min])))
+
+        combined_5min = pd.concat(frames_5min)
+        combined_15min = pd.concat(frames_15min)
+        self.window_5min = MarketWindow(combined_5min)
+        self.window_15min = MarketWindow(combined_15min)
+        self.times = combined_5min.index.asi8
+        self.high = self.window_5min.full_array('high').astype(np.float64)
+        self.low = self.window_5min.full_array('low').astype(np.float64)
+        self.close = self.window_5min.full_array('close').astype(np.float64)
+
+        # Anzahl sichtbarer 15-Min-Kerzen je 5-Min-Zeitstempel (lokal je Symbol)
+        self.visible_15min = np.empty(len(combined_5min), dtype=np.int64)
+        times_15min = combined_15min.index.asi8
+        for s in range(len(self.symbols)):
+            rows_5min = slice(self.offsets_5min[s], self.offsets_5min[s + 1])
+            rows_15min = slice(self.offsets_15min[s], self.offsets_15min[s + 1])
+            self.visible_15min[rows_5min] = np.searchsorted(times_15min[rows_15min], self.times[rows_5min],
+                                                            side="right")
+
+        # Globale Zeitachse (alle Zeitstempel aller Symbole) und Position jeder Kerze darauf
+        self.timeline = np.unique(self.times)
+        self.timeline_position = np.searchsorted(self.timeline, self.times)
+
+    def _candidate_events(self):
+        """
+        Liefert die Kandidaten-Schritte aller Symbole als zeitlich sortierte Arrays (Zeit, Symbol, Schritt).
+        Agenten ohne get_candidate_mask werden bei jedem Schritt aufgerufen.
+        """
+        times, symbols, steps = [], [], []
+        for s, agent in enumerate(self.agents):
+            start, stop = self.offsets_5min[s], self.offsets_5min[s + 1]
+            num_bars = stop - start
+            if num_bars < 2:
+                continue
+            visible = self.visible_15min[start:stop]
+            if hasattr(agent, "get_candidate_mask"):
+                self.window_5min.set_bounds(start, stop)
+                self.window_15min.set_bounds(self.offsets_15min[s], self.offsets_15min[s + 1])
+                last_15min = np.empty(num_bars, dtype=np.int64)
+                last_15min[:-1] = visible[1:] - 1
+                last_15min[-1] = visible[-1] - 1
+                mask = np.asarray(agent.get_candidate_mask(self.window_5min, self.window_15min, last_15min), dtype=bool)
+                step = np.flatnonzero(mask[:-1]) + 1
+            else:
+                step = np.arange(1, num_bars)
+            step = step[visible[step] > 0]
+            times.append(self.times[start + step])
+            symbols.append(np.full(len(step), s, dtype=np.int64))
+            steps.append(step)
+
+        if not times:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64)
+        times, symbols, steps = np.concatenate(times), np.concatenate(symbols), np.concatenate(steps)
+        order = np.lexsort((symbols, times))
+        return times[order], symbols[order], steps[order]
+
+    def run_backtest(self):
+        """Führt den Portfolio-Backtest in einem zeitlich geordneten Durchlauf über alle Symbole aus."""
+        with profiler.stage("portfolio.run"):
+            self._prepare_data()
+            with profiler.stage("portfolio.candidates"):
+                cand_times, cand_symbols, cand_steps = self._candidate_events()
+
+            # Heap (Zeit, Symbol, Schritt, Trade-ID) für Stop-Loss/Take-Profit-Berührungen und das Datenende
+            exit_events = []
+            c = 0
+            while c < len(cand_times) or exit_events:
+                # Alle Ereignisse des nächsten Zeitstempels einsammeln
+                now = cand_times[c] if c < len(cand_times) else exit_events[0][0]
+                if exit_events and exit_events[0][0] < now:
+                    now = exit_events[0][0]
+                group = {}
+                while c < len(cand_times) and cand_times[c] == now:
+                    group[int(cand_symbols[c])] = (int(cand_steps[c]), True)
+                    c += 1
+                while exit_events and exit_events[0][0] == now:
+                    _, s, step, trade_id = heapq.heappop(exit_events)
+                    if self.position[s] != FLAT and self.trade_id[s] == trade_id and s not in group:
+                        group[s] = (step, False)
+
+                # Phase 1: Signale und Exits (setzen Kapital frei), Phase 2: Einstiege in Symbolreihenfolge
+                entries = []
+                for s in sorted(group):
+                    step, is_candidate = group[s]
+                    signal, stop_loss, take_profit = self._get_signal(s, step) if is_candidate else ("HOLD", None, None)
+                    if self.position[s] != FLAT:
+                        self._check_exit_conditions(s, signal, step - 1)
+                    if self.position[s] != FLAT and step == self.offsets_5min[s + 1] - self.offsets_5min[s]:
+                        # Datenende des Symbols: zum letzten Schlusskurs schließen, Platz und Kapital werden frei
+                        self._close_trade(s, self.close[self.offsets_5min[s] + step - 1], step - 1)
+                    if self.position[s] == FLAT and signal != "HOLD":
+                        entries.append((s, signal, stop_loss, take_profit, step))
+
+                for s, signal, stop_loss, take_profit, step in entries:
+                    open_positions = int(np.count_nonzero(self.position))
+                    if open_positions >= self.max_positions or self.cash <= 0:
+                        break
+                    self._open_trade(s, signal, stop_loss, take_profit, step - 1, open_positions)
+                    touch_step = self._next_touch_step(s, step + 1)
+                    if touch_step is not None:
+                        heapq.heappush(exit_events, (int(self.times[self.offsets_5min[s] + touch_step]), s, touch_step,
+                                                     int(self.trade_id[s])))
+                    else:
+                        # Ohne Berührung bis zum Datenende: Ereignis direkt nach der letzten Kerze des Symbols
+                        # (Exit-Prüfung der letzten Kerze, danach Schließen zum Schlusskurs)
+                        last = self.offsets_5min[s + 1] - 1
+                        heapq.heappush(exit_events, (int(self.times[last]) + 1, s, int(last - self.offsets_5min[s] + 1),
+                                                     int(self.trade_id[s])))
+
+            profiler.count("portfolio.bars", len(self.times))
+            with profiler.stage("portfolio.metrics"):
+                return self._calculate_metrics()
+
+    def _get_signal(self, s, step):
+        """Ruft den Agenten des Symbols `s` mit Fenstern fester Länge (bzw. voller Historie) auf."""
+        agent = self.agents[s]
+        offset_5min, offset_15min = self.offsets_5min[s], self.offsets_15min[s]
+        visible_15min = self.visible_15min[offset_5min + step]
+        lookback = agent.get_lookback() if hasattr(agent, "get_lookback") else None
+        lookback_5min = lookback.get("5min") if lookback else None
+        lookback_15min = lookback.get("15min") if lookback else None
+        self.window_5min.set_bounds(offset_5min + (max(0, step - lookback_5min) if lookback_5min else 0),
+                                    offset_5min + step)
+        self.window_15min.set_bounds(offset_15min + (max(0, visible_15min - lookback_15min) if lookback_15min else 0),
+                                     offset_15min + visible_15min)
+        with profiler.stage("portfolio.get_signal"):
+            signal, stop_loss, take_profit = agent.get_signal(self.window_5min, self.window_15min)
+        if signal not in ["BUY CALL", "BUY PUT", "HOLD"]:
+            raise Exception(f"Ungültiges Signal erhalten: {signal}")
+        return signal, stop_loss, take_profit
+
+    def _check_exit_conditions(self, s, signal, bar_index):
+        """Prüft (wie der Backtester), ob die Position des Symbols `s` an Kerze `bar_index` geschlossen wird."""
+        row = self.offsets_5min[s] + bar_index
+        if self.position[s] == CALL:
+            if signal == "BUY PUT":
+                self._close_trade(s, self.close[row], bar_index)
+            elif self.low[row] <= self.stop_loss[s]:
+                self._close_trade(s, self.stop_loss[s] - self.slippage, bar_index)
+            elif self.high[row] >= self.take_profit[s]:
+                self._close_trade(s, self.take_profit[s] - self.slippage, bar_index)
+        else:
+            if signal == "BUY CALL":
+                self._close_trade(s, self.close[row], bar_index)
+            elif self.high[row] >= self.stop_loss[s]:
+                self._close_trade(s, self.stop_loss[s] + self.slippage, bar_index)
+            elif self.low[row] <= self.take_profit[s]:
+                self._close_trade(s, self.take_profit[s] + self.slippage, bar_index)
+
+    def _next_touch_step(self, s, step, chunk=256):
+        """Nächster Schritt >= step, an dem Stop-Loss oder Take-Profit des Symbols `s` berührt wird (oder None)."""
+        offset = self.offsets_5min[s]
+        num_bars = self.offsets_5min[s + 1] - offset
+        start = step
+        while start < num_bars:
+            end = min(num_bars, start + chunk)
+            low = self.low[offset + start - 1:offset + end - 1]
+            high = self.high[offset + start - 1:offset + end - 1]
+            if self.position[s] == CALL:
+                touched = (low <= self.stop_loss[s]) | (high >= self.take_profit[s])
+            else:
+                touched = (high >= self.stop_loss[s]) | (low <= self.take_profit[s])
+            if touched.any():
+                return start + int(touched.argmax())
+            start = end
+            chunk *= 2
+        return None
+
+    def _open_trade(self, s, signal, stop_loss, take_profit, bar_index, open_positions):
+        """Eröffnet eine Position und reserviert den Anteil des freien Kapitals für einen freien Platz."""
+        close = self.close[self.offsets_5min[s] + bar_index]
+        entry_price = close + self.slippage if signal == "BUY CALL" else close - self.slippage
+        allocation = self.cash / (self.max_positions - open_positions)
+        self.position[s] = TRADE_DIRECTIONS[signal]
+        self.entry_index[s] = bar_index
+        self.entry_price[s] = entry_price
+        self.stop_loss[s] = stop_loss
+        self.take_profit[s] = take_profit
+        self.size[s] = allocation / entry_price
+        self.allocation[s] = allocation
+        self.trade_id[s] += 1
+        self.cash -= allocation
+
+    def _close_trade(self, s, exit_price, bar_index):
+        """Schließt die Position des Symbols `s` und schreibt den Trade ins Journal."""
+        profit = (exit_price - self.entry_price[s]) * self.size[s]
+        if self.position[s] == PUT:
+            profit *= -1
+        profit -= self.allocation[s] * self.fee_per_trade
+        exit_balance = self.allocation[s] + profit
+        self.cash += exit_balance
+
+        self.ledger.append(s, self.position[s], self.entry_index[s], bar_index, self.entry_price[s], exit_price,
+                           self.stop_loss[s], self.take_profit[s], self.size[s], self.allocation[s], exit_balance)
+        self.position[s] = FLAT
+
+    def _build_equity_curve(self):
+        """
+        Portfolio-Kapital je Zeitstempel der globalen Zeitachse: Kassenbestand plus Mark-to-Market aller offenen
+        Positionen (über Differenzen je Kerze, die per kumulierter Summe fortgeschrieben werden).
+        """
+        changes = np.zeros(len(self.timeline), dtype=np.float64)
+        trades = [(int(self.ledger["symbol"][k]), int(self.ledger["direction"][k]), int(self.ledger["entry_index"][k]),
+                   int(self.ledger["exit_index"][k]), self.ledger["entry_price"][k], self.ledger["size"][k],
+                   self.ledger["entry_balance"][k], self.ledger["exit_balance"][k]) for k in range(len(self.ledger))]
+        for s in np.flatnonzero(self.position):
+            trades.append((int(s), int(self.position[s]), int(self.entry_index[s]), None, self.entry_price[s],
+                           self.size[s], self.allocation[s], None))
+
+        for s, direction, entry_index, exit_index, entry_price, size, allocation, exit_balance in trades:
+            offset = self.offsets_5min[s]
+            last = exit_index if exit_index is not None else self.offsets_5min[s + 1] - offset - 1
+            # Wert der Position nach Kerze entry_index..last-1 (bzw. bis zur letzten Kerze, falls noch offen)
+            rows = slice(offset + entry_index, offset + (last if exit_index is not None else last + 1))
+            values = allocation + direction * (self.close[rows] - entry_price) * size
+            positions = self.timeline_position[rows]
+            # Einstieg: Kasse -allocation, Positionswert +values[0]; danach Wertänderungen je Kerze
+            np.add.at(changes, positions, np.diff(values, prepend=allocation))
+            if exit_index is not None:
+                changes[self.timeline_position[offset + exit_index]] += exit_balance - values[-1]
+        return self.initial_balance + np.cumsum(changes)
+
+    def _calculate_metrics(self):
+        """Kennzahlen des Portfolios aus Trade-Journal und Kapitalkurve."""
+        self.equity_curve = self._build_equity_curve()
+        trade_metrics = calculate_trade_metrics(self.ledger)
+        final_balance = self.equity_curve[-1] if len(self.equity_curve) else self.cash
+        max_drawdown = calculate_max_drawdown(self.equity_curve, self.initial_balance) if len(self.equity_curve) else 0
+        return {
+            "Final Balance": round(float(final_balance), 2),
+            "Total Trades": trade_metrics["Total Trades"],
+            "Win Rate (%)": trade_metrics["Win Rate (%)"],
+            "Sharpe Ratio": trade_metrics["Sharpe Ratio"],
+            "Max Drawdown": max_drawdown,
+            "Profit Factor": trade_metrics["Profit Factor"],
+            "Symbols": len(self.symbols)
+        }
+
+    def symbol_summary(self):
+        """Trades und Gewinn je Symbol (gruppierte Reduktion über das Trade-Journal)."""
+        symbols = self.ledger["symbol"]
+        pnl = self.ledger["exit_balance"] - self.ledger["entry_balance"]
+        counts = np.bincount(symbols, minlength=len(self.symbols))
+        profits = np.bincount(symbols, weights=pnl, minlength=len(self.symbols))
+        return pd.DataFrame({"symbol": self.symbols, "trades": counts, "profit": profits.round(2)})
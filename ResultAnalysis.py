@@ -0,0 +1,297 @@
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# Ergebnisspalten des ParameterOptimizer (alle übrigen Spalten sind Parameter)
+METRIC_COLUMNS = ["final_balance", "sharpe_ratio", "num_trades", "max_drawdown", "win_rate", "exposure",
+                  "profit_factor"]
+# Ziele der Pareto-Analyse: +1 = maximieren, -1 = minimieren
+OBJECTIVES = {"final_balance": 1, "sharpe_ratio": 1, "max_drawdown": -1, "num_trades": 1}
+DEFAULT_BLOCK_SIZE = 1 << 24  # Bytes CSV je gelesenem Block
+DEFAULT_MAX_LEVELS = 10  # Stufen je Parameter, darüber werden Werte in Buckets zusammengefasst
+DEFAULT_MAX_CELLS = 1_000_000  # Obergrenze der Gitterzellen mit laufenden Aggregaten (Speicherbedarf)
+
+
+def pareto_mask(points, num_pivots=16, seed=0):
+    """
+    Maske der nicht dominierten Zeilen (alle Spalten werden maximiert), ohne paarweise Vergleiche aller Zeilen:
+    1. Vorfilter: Maxima zufälliger positiver Gewichtungen liegen sicher auf der Front; alles, was von diesen
+       Pivots dominiert wird, entfällt (spaltenweise Vergleiche, linear in der Zeilenzahl).
+    2. Sortierbasiert: Nach lexikographisch absteigender Sortierung steht jeder dominierende Punkt vor den von
+       ihm dominierten, daher genügt der Vergleich mit der bisherigen Front. Blöcke werden vektorisiert gegen
+       die Front gefiltert, nur die wenigen Überlebenden werden einzeln eingefügt.
+    """
+    n = len(points)
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+
+    survivors = np.flatnonzero(~_dominated_by_pivots(points, num_pivots, seed))
+    points = points[survivors]
+    order = np.lexsort(points.T[::-1] * -1)
+    front = np.empty((0, points.shape[1]))
+    front_rows = []
+    block = 1024
+    for start in range(0, len(points), block):
+        rows = order[start:start + block]
+        candidates = points[rows]
+        if len(front):
+            candidates_mask = ~_dominated_by(candidates, front)
+            rows, candidates = rows[candidates_mask], candidates[candidates_mask]
+        for row, point in zip(rows, candidates):
+            if len(front) and _dominated_by(point[None, :], front)[0]:
+                continue
+            front = np.vstack([front, point])
+            front_rows.append(row)
+    mask[survivors[front_rows]] = True
+    return mask
+
+
+def _dominated_by_pivots(points, num_pivots, seed):
+    """Zeilen, die von einem der Maxima zufällig gewichteter Summen (normierte Ziele) dominiert werden."""
+    low, high = points.min(axis=0), points.max(axis=0)
+    scaled = (points - low) / np.where(high > low, high - low, 1)
+    weights = np.random.default_rng(seed).dirichlet(np.ones(points.shape[1]), num_pivots)
+    pivots = points[np.unique(np.argmax(scaled @ weights.T, axis=0))]
+
+    columns = [np.ascontiguousarray(points[:, d]) for d in range(points.shape[1])]
+    dominated = np.zeros(len(points), dtype=bool)
+    for pivot in pivots:
+        at_most, below = columns[0] <= pivot[0], columns[0] < pivot[0]
+        for column, value in zip(columns[1:], pivot[1:]):
+            at_most &= column <= value
+            below |= column < value
+        dominated |= at_most & below
+    return dominated
+
+
+def _dominated_by(candidates, front):
+    """True je Kandidat, wenn ein Punkt der Front ihn dominiert (>= in allen, > in mindestens einem Ziel)."""
+    at_least = (front[None, :, :] >= candidates[:, None, :]).all(axis=2)
+    better = (front[None, :, :] > candidates[:, None, :]).any(axis=2)
+    return (at_least & better).any(axis=1)
+
+
+class ResultAnalyzer:
+    def __init__(self, objectives=OBJECTIVES, max_levels=DEFAULT_MAX_LEVELS, max_cells=DEFAULT_MAX_CELLS):
+        """
+        Auswertung großer Optimierungsergebnisse, die blockweise eingelesen werden (`update`):
+        laufende Pareto-Front über `objectives`, Parameter-Sensitivität (Randverteilungen je Parameterwert) und
+        Stabilität je Konfiguration im Parametergitter (Bewertung der direkten Nachbarn).
+
+        Zeilen werden nicht aufbewahrt: je Gitterzelle (Kombination der Parameterstufen) bleiben nur laufende
+        Aggregate der Kennzahlen (Anzahl, Summe, Quadratsumme, Maximum). Parameter mit mehr als `max_levels`
+        Werten (kontinuierliche Bereiche) werden in Buckets der Breite 2^k zusammengefasst; übersteigt die Zahl der
+        Zellen `max_cells`, wird der Parameter mit den meisten Stufen vergröbert. Buckets halbieren sich dabei
+        nie, sondern verdoppeln sich nur, daher bleiben die Aggregate exakt.
+        """
+        self.objectives = objectives
+        self.max_levels = max_levels
+        self.max_cells = max_cells
+        self.columns = None
+        self.params = None
+        self.metrics = None
+        self._front = None
+        self._widths = {}   # Parameter -> Bucket-Breite (0 = exakte Werte)
+        self._cells = None  # DataFrame: Bucket-Untergrenzen der Parameter und Aggregate je Kennzahl
+        self.rows = 0
+
+    def update(self, block):
+        """Verarbeitet einen Block (DataFrame oder pyarrow-RecordBatch) von Ergebniszeilen."""
+        if isinstance(block, (pa.RecordBatch, pa.Table)):
+            block = {name: column.to_numpy(zero_copy_only=False) for name, column in zip(block.schema.names,
+                                                                                        block.columns)}
+        else:
+            block = {name: block[name].to_numpy() for name in block.columns}
+        if self.columns is None:
+            self.columns = list(block)
+            self.params = [name for name in self.columns if name not in METRIC_COLUMNS]
+            self.metrics = [name for name in self.columns if name in METRIC_COLUMNS]
+        block = {name: np.asarray(block[name], dtype=np.float64) for name in self.columns}
+
+        # Front des Blocks zusammen mit der bisherigen Front neu bestimmen (Front bleibt klein)
+        valid = np.ones(len(block[self.columns[0]]), dtype=bool)
+        for name in self.objectives:
+            valid &= np.isfinite(block[name])
+        candidates = {name: values[valid] for name, values in block.items()}
+        if self._front is not None:
+            candidates = {name: np.concatenate([self._front[name], candidates[name]]) for name in self.columns}
+        keep = pareto_mask(self._objective_matrix(candidates))
+        self._front = {name: values[keep] for name, values in candidates.items()}
+
+        # Block auf Gitterzellen reduzieren und mit den bisherigen Aggregaten zusammenführen
+        cells = {name: self._bucket(name, block[name]) for name in self.params}
+        for name in self.metrics:
+            values = block[name]
+            finite = np.isfinite(values)
+            cells[f"{name}:count"] = finite.astype(np.int64)
+            cells[f"{name}:sum"] = np.where(finite, values, 0.0)
+            cells[f"{name}:squares"] = np.where(finite, values ** 2, 0.0)
+            cells[f"{name}:max"] = np.where(finite, values, -np.inf)
+        cells = pd.DataFrame(cells)
+        self._cells = self._aggregate(cells if self._cells is None else pd.concat([self._cells, cells]))
+        self._coarsen()
+        self.rows += len(block[self.columns[0]])
+
+    def _objective_matrix(self, data):
+        return np.column_stack([data[name] * sign for name, sign in self.objectives.items()])
+
+    def _bucket(self, name, values):
+        """Untergrenze des Buckets je Wert (Breite 2^k ab 0: eine doppelte Breite fasst genau zwei Buckets zusammen)."""
+        width = self._widths.get(name, 0)
+        return np.floor(values / width) * width if width else values
+
+    def _aggregate(self, cells):
+        how = {column: "max" if column.endswith(":max") else "sum" for column in cells.columns
+               if column not in self.params}
+        return cells.groupby(self.params, sort=False, dropna=False, as_index=False).agg(how)
+
+    def _coarsen(self):
+        """Verdoppelt Bucket-Breiten, bis jeder Parameter höchstens `max_levels` Stufen und das Gitter höchstens
+        `max_cells` Zellen hat."""
+        while True:
+            levels = {name: self._cells[name].nunique() for name in self.params}
+            over = [name for name in self.params if levels[name] > self.max_levels]
+            if not over and len(self._cells) <= self.max_cells:
+                return
+            name = over[0] if over else max(levels, key=levels.get)
+            if levels[name] <= 1:
+                return
+            width = self._widths.get(name, 0)
+            if not width:
+                values = self._cells[name]
+                span = values.max() - values.min()
+                width = 2.0 ** math.ceil(math.log2(span / self.max_levels)) if span > 0 else 1.0
+            else:
+                width *= 2
+            self._widths[name] = width
+            self._cells[name] = self._bucket(name, self._cells[name].to_numpy())
+            self._cells = self._aggregate(self._cells)
+
+    def _levels(self, name):
+        """Sortierte Stufen (Werte bzw. Bucket-Untergrenzen) eines Parameters und Code (Rang) je Gitterzelle."""
+        levels, codes = np.unique(self._cells[name].to_numpy(), return_inverse=True)
+        return levels, codes.astype(np.int64)
+
+    def pareto_front(self):
+        """Nicht dominierte Konfigurationen, sortiert nach dem ersten Ziel."""
+        front = pd.DataFrame(self._front)
+        first = next(iter(self.objectives))
+        return front.sort_values(first, ascending=self.objectives[first] < 0).reset_index(drop=True)
+
+    def marginals(self, objective="sharpe_ratio"):
+        """
+        Sensitivität je Parameter: Anzahl, Mittelwert, Streuung und Maximum des Ziels je Parameterwert bzw.
+        Bucket (`value` = Untergrenze), zusammengefasst aus den Zell-Aggregaten per bincount.
+        """
+        cells = self._cells
+        count, total, squares, maxima = (cells[f"{objective}:{stat}"].to_numpy()
+                                         for stat in ("count", "sum", "squares", "max"))
+        rows = []
+        for name in self.params:
+            levels, codes = self._levels(name)
+            level_count = np.bincount(codes, weights=count, minlength=len(levels))
+            level_total = np.bincount(codes, weights=total, minlength=len(levels))
+            level_squares = np.bincount(codes, weights=squares, minlength=len(levels))
+            maximum = np.full(len(levels), -np.inf)
+            np.maximum.at(maximum, codes, maxima)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = level_total / level_count
+                std = np.sqrt(np.maximum(level_squares / level_count - mean ** 2, 0))
+            rows.append(pd.DataFrame({"parameter": name, "value": levels, "count": level_count.astype(np.int64),
+                                      "mean": mean, "std": std,
+                                      "max": np.where(level_count > 0, maximum, np.nan)}))
+        return pd.concat(rows, ignore_index=True)
+
+    def stability(self, objective="sharpe_ratio"):
+        """
+        Nachbarschafts-Stabilität: Jede Gitterzelle erhält Koordinaten (Rang ihrer Stufe je Parameter).
+        Nachbarn unterscheiden sich in genau einem Parameter um eine Stufe; sie werden über den Gitterindex
+        (Schlüssel im gemischten Zahlensystem der Koordinaten) per searchsorted gefunden, ohne paarweise Vergleiche.
+        Konfigurationen derselben Zelle (mehrfach getestet bzw. im selben Bucket) werden gemittelt. Ergebnis je
+        Zelle: eigener Wert, Mittel und Minimum der Nachbarn, Anzahl Nachbarn und
+        `stability` = min(eigener Wert, Nachbarmittel).
+        """
+        levels, coords = zip(*(self._levels(name) for name in self.params))
+        sizes = np.array([len(values) for values in levels], dtype=np.int64)
+        radix = np.cumprod(np.concatenate(([1], sizes[:-1]))).astype(np.int64)
+        keys = sum(coordinate * r for coordinate, r in zip(coords, radix))
+
+        # Zellen sind eindeutig; nach Schlüssel sortieren (Zielwert gemittelt, ungültige Werte ignoriert)
+        order = np.argsort(keys)
+        unique_keys = keys[order]
+        counts = self._cells[f"{objective}:count"].to_numpy()[order]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            scores = self._cells[f"{objective}:sum"].to_numpy()[order] / counts
+        unique_coords = [(unique_keys // r) % size for r, size in zip(radix, sizes)]
+
+        # Nachbarn eine Stufe höher: Schlüssel + radix; da die Schlüssel sortiert sind, bleiben es auch die
+        # gesuchten Schlüssel (ein searchsorted je Parameter). Die Beziehung gilt symmetrisch für beide Punkte.
+        neighbour_sum = np.zeros(len(unique_keys))
+        neighbour_min = np.full(len(unique_keys), np.inf)
+        neighbour_count = np.zeros(len(unique_keys), dtype=np.int64)
+        scored = np.isfinite(scores)
+        for coordinate, r, size in zip(unique_coords, radix, sizes):
+            lower = np.flatnonzero(coordinate + 1 < size)
+            wanted = unique_keys[lower] + r
+            position = np.minimum(np.searchsorted(unique_keys, wanted), len(unique_keys) - 1)
+            match = unique_keys[position] == wanted
+            lower, upper = lower[match], position[match]
+            for a, b in ((lower, upper), (upper, lower)):
+                a, b = a[scored[b]], b[scored[b]]
+                neighbour_sum[a] += scores[b]
+                neighbour_min[a] = np.minimum(neighbour_min[a], scores[b])
+                neighbour_count[a] += 1
+
+        neighbour_mean = np.divide(neighbour_sum, neighbour_count, out=np.full(len(unique_keys), np.nan),
+                                   where=neighbour_count > 0)
+        result = pd.DataFrame({name: values[coordinate] for name, values, coordinate in
+                               zip(self.params, levels, unique_coords)})
+        result[objective] = scores
+        result["neighbour_mean"] = neighbour_mean
+        result["neighbour_min"] = np.where(neighbour_count > 0, neighbour_min, np.nan)
+        result["neighbours"] = neighbour_count
+        result["stability"] = np.minimum(scores, neighbour_mean)  # ohne Nachbarn: NaN
+        return result.sort_values("stability", ascending=False, na_position="last").reset_index(drop=True)
+
+
+def analyze_file(path="optimization_results.csv", objectives=OBJECTIVES, block_size=DEFAULT_BLOCK_SIZE):
+    """Liest eine Ergebnisdatei (CSV oder Parquet) blockweise mit pyarrow in einen ResultAnalyzer ein."""
+    analyzer = ResultAnalyzer(objectives)
+    if path.endswith(".parquet"):
+        reader = pq.ParquetFile(path).iter_batches()
+    else:
+        column_types = {name: pa.float64() for name in METRIC_COLUMNS}
+        reader = pa_csv.open_csv(path, read_options=pa_csv.ReadOptions(block_size=block_size),
+                                 convert_options=pa_csv.ConvertOptions(column_types=column_types))
+    for batch in reader:
+        analyzer.update(batch)
+    return analyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pareto-Front, Sensitivität und Stabilität von Optimierungsergebnissen")
+    parser.add_argument("--results", default="optimization_results.csv")
+    parser.add_argument("--objective", default="sharpe_ratio", help="Ziel für Sensitivität und Stabilität")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.time()
+    analyzer = analyze_file(args.results)
+    front = analyzer.pareto_front()
+    print(f"📊 {analyzer.rows} Konfigurationen, Pareto-Front: {len(front)} ({time.time() - start:.2f}s)")
+    print(front.head(args.top).to_string())
+    print("\n📈 Sensitivität:")
+    print(analyzer.marginals(args.objective).round(3).to_string())
+    print("\n🧱 Stabilste Konfigurationen:")
+    print(analyzer.stability(args.objective).head(args.top).round(3).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,542 @@
+import math
+import operator
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+TIMEFRAMES = ("5min", "15min")
+
+
+# 📌 Ausdrücke: jede Regel ist ein Baum aus Ausdrücken. Er wird einmalig in zwei flache Auswertungspläne übersetzt:
+#   - vektorisiert über die vollständigen Arrays (ein Wert je Kerze, für Backtests und Recherche)
+#   - inkrementell nur für die letzten Kerzen eines Fensters (get_signal / Live-Betrieb)
+# Gleiche Teilausdrücke werden nur einmal berechnet. Beide Pläne verwenden dieselben NumPy-Operationen und liefern
+# daher bitgleiche Werte.
+class Expr:
+    timeframe = None  # "5min", "15min" oder None (Konstante)
+
+    def lookback(self, n=1):
+        """Benötigte Kerzen je Zeitebene, um die letzten `n` Werte inkrementell zu berechnen."""
+        return {}
+
+    # Operatoren
+    def __add__(self, other):
+        return BinaryOp(operator.add, "+", self, other)
+
+    def __radd__(self, other):
+        return BinaryOp(operator.add, "+", other, self)
+
+    def __sub__(self, other):
+        return BinaryOp(operator.sub, "-", self, other)
+
+    def __rsub__(self, other):
+        return BinaryOp(operator.sub, "-", other, self)
+
+    def __mul__(self, other):
+        return BinaryOp(operator.mul, "*", self, other)
+
+    def __rmul__(self, other):
+        return BinaryOp(operator.mul, "*", other, self)
+
+    def __truediv__(self, other):
+        return BinaryOp(operator.truediv, "/", self, other)
+
+    def __rtruediv__(self, other):
+        return BinaryOp(operator.truediv, "/", other, self)
+
+    def __gt__(self, other):
+        return BinaryOp(operator.gt, ">", self, other)
+
+    def __ge__(self, other):
+        return BinaryOp(operator.ge, ">=", self, other)
+
+    def __lt__(self, other):
+        return BinaryOp(operator.lt, "<", self, other)
+
+    def __le__(self, other):
+        return BinaryOp(operator.le, "<=", self, other)
+
+    def __and__(self, other):
+        return BinaryOp(operator.and_, "&", self, other)
+
+    def __rand__(self, other):
+        return BinaryOp(operator.and_, "&", other, self)
+
+    def __or__(self, other):
+        return BinaryOp(operator.or_, "|", self, other)
+
+    def __ror__(self, other):
+        return BinaryOp(operator.or_, "|", other, self)
+
+    def __invert__(self):
+        return UnaryOp(np.logical_not, "~", self)
+
+    def __neg__(self):
+        return UnaryOp(np.negative, "-", self)
+
+    def __abs__(self):
+        return UnaryOp(np.abs, "abs", self)
+
+    def shift(self, periods=1):
+        return Shift(self, periods)
+
+    def rolling_max(self, window):
+        return Rolling(self, window, "max")
+
+    def rolling_min(self, window):
+        return Rolling(self, window, "min")
+
+    def rolling_mean(self, window):
+        return Rolling(self, window, "mean")
+
+    def rolling_sum(self, window):
+        return Rolling(self, window, "sum")
+
+    def __repr__(self):
+        return _format(self.key)
+
+
+class Const(Expr):
+    def __init__(self, value):
+        self.value = value
+        self.key = ("const", value)
+
+    def _vector_step(self, plan):
+        value = self.value
+        return lambda registers, frames: value
+
+    def _tail_step(self, plan, n):
+        value = self.value
+        return lambda registers, frames: value
+
+
+class Column(Expr):
+    def __init__(self, name, timeframe="5min"):
+        if timeframe not in TIMEFRAMES:
+            raise ValueError(f"Ungültige Zeitebene: {timeframe}")
+        self.name = name
+        self.timeframe = timeframe
+        self.key = ("column", timeframe, name)
+
+    def _vector_step(self, plan):
+        timeframe, name = self.timeframe, self.name
+        return lambda registers, frames: np.asarray(frames[timeframe][name], dtype=np.float64)
+
+    def _tail_step(self, plan, n):
+        timeframe, name = self.timeframe, self.name
+        return lambda registers, frames: _last(np.asarray(frames[timeframe][name], dtype=np.float64), n)
+
+    def lookback(self, n=1):
+        return {self.timeframe: n}
+
+
+class Bars:
+    def __init__(self, timeframe):
+        """Spaltenzugriff einer Zeitebene: `bar5.close`, `bar15["ADX_14"]`."""
+        self.timeframe = timeframe
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return Column(name, self.timeframe)
+
+    def __getitem__(self, name):
+        return Column(name, self.timeframe)
+
+
+bar5 = Bars("5min")
+bar15 = Bars("15min")
+
+
+class UnaryOp(Expr):
+    def __init__(self, func, symbol, operand):
+        self.func = func
+        self.operand = _wrap(operand)
+        self.timeframe = self.operand.timeframe
+        self.key = (symbol, self.operand.key)
+
+    def _vector_step(self, plan):
+        func, operand = self.func, plan.vector(self.operand)
+        return lambda registers, frames: func(registers[operand])
+
+    def _tail_step(self, plan, n):
+        func, operand = self.func, plan.tail(self.operand, n)
+        return lambda registers, frames: func(registers[operand])
+
+    def lookback(self, n=1):
+        return self.operand.lookback(n)
+
+
+class BinaryOp(Expr):
+    def __init__(self, func, symbol, left, right):
+        """
+        Verknüpfung zweier Ausdrücke. Liegen sie auf verschiedenen Zeitebenen, wird der 15-Min-Ausdruck je 5-Min-Kerze
+        auf die zuletzt sichtbare 15-Min-Kerze abgebildet (wie in den 15-Min-Fenstern des Backtesters).
+        """
+        self.func = func
+        self.left, self.right = _wrap(left), _wrap(right)
+        timeframes = {self.left.timeframe, self.right.timeframe} - {None}
+        self.timeframe = None if not timeframes else ("5min" if len(timeframes) > 1 else timeframes.pop())
+        self.key = (symbol, self.left.key, self.right.key)
+
+    def _vector_step(self, plan):
+        func = self.func
+        left, right = plan.vector(self.left, self.timeframe), plan.vector(self.right, self.timeframe)
+        return lambda registers, frames: func(registers[left], registers[right])
+
+    def _tail_step(self, plan, n):
+        func = self.func
+        left, right = plan.tail(self.left, n, self.timeframe), plan.tail(self.right, n, self.timeframe)
+        return lambda registers, frames: func(registers[left], registers[right])
+
+    def lookback(self, n=1):
+        return _merge_lookback(self.left.lookback(n), self.right.lookback(n))
+
+
+class Rolling(Expr):
+    FUNCTIONS = {"max": np.max, "min": np.min, "mean": np.mean, "sum": np.sum}
+
+    def __init__(self, operand, window, how):
+        if window < 1:
+            raise ValueError(f"Ungültiges Fenster: {window}")
+        self.operand = _wrap(operand)
+        self.window = window
+        self.how = how
+        self.timeframe = self.operand.timeframe
+        self.key = ("rolling_" + how, window, self.operand.key)
+
+    def _vector_step(self, plan):
+        operand, window, func = plan.vector(self.operand), self.window, self.FUNCTIONS[self.how]
+        return lambda registers, frames: _rolling(registers[operand], window, func)
+
+    def _tail_step(self, plan, n):
+        operand, window, func = plan.tail(self.operand, n + self.window - 1), self.window, self.FUNCTIONS[self.how]
+        timeframe = self.timeframe
+
+        def step(registers, frames):
+            values = registers[operand]
+            result = _rolling(values, window, func)[-n:]
+            if values.dtype == bool and timeframe is not None:
+                # Aufgefüllte Historie vor Datenbeginn ist bei Bedingungen False statt NaN: Fenster, die vor den
+                # Datenbeginn reichen, wie in der vektorisierten Auswertung auf NaN setzen
+                rows = len(frames[timeframe])
+                result[np.arange(rows - n, rows) < window - 1] = np.nan
+            return result
+        return step
+
+    def lookback(self, n=1):
+        return self.operand.lookback(n + self.window - 1)
+
+
+class Shift(Expr):
+    def __init__(self, operand, periods):
+        if periods < 0:
+            raise ValueError("Nur Verschiebungen in die Vergangenheit (periods >= 0)")
+        self.operand = _wrap(operand)
+        self.periods = periods
+        self.timeframe = self.operand.timeframe
+        self.key = ("shift", periods, self.operand.key)
+
+    def _vector_step(self, plan):
+        operand, periods = plan.vector(self.operand), self.periods
+        return lambda registers, frames: _shift(registers[operand], periods)
+
+    def _tail_step(self, plan, n):
+        operand, periods = plan.tail(self.operand, n + self.periods), self.periods
+        return lambda registers, frames: _shift(registers[operand], periods)[-n:]
+
+    def lookback(self, n=1):
+        return self.operand.lookback(n + self.periods)
+
+
+# Funktionsschreibweise (z.B. rolling_max(bar5.high, 20))
+def rolling_max(expr, window):
+    return _wrap(expr).rolling_max(window)
+
+
+def rolling_min(expr, window):
+    return _wrap(expr).rolling_min(window)
+
+
+def rolling_mean(expr, window):
+    return _wrap(expr).rolling_mean(window)
+
+
+def rolling_sum(expr, window):
+    return _wrap(expr).rolling_sum(window)
+
+
+def shift(expr, periods=1):
+    return _wrap(expr).shift(periods)
+
+
+def min_history(rows, bars=bar5):
+    """Wahr, sobald mindestens `rows` Kerzen der Zeitebene vorliegen."""
+    return shift(bars.close, rows - 1) > -np.inf
+
+
+def all_of(*conditions):
+    """UND-Verknüpfung beliebig vieler Bedingungen (ohne Bedingungen: immer wahr)."""
+    result = Const(True)
+    for condition in conditions:
+        result = result & condition
+    return result
+
+
+def _wrap(value):
+    return value if isinstance(value, Expr) else Const(value)
+
+
+def _fill_value(values):
+    return False if values.dtype == bool else np.nan
+
+
+def _last(values, n):
+    """Die letzten n Werte; fehlende Historie am Anfang wird mit NaN (bzw. False) aufgefüllt."""
+    if len(values) >= n:
+        return values[len(values) - n:]
+    result = np.full(n, _fill_value(values), dtype=values.dtype)
+    result[n - len(values):] = values
+    return result
+
+
+def _rolling(values, window, func):
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        result[window - 1:] = func(sliding_window_view(values, window), axis=1)
+    return result
+
+
+def _shift(values, periods):
+    if periods == 0:
+        return values
+    result = np.full(len(values), _fill_value(values), dtype=values.dtype)
+    result[periods:] = values[:-periods]
+    return result
+
+
+def _merge_lookback(*lookbacks):
+    merged = {}
+    for lookback in lookbacks:
+        for timeframe, rows in lookback.items():
+            merged[timeframe] = max(merged.get(timeframe, 0), rows)
+    return merged
+
+
+def _format(key):
+    if key[0] == "const":
+        return repr(key[1])
+    if key[0] == "column":
+        return f"bar{key[1][:-3]}.{key[2]}"
+    if key[0] == "shift" or key[0].startswith("rolling_"):
+        return f"{key[0]}({_format(key[2])}, {key[1]})"
+    if len(key) == 2:
+        return f"{key[0]}({_format(key[1])})"
+    return f"({_format(key[1])} {key[0]} {_format(key[2])})"
+
+
+class _Plan:
+    def __init__(self):
+        """
+        Flacher Auswertungsplan: Schritte in topologischer Reihenfolge, jeder Schritt schreibt ein Register.
+        Gleiche Teilausdrücke (gleicher Schlüssel) erhalten dasselbe Register.
+        """
+        self.steps = []
+        self.registers = {}
+
+    def _register(self, key, build):
+        if key not in self.registers:
+            step = build()
+            self.registers[key] = len(self.steps)
+            self.steps.append(step)
+        return self.registers[key]
+
+    def vector(self, expr, timeframe=None):
+        """Register mit den Werten von `expr` über alle Kerzen (bei Bedarf auf 5-Min-Kerzen abgebildet)."""
+        register = self._register(expr.key, lambda: expr._vector_step(self))
+        if not (expr.timeframe == "15min" and timeframe == "5min"):
+            return register
+        last_15min = self._register(("last_15min",), lambda: _visible_15min)
+
+        def align(registers, frames):
+            values = registers[register]
+            visible, position = registers[last_15min]
+            return np.where(visible, values[position], _fill_value(values))
+        return self._register(("align", expr.key), lambda: align)
+
+    def tail(self, expr, n, timeframe=None):
+        """Register mit den letzten `n` Werten von `expr` (bei Bedarf auf 5-Min-Kerzen abgebildet)."""
+        if expr.timeframe == "15min" and timeframe == "5min" and n > 1:
+            return self._register(("align", expr.key, n), lambda: self._align_tail(expr, n))
+        # Für n = 1 ist die letzte 15-Min-Kerze des Fensters die zur letzten 5-Min-Kerze sichtbare
+        return self._register((expr.key, n), lambda: expr._tail_step(self, n))
+
+    def _align_tail(self, expr, n):
+        # Je 5-Min-Kerze die zuletzt sichtbare 15-Min-Kerze des Fensters (wie im Backtester per Zeitstempel)
+        lookback_15min = expr.lookback(n).get("15min", 1)
+        register = self.tail(expr, lookback_15min)
+
+        def align(registers, frames):
+            values = registers[register]
+            result = np.full(n, _fill_value(values), dtype=values.dtype)
+            index_15min = frames["15min"].index.asi8
+            times_5min = frames["5min"].index.asi8[-n:]
+            position = np.searchsorted(index_15min, times_5min, side="right") - 1 - (len(index_15min) - len(values))
+            result[n - len(times_5min):] = np.where(position >= 0, values[np.maximum(position, 0)], result[0])
+            return result
+        return align
+
+    def run(self, frames):
+        registers = []
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for step in self.steps:
+                registers.append(step(registers, frames))
+        return registers
+
+
+def _visible_15min(registers, frames):
+    last_15min = np.asarray(frames["last_15min"])
+    return last_15min >= 0, np.maximum(last_15min, 0)
+
+
+class CompiledRules:
+    def __init__(self, long_entry, short_entry, stop_loss, take_profit, filters=(), slippage_adjustment=0.0):
+        """
+        Übersetzte Regeln eines RuleAgent: Einstiegsbedingungen, gemeinsame Filter und Abstände für Stop-Loss und
+        Take-Profit (in Preiseinheiten, z.B. 1.5 * bar5.ATR_14). Alle Ausgaben liegen auf der 5-Min-Ebene.
+        """
+        self.slippage_adjustment = slippage_adjustment
+        outputs = (all_of(long_entry, *filters), all_of(short_entry, *filters), _wrap(stop_loss),
+                   _wrap(take_profit), bar5.close)
+        self.lookback = _merge_lookback({"5min": 1, "15min": 1}, *(expr.lookback(1) for expr in outputs))
+
+        self.vector_plan, self.tail_plan = _Plan(), _Plan()
+        self.vector_outputs = [self.vector_plan.vector(expr, "5min") for expr in outputs]
+        self.tail_outputs = [self.tail_plan.tail(expr, 1, "5min") for expr in outputs]
+
+    def evaluate(self, df_5min, df_15min, last_15min):
+        """
+        Vektorisierte Auswertung für alle 5-Min-Kerzen.
+
+        :param last_15min: je 5-Min-Kerze der Index der zuletzt sichtbaren 15-Min-Kerze (-1 = keine)
+        :return: Dictionary mit Arrays "direction" (1 = CALL, -1 = PUT, 0 = kein Signal), "stop_loss", "take_profit"
+        """
+        registers = self.vector_plan.run({"5min": df_5min, "15min": df_15min, "last_15min": last_15min})
+        num_bars = len(df_5min)
+        long, short, stop_distance, target_distance, close = (
+            np.broadcast_to(registers[output], num_bars) for output in self.vector_outputs)
+
+        # Long hat Vorrang (wie im MomentumBreakoutAgent); ohne gültige Abstände kein Signal
+        valid = np.isfinite(stop_distance) & np.isfinite(target_distance)
+        long = long.astype(bool) & valid
+        short = short.astype(bool) & valid & ~long
+        direction = np.where(long, 1, np.where(short, -1, 0)).astype(np.int8)
+        entry_price = np.where(long, close + self.slippage_adjustment, close - self.slippage_adjustment)
+        return {
+            "direction": direction,
+            "stop_loss": np.where(direction != 0, entry_price - direction * stop_distance, np.nan),
+            "take_profit": np.where(direction != 0, entry_price + direction * target_distance, np.nan),
+        }
+
+    def evaluate_last(self, df_5min, df_15min):
+        """
+        Inkrementelle Auswertung nur für die letzte 5-Min-Kerze der Fenster (Werte wie in `evaluate`).
+
+        :return: (Richtung, Stop-Loss, Take-Profit) mit Richtung 1 / -1 / 0
+        """
+        registers = self.tail_plan.run({"5min": df_5min, "15min": df_15min})
+        long, short, stop_distance, target_distance, close = (
+            _scalar(registers[output]) for output in self.tail_outputs)
+        if not (math.isfinite(stop_distance) and math.isfinite(target_distance)):
+            return 0, None, None
+        if long:
+            entry_price = close + self.slippage_adjustment
+            return 1, entry_price - stop_distance, entry_price + target_distance
+        if short:
+            entry_price = close - self.slippage_adjustment
+            return -1, entry_price + stop_distance, entry_price - target_distance
+        return 0, None, None
+
+
+def _scalar(value):
+    return value[-1].item() if isinstance(value, np.ndarray) else value
+
+
+class RuleAgent:
+    def __init__(self, long_entry, short_entry, stop_loss, take_profit, filters=(), slippage_adjustment=0.0):
+        """
+        Agent aus deklarativen Regeln statt handgeschriebenem get_signal. Die Regeln werden einmalig übersetzt:
+        `get_candidate_mask` wertet sie vektorisiert über alle Kerzen aus (exakte Signal-Maske, der Backtester
+        ruft get_signal nur an Signal-Kerzen auf), `get_signal` inkrementell nur für die letzte Kerze (Live-Betrieb).
+
+        Beispiel:
+            RuleAgent(long_entry=bar5.close > rolling_max(bar5.high, 20).shift(1),
+                      short_entry=bar5.close < rolling_min(bar5.low, 20).shift(1),
+                      stop_loss=1.5 * bar5.ATR_14, take_profit=2.5 * bar5.ATR_14,
+                      filters=[bar15.ADX_14 >= 20, bar15.EMA_20 > bar15.EMA_50])
+
+        :param stop_loss: Abstand des Stop-Loss vom Einstiegspreis (Ausdruck oder Zahl)
+        :param take_profit: Abstand des Take-Profit vom Einstiegspreis (Ausdruck oder Zahl)
+        :param filters: Zusätzliche Bedingungen für beide Richtungen
+        :param slippage_adjustment: Aufschlag auf den Schlusskurs als Einstiegspreis (wie im MomentumBreakoutAgent)
+        """
+        self.rules = CompiledRules(long_entry, short_entry, stop_loss, take_profit, filters, slippage_adjustment)
+        self._params = {"long_entry": repr(_wrap(long_entry)), "short_entry": repr(_wrap(short_entry)),
+                        "stop_loss": repr(_wrap(stop_loss)), "take_profit": repr(_wrap(take_profit)),
+                        "filters": [repr(_wrap(condition)) for condition in filters],
+                        "slippage_adjustment": slippage_adjustment}
+
+    def get_params(self):
+        """Regeln als Text und Slippage (Checkpoint-Konfiguration des Backtesters): gleiche Regeln, gleiche Werte."""
+        return {**self._params, "filters": list(self._params["filters"])}
+
+    def get_lookback(self):
+        return dict(self.rules.lookback)
+
+    def get_candidate_mask(self, df_5min, df_15min, last_15min):
+        return self.rules.evaluate(df_5min, df_15min, last_15min)["direction"] != 0
+
+    def signals(self, df_5min, df_15min):
+        """Signale für alle 5-Min-Kerzen (Recherche); die 15-Min-Sichtbarkeit wird aus den Zeitstempeln bestimmt."""
+        last_15min = np.searchsorted(df_15min.index.asi8, df_5min.index.asi8, side="right") - 1
+        return self.rules.evaluate(df_5min, df_15min, last_15min)
+
+    def get_signal(self, df_5min, df_15min):
+        if df_5min is None or df_15min is None or df_5min.empty or df_15min.empty:
+            return "HOLD", None, None
+        direction, stop_loss, take_profit = self.rules.evaluate_last(df_5min, df_15min)
+        if direction == 1:
+            return "BUY CALL", stop_loss, take_profit
+        if direction == -1:
+            return "BUY PUT", stop_loss, take_profit
+        return "HOLD", None, None
+
+
+def breakout_rules(breakout_window=20, ema_trend_filter=True, atr_multiplier_sl=1.5, atr_multiplier_tp=2.5,
+                   volume_confirmation=True, min_candle_body_ratio=0.6, min_adx_15m=20, min_atr_threshold=0.1,
+                   slippage_adjustment=0.01, exclude_current=False):
+    """
+    Regeln des MomentumBreakoutAgent als Argumente für RuleAgent (RuleAgent(**breakout_rules(...))).
+    Wie dort enthält die Breakout-Range die aktuelle Kerze; mit `exclude_current` wird sie stattdessen über die
+    vorherigen `breakout_window` Kerzen gebildet.
+    """
+    offset = 1 if exclude_current else 0
+    breakout_high = rolling_max(bar5.high, breakout_window).shift(offset)
+    breakout_low = rolling_min(bar5.low, breakout_window).shift(offset)
+
+    body = abs(bar5.close - bar5.open)
+    candle = abs(bar5.high - bar5.low)
+    # Mindesthistorie wie im Agenten: breakout_window + 2 Kerzen (5 Min) und 50 Kerzen (15 Min)
+    filters = [min_history(breakout_window + 2, bar5), min_history(50, bar15), bar5.ATR_14 > min_atr_threshold,
+               bar15.ADX_14 >= min_adx_15m, candle > 0, body / candle >= min_candle_body_ratio]
+    if volume_confirmation:
+        filters.append(bar5.volume > rolling_mean(bar5.volume, breakout_window))
+
+    long_entry, short_entry = bar5.close > breakout_high, bar5.close < breakout_low
+    if ema_trend_filter:
+        long_entry = long_entry & (bar15.EMA_20 > bar15.EMA_50)
+        short_entry = short_entry & (bar15.EMA_20 < bar15.EMA_50)
+    return {"long_entry": long_entry, "short_entry": short_entry, "stop_loss": atr_multiplier_sl * bar5.ATR_14,
+            "take_profit": atr_multiplier_tp * bar5.ATR_14, "filters": filters,
+            "slippage_adjustment": slippage_adjustment}
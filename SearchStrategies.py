@@ -0,0 +1,245 @@
+import itertools
+import math
+import queue
+
+import numpy as np
+
+
+# 📌 Suchraum: jede Dimension wird auf [0, 1] abgebildet, die Strategien arbeiten nur im Einheitswürfel
+class Real:
+    def __init__(self, low, high, step=None):
+        """Kontinuierlicher Bereich [low, high], optional auf Vielfache von `step` gerundet."""
+        self.low, self.high, self.step = low, high, step
+
+    def encode(self, value):
+        return (value - self.low) / (self.high - self.low)
+
+    def decode(self, u):
+        value = self.low + u * (self.high - self.low)
+        if self.step:
+            value = self.low + round((value - self.low) / self.step) * self.step
+            value = round(value, 10)
+        return min(max(value, self.low), self.high)
+
+
+class Integer(Real):
+    def __init__(self, low, high):
+        """Ganzzahliger Bereich [low, high]."""
+        super().__init__(low, high, step=1)
+
+    def decode(self, u):
+        return int(super().decode(u))
+
+
+class Categorical:
+    def __init__(self, values):
+        """Endliche Auswahl (z.B. [True, False]); Wert i liegt im Intervall [i/n, (i+1)/n)."""
+        self.values = list(values)
+
+    def encode(self, value):
+        return (self.values.index(value) + 0.5) / len(self.values)
+
+    def decode(self, u):
+        return self.values[min(int(u * len(self.values)), len(self.values) - 1)]
+
+
+class SearchStrategy:
+    max_resample = 100  # Vorschläge je ask(), bis einer die Nebenbedingung erfüllt
+
+    def __init__(self, space, seed=None, constraint=None):
+        """
+        Basisklasse: `ask()` liefert die nächste Parameterkombination, `tell(params, score)` meldet deren
+        Bewertung (höher = besser, None = ungültig/fehlgeschlagen). Beliebig viele `ask()` dürfen offen sein,
+        damit alle Worker ohne Generationsgrenzen ausgelastet bleiben.
+
+        :param constraint: Optionale Funktion params -> bool; ungültige Vorschläge werden verworfen und neu gezogen,
+                           erreichen also nie den Pool (z.B. atr_multiplier_sl < atr_multiplier_tp)
+        """
+        self.space = space
+        self.names = list(space)
+        self.constraint = constraint
+        self.rng = np.random.default_rng(seed)
+        self.points = []  # (Vektor im Einheitswürfel, Bewertung)
+
+    def ask(self):
+        for _ in range(self.max_resample):
+            params = self._decode(self._propose())
+            if self.constraint is None or self.constraint(params):
+                return params
+        raise ValueError(f"Kein gültiger Vorschlag in {self.max_resample} Versuchen (Nebenbedingung zu streng?)")
+
+    def tell(self, params, score):
+        if score is None or not math.isfinite(score):
+            score = -math.inf
+        self.points.append((self._encode(params), score))
+
+    def _propose(self):
+        return self.rng.random(len(self.names))
+
+    def _encode(self, params):
+        return np.array([self.space[name].encode(params[name]) for name in self.names])
+
+    def _decode(self, u):
+        return {name: self.space[name].decode(float(x)) for name, x in zip(self.names, np.clip(u, 0, 1))}
+
+    def best(self):
+        """Bisher beste Bewertung und Parameter."""
+        u, score = max(self.points, key=lambda point: point[1])
+        return score, self._decode(u)
+
+
+class RandomSearch(SearchStrategy):
+    """Gleichverteilte Stichproben im Suchraum (Referenz)."""
+
+
+class EvolutionStrategy(SearchStrategy):
+    def __init__(self, space, seed=None, population=None, sigma=0.3, constraint=None):
+        """
+        Steady-State-Evolutionsstrategie im Stil von CMA-ES: Nach einer zufälligen Startpopulation werden
+        Kandidaten aus N(m, sigma² C) gezogen. Mit jeder Rückmeldung werden Mittelwert und Kovarianz aus den
+        besten Punkten der letzten 2 * population Bewertungen neu gewichtet (rank-mu-Update). Die Schrittweite
+        folgt einer Median-Erfolgsregel: Erfolg ist eine Bewertung über dem Median der aktuellen Generation
+        (letzte `population` gültige Bewertungen), Ziel-Erfolgsrate 1/2. Ungültige Bewertungen (-inf, z.B. zu
+        wenige Trades) ändern die Schrittweite nicht. Es gibt keine Generationsgrenze, jede Rückmeldung
+        aktualisiert sofort.
+        """
+        super().__init__(space, seed, constraint)
+        dim = len(self.names)
+        self.population = population or 4 + int(3 * math.log(dim))
+        self.mu = self.population // 2
+        weights = np.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        mu_eff = 1 / np.sum(self.weights ** 2)
+        self.c_mu = min(1.0, mu_eff / (dim ** 2 + mu_eff)) * 2 / self.population
+        self.mean = np.full(dim, 0.5)
+        self.cov = np.eye(dim)
+        self.sigma = sigma
+
+    def _propose(self):
+        if len(self.points) < self.population:
+            return self.rng.random(len(self.names))
+        return self.rng.multivariate_normal(self.mean, self.sigma ** 2 * self.cov)
+
+    def tell(self, params, score):
+        super().tell(params, score)
+        _, score = self.points[-1]
+        if len(self.points) < self.population or not math.isfinite(score):
+            return
+
+        # Median-Erfolgsregel: besser als der Median der aktuellen Generation -> Schrittweite vergrößern, sonst
+        # verkleinern (im Gleichgewicht bei Erfolgsrate 1/2)
+        previous = (s for _, s in reversed(self.points[:-1]) if math.isfinite(s))
+        generation = list(itertools.islice(previous, self.population))
+        if len(generation) == self.population:
+            success = score > np.median(generation)
+            self.sigma *= math.exp((0.5 if success else -0.5) / len(self.names))
+            self.sigma = min(max(self.sigma, 1e-3), 1.0)
+
+        recent = sorted(self.points[-2 * self.population:], key=lambda point: point[1], reverse=True)[:self.mu]
+        if len(recent) < self.mu or not math.isfinite(recent[-1][1]):
+            return
+        elite = np.array([u for u, _ in recent])
+        steps = (elite - self.mean) / self.sigma
+        self.mean = np.clip(self.weights @ elite, 0, 1)
+        rank_mu = (steps * self.weights[:, None]).T @ steps
+        self.cov = (1 - self.c_mu) * self.cov + self.c_mu * rank_mu
+        self.cov = (self.cov + self.cov.T) / 2 + 1e-8 * np.eye(len(self.names))
+
+
+class TPESampler(SearchStrategy):
+    def __init__(self, space, seed=None, startup=10, gamma=0.25, candidates=24, constraint=None):
+        """
+        Tree-structured Parzen Estimator: Die Bewertungen werden in gute (beste `gamma`-Anteil) und übrige Punkte
+        geteilt. Je Dimension werden Parzen-Dichten l(x) (gut) und g(x) (übrig) geschätzt; aus l gezogene Kandidaten
+        werden nach l(x)/g(x) ausgewählt. Die ersten `startup` Vorschläge sind zufällig.
+        """
+        super().__init__(space, seed, constraint)
+        self.startup = startup
+        self.gamma = gamma
+        self.candidates = candidates
+
+    def _propose(self):
+        finite = [point for point in self.points if math.isfinite(point[1])]
+        if len(finite) < self.startup:
+            return self.rng.random(len(self.names))
+
+        ranked = sorted(self.points, key=lambda point: point[1], reverse=True)
+        num_good = max(1, int(math.ceil(self.gamma * len(ranked))))
+        good = np.array([u for u, _ in ranked[:num_good]])
+        bad = np.array([u for u, _ in ranked[num_good:]])
+
+        samples = np.empty((self.candidates, len(self.names)))
+        log_ratio = np.zeros(self.candidates)
+        for d, name in enumerate(self.names):
+            bandwidth = self._bandwidth(self.space[name], len(good))
+            samples[:, d] = self._sample_parzen(good[:, d], bandwidth)
+            log_ratio += (self._log_parzen(samples[:, d], good[:, d], bandwidth)
+                          - self._log_parzen(samples[:, d], bad[:, d], self._bandwidth(self.space[name], len(bad))))
+        return samples[int(np.argmax(log_ratio))]
+
+    @staticmethod
+    def _bandwidth(dimension, n):
+        if isinstance(dimension, Categorical):
+            return 0.5 / len(dimension.values)  # Kern deckt etwa eine Kategorie ab
+        return max(0.05, 0.5 * (n + 1) ** -0.2)
+
+    def _sample_parzen(self, centers, bandwidth):
+        """Zieht Kandidaten aus der Parzen-Dichte (Gauß-Kerne um die Punkte plus gleichverteilter Prior)."""
+        component = self.rng.integers(0, len(centers) + 1, size=self.candidates)
+        uniform = component == len(centers)
+        kernel = np.minimum(component, len(centers) - 1)
+        samples = centers[kernel] + bandwidth * self.rng.standard_normal(self.candidates)
+        samples[uniform] = self.rng.random(int(uniform.sum()))
+        return np.clip(samples, 0, 1)
+
+    @staticmethod
+    def _log_parzen(x, centers, bandwidth):
+        if len(centers) == 0:
+            return np.zeros(len(x))
+        z = (x[:, None] - centers[None, :]) / bandwidth
+        kernels = np.exp(-0.5 * z ** 2) / (bandwidth * math.sqrt(2 * math.pi))
+        density = (kernels.sum(axis=1) + 1.0) / (len(centers) + 1)  # Prior: Gleichverteilung auf [0, 1]
+        return np.log(density)
+
+
+STRATEGIES = {
+    "random": RandomSearch,
+    "evolution": EvolutionStrategy,
+    "tpe": TPESampler,
+}
+
+
+def run_search(strategy, evaluate, objective, num_trials, pool, processes, on_result=None):
+    """
+    Asynchrone Suche: Es sind stets `processes` Auswertungen im Pool unterwegs; jede fertige Auswertung wird
+    sofort an die Strategie gemeldet und durch einen neuen Vorschlag ersetzt (keine Generationsgrenzen).
+
+    :param evaluate: Picklebare Funktion params -> Ergebnis (oder None)
+    :param objective: Funktion Ergebnis -> Bewertung (höher = besser)
+    :param on_result: Optionaler Callback (Anzahl fertig, params, Ergebnis) z.B. für Fortschrittsanzeigen
+    :return: Liste aller Ergebnisse (ohne None)
+    """
+    completed = queue.Queue()
+    results = []
+
+    def submit():
+        params = strategy.ask()
+        pool.apply_async(evaluate, (params,), callback=lambda result: completed.put((params, result)),
+                         error_callback=lambda error: completed.put((params, None)))
+
+    submitted = 0
+    while submitted < min(processes, num_trials):
+        submit()
+        submitted += 1
+
+    for done in range(1, num_trials + 1):
+        params, result = completed.get()
+        strategy.tell(params, objective(result) if result else None)
+        if result:
+            results.append(result)
+        if on_result is not None:
+            on_result(done, params, result)
+        if submitted < num_trials:
+            submit()
+            submitted += 1
+    return results
@@ -0,0 +1,154 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# 📌 Kennzahlen je Marktphase ohne erneute Backtests: jede 5-Min-Kerze erhält einmalig kategoriale Labels
+# (Codes + Kategorien) aus den gespeicherten Indikatoren. Trades übernehmen die Labels ihrer Einstiegskerze,
+# alle Kennzahlen aller Dimensionen entstehen in einer gruppierten Reduktion (np.bincount über versetzte Codes).
+ADX_BINS = [20, 25, 40]
+ADX_CATEGORIES = ["ranging (<20)", "weak (20-25)", "trend (25-40)", "strong (>=40)"]
+WEEKDAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+TIME_BUCKET_MINUTES = 30
+VOLATILITY_BUCKETS = 4
+DIMENSIONS = ("adx_regime", "time_of_day", "weekday", "volatility")
+
+
+def compute_labels(df_5min, df_15min, visible_15min=None, dimensions=DIMENSIONS):
+    """
+    Kategoriale Labels je 5-Min-Kerze.
+
+    - adx_regime: ADX_14 der zuletzt sichtbaren 15-Min-Kerze (wie im Backtester)
+    - time_of_day: 30-Minuten-Abschnitt der Börsenzeit (Zeitzone des Index)
+    - weekday: Wochentag
+    - volatility: Quartil von ATR_14 / close über den gesamten Datensatz
+
+    :param visible_15min: Anzahl sichtbarer 15-Min-Kerzen je 5-Min-Kerze (Backtester._visible_15min)
+    :return: Dictionary Dimension -> (Codes als int16-Array, Liste der Kategorien); Code -1 = kein Label
+    """
+    labels = {}
+    index = df_5min.index
+    if "adx_regime" in dimensions:
+        if visible_15min is None:
+            visible_15min = np.searchsorted(df_15min.index.asi8, index.asi8, side="right")
+        adx = df_15min["ADX_14"].to_numpy(dtype=np.float64)[np.maximum(visible_15min - 1, 0)]
+        codes = np.digitize(adx, ADX_BINS).astype(np.int16)
+        codes[(visible_15min == 0) | np.isnan(adx)] = -1
+        labels["adx_regime"] = (codes, ADX_CATEGORIES)
+    if "time_of_day" in dimensions:
+        minutes = index.hour.to_numpy() * 60 + index.minute.to_numpy()
+        buckets = minutes // TIME_BUCKET_MINUTES
+        present = np.unique(buckets)
+        codes = np.searchsorted(present, buckets).astype(np.int16)
+        categories = [f"{b * TIME_BUCKET_MINUTES // 60:02d}:{b * TIME_BUCKET_MINUTES % 60:02d}" for b in present]
+        labels["time_of_day"] = (codes, categories)
+    if "weekday" in dimensions:
+        labels["weekday"] = (index.dayofweek.to_numpy().astype(np.int16), WEEKDAYS)
+    if "volatility" in dimensions:
+        relative_atr = df_5min["ATR_14"].to_numpy(dtype=np.float64) / df_5min["close"].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(relative_atr)
+        edges = np.quantile(relative_atr[valid], np.linspace(0, 1, VOLATILITY_BUCKETS + 1)[1:-1]) if valid.any() \
+            else []
+        codes = np.digitize(relative_atr, edges).astype(np.int16)
+        codes[~valid] = -1
+        labels["volatility"] = (codes, [f"Q{i + 1}" for i in range(VOLATILITY_BUCKETS)])
+    return labels
+
+
+def combine_labels(labels, first, second):
+    """Kreuzt zwei Dimensionen zu einer neuen (z.B. ADX-Regime x Tageszeit)."""
+    codes_a, categories_a = labels[first]
+    codes_b, categories_b = labels[second]
+    codes = np.where((codes_a < 0) | (codes_b < 0), -1, codes_a.astype(np.int32) * len(categories_b) + codes_b)
+    categories = [f"{a} | {b}" for a in categories_a for b in categories_b]
+    return codes.astype(np.int32), categories
+
+
+def slice_metrics(ledger, equity_curve, in_position, labels, initial_balance):
+    """
+    Kennzahlen je Dimension und Kategorie in einer gruppierten Reduktion über Trade-Journal und Kapitalkurve.
+
+    Trade-Kennzahlen (nach Einstiegskerze): Anzahl, Win Rate, mittlere Rendite, Sharpe Ratio (wie im
+    Backtester), Profit Factor, Gewinn. Kerzen-Kennzahlen: Anzahl, Exposure und Summe der Kerzenrenditen der
+    Kapitalkurve (Beitrag der Phase zur Gesamtrendite).
+
+    :param labels: Ergebnis von `compute_labels` (ggf. ergänzt um `combine_labels`)
+    :return: DataFrame mit einer Zeile je (Dimension, Kategorie)
+    """
+    names = list(labels)
+    sizes = np.array([len(labels[name][1]) for name in names])
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    total_groups = int(offsets[-1])
+
+    def grouped_sums(rows, columns):
+        # Versetzte Codes aller Dimensionen hintereinander (ohne Label -> Sammelgruppe am Ende), danach je
+        # Kennzahl ein bincount über alle Dimensionen gleichzeitig
+        codes = np.concatenate([np.where(labels[name][0][rows] >= 0, labels[name][0][rows] + offsets[i],
+                                         total_groups) for i, name in enumerate(names)])
+        return [np.bincount(codes, np.tile(values, len(names)), minlength=total_groups + 1)[:total_groups]
+                for values in columns]
+
+    # Trades (Labels der Einstiegskerze)
+    direction = ledger["direction"]
+    entry_price, exit_price = ledger["entry_price"], ledger["exit_price"]
+    returns = np.where(direction == 1, exit_price / entry_price - 1, entry_price / exit_price - 1)
+    pnl = ledger["exit_balance"] - ledger["entry_balance"]
+    trades, wins, return_sum, return_squares, gross_profit, gross_loss = grouped_sums(ledger["entry_index"], [
+        np.ones(len(returns)), (pnl > 0).astype(np.float64), returns, returns ** 2, np.where(pnl > 0, pnl, 0.0),
+        np.where(pnl < 0, -pnl, 0.0)])
+
+    # Kerzen der Kapitalkurve
+    equity = np.asarray(equity_curve, dtype=np.float64)
+    previous = np.concatenate(([initial_balance], equity[:-1]))
+    bars, exposure, bar_return_sum = grouped_sums(slice(None), [
+        np.ones(len(equity)), np.asarray(in_position, dtype=np.float64), (equity - previous) / previous])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = return_sum / trades
+        std = np.sqrt(np.maximum(return_squares / trades - mean ** 2, 0))
+        sharpe = np.where((trades > 1) & (std > 0), mean / std * np.sqrt(252), 0)
+        profit_factor = np.where(gross_loss > 0, gross_profit / gross_loss, np.where(gross_profit > 0, np.inf, 0))
+        frame = pd.DataFrame({
+            "dimension": np.repeat(names, sizes),
+            "label": [category for name in names for category in labels[name][1]],
+            "Total Trades": trades.astype(np.int64),
+            "Win Rate (%)": np.nan_to_num(wins / trades * 100).round(2),
+            "Avg Return (%)": np.nan_to_num(mean * 100).round(4),
+            "Sharpe Ratio": sharpe.round(2),
+            "Profit Factor": profit_factor.round(2),
+            "PnL": (gross_profit - gross_loss).round(2),
+            "Bars": bars.astype(np.int64),
+            "Exposure (%)": np.nan_to_num(exposure / bars * 100).round(2),
+            "Bar Return (%)": (bar_return_sum * 100).round(4),
+        })
+    return frame[frame["Bars"] > 0].reset_index(drop=True)
+
+
+def main(argv=None):
+    from backtester import Backtester
+    from MomentumBreakoutAgent import MomentumBreakoutAgent
+    from storage import load_frame
+
+    parser = argparse.ArgumentParser(description="Kennzahlen je ADX-Regime, Tageszeit, Wochentag und Volatilität")
+    parser.add_argument("--results", default="optimization_results.csv")
+    parser.add_argument("--row", type=int, default=0, help="Zeile der Ergebnisdatei (nach --sort sortiert)")
+    parser.add_argument("--sort", default="sharpe_ratio", help="Spalte, nach der absteigend sortiert wird")
+    parser.add_argument("--data-5min", default="saved_data/SPY_train_5min.parquet")
+    parser.add_argument("--data-15min", default="saved_data/SPY_train_15min.parquet")
+    parser.add_argument("--cross", nargs=2, action="append", metavar=("DIM1", "DIM2"), choices=DIMENSIONS,
+                        help="Zusätzlich zwei Dimensionen kreuzen (mehrfach angebbar)")
+    args = parser.parse_args(argv)
+
+    df_results = pd.read_csv(args.results).sort_values(args.sort, ascending=False)
+    agent_params = {name: value for name, value in df_results.iloc[args.row].items()
+                    if name in MomentumBreakoutAgent.__init__.__code__.co_varnames}
+    backtester = Backtester(MomentumBreakoutAgent(**agent_params), load_frame(args.data_5min),
+                            load_frame(args.data_15min), labels=True)
+    print(f"📊 Backtest: {backtester.run_backtest()}")
+    for first, second in args.cross or []:
+        backtester.bar_labels[f"{first} x {second}"] = combine_labels(backtester.bar_labels, first, second)
+    print(backtester.slice_metrics().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from storage import load_frame, resolve_path
+
+# Status einer Aufgabe in der Queue
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_LEASE_TIMEOUT = 120  # Sekunden ohne Heartbeat, nach denen eine Aufgabe als verwaist gilt
+DEFAULT_HEARTBEAT_INTERVAL = 10
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tradehive", "datasets")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datasets (
+    hash TEXT PRIMARY KEY,
+    files TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    params TEXT NOT NULL,
+    dataset TEXT NOT NULL REFERENCES datasets(hash),
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    heartbeat_at REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks(status, id);
+"""
+
+
+def hash_files(paths):
+    """SHA-256 über Namen und Inhalt der Dateien (in sortierter Reihenfolge)."""
+    digest = hashlib.sha256()
+    for name in sorted(paths):
+        digest.update(name.encode())
+        with open(paths[name], "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class SQLiteWorkQueue:
+    def __init__(self, path, lease_timeout=DEFAULT_LEASE_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """
+        Aufgaben-Queue für Optimierungsläufe über mehrere Rechner, gespeichert in einer SQLite-Datei auf
+        gemeinsamem Speicher. Worker beanspruchen Aufgaben in einer exklusiven Transaktion, melden Heartbeats und
+        Ergebnisse; Aufgaben ohne Heartbeat innerhalb von `lease_timeout` werden erneut freigegeben.
+        Datensätze liegen inhaltsadressiert (SHA-256) neben der Datenbank unter `datasets/<hash>/`.
+
+        Zeitstempel (claimed_at, heartbeat_at) sind Julianische Tage aus julianday('now') und werden mit derselben
+        Uhr geschrieben und geprüft. SQLite wertet 'now' auf dem jeweils zugreifenden Rechner aus: die Uhren aller
+        Rechner müssen synchronisiert sein (NTP), die Abweichung deutlich kleiner als `lease_timeout`.
+
+        Verwendet das Standard-Journal statt WAL, da WAL auf Netzwerk-Dateisystemen nicht zuverlässig ist.
+        Eine Instanz (Verbindung) pro Thread bzw. Prozess verwenden.
+        """
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.dataset_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "datasets")
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self):
+        """Exklusive Schreibtransaktion (BEGIN IMMEDIATE), damit zwei Worker nie dieselbe Aufgabe erhalten."""
+        return _Transaction(self._conn)
+
+    # 📌 Koordinator
+    def register_dataset(self, files):
+        """
+        Legt die Dateien eines Datensatzes inhaltsadressiert im gemeinsamen Speicher ab.
+
+        :param files: Dictionary Name -> Pfad (z.B. {"5min": "saved_data/SPY_train_5min.parquet", ...})
+        :return: Hash des Datensatzes
+        """
+        files = {name: resolve_path(path) for name, path in files.items()}
+        dataset_hash = hash_files(files)
+        target = os.path.join(self.dataset_dir, dataset_hash)
+        if not os.path.isdir(target):
+            os.makedirs(self.dataset_dir, exist_ok=True)
+            staging = tempfile.mkdtemp(dir=self.dataset_dir)
+            for name, path in files.items():
+                shutil.copyfile(path, os.path.join(staging, f"{name}.parquet"))
+            try:
+                os.rename(staging, target)
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)  # parallel bereits abgelegt
+        with self._transaction():
+            self._conn.execute("INSERT OR IGNORE INTO datasets (hash, files) VALUES (?, ?)",
+                               (dataset_hash, json.dumps(sorted(files))))
+        return dataset_hash
+
+    def add_tasks(self, params_list, dataset_hash):
+        """Fügt Parameterkombinationen (Dictionaries) als offene Aufgaben hinzu."""
+        with self._transaction():
+            self._conn.executemany("INSERT INTO tasks (params, dataset) VALUES (?, ?)",
+                                   [(json.dumps(params), dataset_hash) for params in params_list])
+
+    def requeue_abandoned(self):
+        """Gibt beanspruchte Aufgaben ohne aktuellen Heartbeat wieder frei; liefert deren Anzahl."""
+        with self._transaction():
+            return self._requeue_abandoned()
+
+    def _requeue_abandoned(self):
+        # Wie fail(): nach `max_attempts` Versuchen endgültig fehlgeschlagen statt erneut freigegeben
+        cursor = self._conn.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, "
+            "error = CASE WHEN attempts >= ? THEN 'Lease abgelaufen' ELSE error END "
+            "WHERE status = ? AND heartbeat_at < julianday('now') - ? / 86400.0",
+            (self.max_attempts, FAILED, PENDING, self.max_attempts, CLAIMED, self.lease_timeout))
+        return cursor.rowcount
+
+    def counts(self):
+        """Anzahl der Aufgaben je Status."""
+        rows = self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return {PENDING: 0, CLAIMED: 0, DONE: 0, FAILED: 0, **dict(rows)}
+
+    def results(self):
+        """Ergebnisse aller erledigten Aufgaben (Tabellenzeilen wie im ParameterOptimizer)."""
+        rows = self._conn.execute("SELECT result FROM tasks WHERE status = ? AND result IS NOT NULL ORDER BY id",
+                                  (DONE,)).fetchall()
+        return [result for result in (json.loads(row[0]) for row in rows) if result]
+
+    # 📌 Worker
+    def claim(self, worker_id):
+        """Beansprucht die nächste offene Aufgabe; liefert (task_id, params, dataset_hash) oder None."""
+        with self._transaction():
+            self._requeue_abandoned()
+            row = self._conn.execute("SELECT id, params, dataset FROM tasks WHERE status = ? ORDER BY id LIMIT 1",
+                                     (PENDING,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, worker = ?, attempts = attempts + 1, claimed_at = julianday('now'), "
+                "heartbeat_at = julianday('now') WHERE id = ?", (CLAIMED, worker_id, row[0]))
+        return row[0], json.loads(row[1]), row[2]
+
+    def heartbeat(self, task_id, worker_id):
+        """Verlängert die Beanspruchung; False, wenn die Aufgabe inzwischen neu vergeben wurde."""
+        cursor = self._conn.execute(
+            "UPDATE tasks SET heartbeat_at = julianday('now') WHERE id = ? AND worker = ? AND status = ?",
+            (task_id, worker_id, CLAIMED))
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, worker_id, result):
+        """Speichert das Ergebnis; wird ignoriert, wenn die Aufgabe inzwischen einem anderen Worker gehört."""
+        cursor = self._conn.execute("UPDATE tasks SET status = ?, result = ? WHERE id = ? AND worker = ? AND status = ?",
+                                    (DONE, json.dumps(result), task_id, worker_id, CLAIMED))
+        return cursor.rowcount == 1
+
+    def fail(self, task_id, worker_id, error):
+        """Meldet einen Fehler; nach `max_attempts` Versuchen wird die Aufgabe endgültig als fehlgeschlagen markiert."""
+        cursor = self._conn.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, error = ? "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (self.max_attempts, FAILED, PENDING, str(error), task_id, worker_id, CLAIMED))
+        return cursor.rowcount == 1
+
+    def dataset_files(self, dataset_hash):
+        """Pfade der Dateien eines Datensatzes im gemeinsamen Speicher."""
+        directory = os.path.join(self.dataset_dir, dataset_hash)
+        return {name[:-len(".parquet")]: os.path.join(directory, name) for name in os.listdir(directory)}
+
+
+class _Transaction:
+    __slots__ = ("conn",)
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        return False
+
+
+class DatasetCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        Lokaler Cache der Datensätze eines Workers: Dateien werden einmalig aus dem gemeinsamen Speicher kopiert,
+        per Hash geprüft und danach lokal (und im Speicher) wiederverwendet.
+        """
+        self.cache_dir = cache_dir
+        self._frames = {}
+
+    def load(self, queue, dataset_hash):
+        """Liefert (df_5min, df_15min) des Datensatzes."""
+        if dataset_hash not in self._frames:
+            directory = os.path.join(self.cache_dir, dataset_hash)
+            if not os.path.isdir(directory):
+                self._fetch(queue, dataset_hash, directory)
+            # Format wird am Inhalt erkannt, die Kopien heißen unabhängig vom Speicherformat <name>.parquet
+            self._frames[dataset_hash] = (load_frame(os.path.join(directory, "5min.parquet")),
+                                          load_frame(os.path.join(directory, "15min.parquet")))
+        return self._frames[dataset_hash]
+
+    def _fetch(self, queue, dataset_hash, directory):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.cache_dir)
+        files = {}
+        for name, path in queue.dataset_files(dataset_hash).items():
+            files[name] = os.path.join(staging, f"{name}.parquet")
+            shutil.copyfile(path, files[name])
+        if hash_files(files) != dataset_hash:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise ValueError(f"Datensatz {dataset_hash[:12]} beschädigt (Hash stimmt nicht)")
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)  # anderer Worker auf diesem Rechner war schneller
+
+
+def _heartbeat_loop(queue_path, task_id, worker_id, interval, stop):
+    """Sendet Heartbeats für eine laufende Aufgabe (eigene Verbindung, da SQLite-Verbindungen threadgebunden sind)."""
+    queue = SQLiteWorkQueue(queue_path)
+    try:
+        while not stop.wait(interval):
+            if not queue.heartbeat(task_id, worker_id):
+                return
+    finally:
+        queue.close()
+
+
+def run_worker(queue_path, worker_id=None, cache_dir=DEFAULT_CACHE_DIR, heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL,
+               poll_interval=5, wait=False, timeout=60, lease_timeout=DEFAULT_LEASE_TIMEOUT):
+    """
+    Arbeitet Aufgaben der Queue ab, bis keine offenen oder beanspruchten Aufgaben mehr existieren
+    (mit `wait=True` wird weiter auf neue Aufgaben gewartet).
+
+    :return: Anzahl erledigter Aufgaben
+    """
+    from ParameterOptimizer import evaluate_params
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    queue = SQLiteWorkQueue(queue_path, lease_timeout)
+    cache = DatasetCache(cache_dir)
+    done = 0
+    print(f"🔄 Worker {worker_id} gestartet")
+    try:
+        while True:
+            task = queue.claim(worker_id)
+            if task is None:
+                counts = queue.counts()
+                if not wait and counts[PENDING] == 0 and counts[CLAIMED] == 0:
+                    break
+                time.sleep(poll_interval)  # verwaiste Aufgaben werden beim nächsten claim() freigegeben
+                continue
+
+            task_id, params, dataset_hash = task
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_heartbeat_loop,
+                                         args=(queue_path, task_id, worker_id, heartbeat_interval, stop), daemon=True)
+            heartbeat.start()
+            try:
+                df_5min, df_15min = cache.load(queue, dataset_hash)
+                result = evaluate_params(params, df_5min, df_15min, timeout)
+            except Exception as e:
+                print(f"❌ Aufgabe {task_id} fehlgeschlagen: {e}")
+                queue.fail(task_id, worker_id, e)
+                continue
+            finally:
+                stop.set()
+                heartbeat.join()
+
+            if queue.complete(task_id, worker_id, result):
+                done += 1
+    finally:
+        queue.close()
+    print(f"✅ Worker {worker_id}: {done} Aufgaben erledigt")
+    return done
+
+
+def _run_worker_process(args):
+    return run_worker(*args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verteilte Parameteroptimierung über eine SQLite-Queue")
+    parser.add_argument("--queue", required=True, help="Pfad der Queue-Datenbank (auf gemeinsamem Speicher)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser("submit", help="Datensatz ablegen und Parameterkombinationen einstellen")
+    submit.add_argument("--data-5min", default="saved_data/SPY_train_5min.parquet")
+    submit.add_argument("--data-15min", default="saved_data/SPY_train_15min.parquet")
+    submit.add_argument("--combinations", type=int, default=100, help="Stichprobengröße aus param_grid")
+    submit.add_argument("--seed", type=int)
+
+    worker = commands.add_parser("worker", help="Aufgaben abarbeiten")
+    worker.add_argument("--processes", type=int, default=1, help="Anzahl Worker-Prozesse auf diesem Rechner")
+    worker.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    worker.add_argument("--wait", action="store_true", help="Auf neue Aufgaben warten statt sich zu beenden")
+    worker.add_argument("--lease-timeout", type=float, default=DEFAULT_LEASE_TIMEOUT,
+                        help="Sekunden ohne Heartbeat, nach denen Aufgaben anderer Worker neu vergeben werden")
+
+    commands.add_parser("status", help="Fortschritt anzeigen")
+
+    collect = commands.add_parser("collect", help="Ergebnisse als CSV speichern")
+    collect.add_argument("--output", default="optimization_results.csv")
+
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        from ParameterOptimizer import param_grid, sample_param_combinations, is_valid_params
+        param_combinations = sample_param_combinations(args.combinations, args.seed)
+        queue = SQLiteWorkQueue(args.queue)
+        dataset_hash = queue.register_dataset({"5min": args.data_5min, "15min": args.data_15min})
+        params_list = [dict(zip(param_grid.keys(), params)) for params in param_combinations if is_valid_params(params)]
+        queue.add_tasks(params_list, dataset_hash)
+        print(f"✅ {len(params_list)} Aufgaben eingestellt (Datensatz {dataset_hash[:12]})")
+    elif args.command == "worker":
+        worker_args = (args.queue, None, args.cache_dir, DEFAULT_HEARTBEAT_INTERVAL, 5, args.wait, 60,
+                       args.lease_timeout)
+        if args.processes == 1:
+            run_worker(*worker_args)
+        else:
+            with multiprocessing.Pool(args.processes) as pool:
+                done = sum(pool.map(_run_worker_process, [worker_args] * args.processes))
+            print(f"✅ {done} Aufgaben erledigt")
+    elif args.command == "status":
+        queue = SQLiteWorkQueue(args.queue)
+        print(f"📊 Requeued: {queue.requeue_abandoned()} - {queue.counts()}")
+    elif args.command == "collect":
+        results = SQLiteWorkQueue(args.queue).results()
+        pd.DataFrame(results).to_csv(args.output, index=False)
+        print(f"✅ {len(results)} Ergebnisse gespeichert: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
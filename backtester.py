@@ -1,51 +1,617 @@
+import hashlib
 import numpy as np
 import logging
+import multiprocessing
+import pickle
 import pandas as pd
+from profiling import profiler
+from MarketWindow import MarketWindow
+
+# Richtung eines Trades im Trade-Journal
+CALL = 1
+PUT = -1
+TRADE_DIRECTIONS = {"BUY CALL": CALL, "BUY PUT": PUT}
+TRADE_TYPES = {CALL: "BUY CALL", PUT: "BUY PUT"}
+
+# Format-Version der Checkpoints (bei inkompatiblen Änderungen erhöhen)
+CHECKPOINT_VERSION = 1
+
+
+class TradeLedger:
+    # Spalten des Journals mit festen Datentypen
+    FIELDS = {
+        "direction": np.int8,
+        "entry_index": np.int64,
+        "exit_index": np.int64,
+        "entry_price": np.float64,
+        "exit_price": np.float64,
+        "stop_loss": np.float64,
+        "take_profit": np.float64,
+        "size": np.float64,
+        "entry_balance": np.float64,
+        "exit_balance": np.float64,
+    }
+
+    def __init__(self, capacity=1024):
+        """
+        Spaltenbasiertes Trade-Journal: abgeschlossene Trades werden in vorallokierte, typisierte NumPy-Arrays
+        geschrieben. Ist die Kapazität erschöpft, wird sie verdoppelt.
+        """
+        self._length = 0
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.FIELDS.items()}
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, field):
+        """Liefert eine Spalte (View auf die belegten Einträge)."""
+        return self._columns[field][:self._length]
+
+    def append(self, direction, entry_index, exit_index, entry_price, exit_price, stop_loss, take_profit, size,
+               entry_balance, exit_balance):
+        """Schreibt einen abgeschlossenen Trade in die nächste freie Zeile."""
+        if self._length == len(self._columns["direction"]):
+            self._grow()
+        row = self._length
+        columns = self._columns
+        columns["direction"][row] = direction
+        columns["entry_index"][row] = entry_index
+        columns["exit_index"][row] = exit_index
+        columns["entry_price"][row] = entry_price
+        columns["exit_price"][row] = exit_price
+        columns["stop_loss"][row] = stop_loss
+        columns["take_profit"][row] = take_profit
+        columns["size"][row] = size
+        columns["entry_balance"][row] = entry_balance
+        columns["exit_balance"][row] = exit_balance
+        self._length += 1
+
+    def _grow(self):
+        capacity = max(1, 2 * len(self._columns["direction"]))
+        for name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._length] = column[:self._length]
+            self._columns[name] = grown
+
+    def to_frame(self):
+        """Journal als DataFrame (eine Zeile pro Trade)."""
+        return pd.DataFrame({name: self[name] for name in self.FIELDS})
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Erzeugt ein Journal aus einem DataFrame im Format von `to_frame`."""
+        ledger = cls(capacity=max(1024, len(frame)))
+        for name, dtype in cls.FIELDS.items():
+            ledger._columns[name][:len(frame)] = frame[name].to_numpy(dtype=dtype)
+        ledger._length = len(frame)
+        return ledger
+
+    def to_dicts(self):
+        """Journal im früheren Format (Liste von Trade-Dictionaries)."""
+        return [{
+            'type': TRADE_TYPES[int(row['direction'])],
+            'entry_price': row['entry_price'],
+            'stop_loss': row['stop_loss'],
+            'take_profit': row['take_profit'],
+            'size': row['size'],
+            'entry_balance': row['entry_balance'],
+            'exit_price': row['exit_price'],
+            'exit_balance': row['exit_balance'],
+            'closed': True
+        } for row in self.to_frame().to_dict("records")]
+
+
+def build_equity_curve(ledger, close, initial_balance, open_trade=None):
+    """
+    Berechnet vektorisiert die Mark-to-Market-Kapitalkurve je Kerze aus dem Trade-Journal.
+
+    :param ledger: TradeLedger mit abgeschlossenen Trades
+    :param close: Schlusskurse der Kerzen (NumPy-Array)
+    :param initial_balance: Startkapital
+    :param open_trade: Noch offener Trade (Dictionary) oder None
+    :return: Tuple (Kapital je Kerze, boolesches Array "Position offen" je Kerze)
+    """
+    bars = np.arange(len(close))
+
+    # Realisierter Kontostand: Stufenfunktion, die sich an den Exit-Kerzen ändert
+    exit_index = ledger["exit_index"]
+    if len(ledger):
+        last_exit = np.searchsorted(exit_index, bars, side="right") - 1
+        realized = np.where(last_exit >= 0, ledger["exit_balance"][np.maximum(last_exit, 0)], initial_balance)
+    else:
+        realized = np.full(len(close), initial_balance, dtype=np.float64)
+
+    direction = ledger["direction"]
+    entry_index = ledger["entry_index"]
+    entry_price = ledger["entry_price"]
+    size = ledger["size"]
+    entry_balance = ledger["entry_balance"]
+    if open_trade is not None:
+        direction = np.append(direction, TRADE_DIRECTIONS[open_trade['type']])
+        entry_index = np.append(entry_index, open_trade['entry_index'])
+        exit_index = np.append(exit_index, len(close))
+        entry_price = np.append(entry_price, open_trade['entry_price'])
+        size = np.append(size, open_trade['size'])
+        entry_balance = np.append(entry_balance, open_trade['entry_balance'])
+
+    if len(entry_index) == 0:
+        return realized, np.zeros(len(close), dtype=bool)
+
+    # Offene Position: Einstieg an Kerze e, Ausstieg an Kerze x -> gehalten in [e, x)
+    trade = np.searchsorted(entry_index, bars, side="right") - 1
+    trade_clipped = np.maximum(trade, 0)
+    in_position = (trade >= 0) & (bars < exit_index[trade_clipped])
+    marked = entry_balance[trade_clipped] + direction[trade_clipped] * (close - entry_price[trade_clipped]) * size[trade_clipped]
+    return np.where(in_position, marked, realized), in_position
+
+
+def data_fingerprint(df, rows=None):
+    """Hash über Index und Werte der ersten `rows` Zeilen eines DataFrames (alle Zeilen, falls None)."""
+    part = df if rows is None else df.iloc[:rows]
+    return hashlib.sha1(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes()).hexdigest()
+
+
+def load_checkpoint(path):
+    """Lädt einen mit `Backtester.save_checkpoint` gespeicherten Checkpoint."""
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def calculate_max_drawdown(equity, initial_balance):
+    """Maximaler Drawdown (in %) der Kapitalkurve, ausgehend vom Startkapital."""
+    balances = np.concatenate(([initial_balance], equity))
+    running_max = np.maximum.accumulate(balances)
+    drawdowns = (running_max - balances) / running_max
+    return round(float(np.max(drawdowns)) * 100, 2)
+
+
+def calculate_trade_metrics(ledger):
+    """Vektorisierte Kennzahlen aus dem Trade-Journal (Anzahl, Win Rate, Sharpe Ratio, Profit Factor)."""
+    total_trades = len(ledger)
+    direction = ledger["direction"]
+    entry_price = ledger["entry_price"]
+    exit_price = ledger["exit_price"]
+
+    wins = ((direction == CALL) & (exit_price > entry_price)) | ((direction == PUT) & (exit_price < entry_price))
+    win_rate = round((int(wins.sum()) / total_trades) * 100, 2) if total_trades > 0 else 0
+
+    # Sharpe Ratio auf Basis der Trade-Renditen
+    returns = np.where(direction == CALL, exit_price / entry_price - 1, entry_price / exit_price - 1)
+    if len(returns) > 1 and np.std(returns) > 0:
+        sharpe_ratio = round(float(np.mean(returns) / np.std(returns) * np.sqrt(252)), 2)
+    else:
+        sharpe_ratio = 0
+
+    # Profit Factor: Summe der Gewinne / Summe der Verluste
+    pnl = ledger["exit_balance"] - ledger["entry_balance"]
+    gross_profit = float(pnl[pnl > 0].sum())
+    gross_loss = float(-pnl[pnl < 0].sum())
+    if gross_loss > 0:
+        profit_factor = round(gross_profit / gross_loss, 2)
+    else:
+        profit_factor = float("inf") if gross_profit > 0 else 0
+
+    return {
+        "Total Trades": total_trades,
+        "Win Rate (%)": win_rate,
+        "Sharpe Ratio": sharpe_ratio,
+        "Profit Factor": profit_factor
+    }
+
 
 class Backtester:
     def __init__(self, agent, df_5min, df_15min, initial_balance=10000, slippage=0.01, fee_per_trade=0.0001,
-                 visualize=False):
+                 visualize=False, df_1min=None, exit_resolution="candle", labels=False, fill_model=None):
         """
         Generic Backtester for trading agents.
+
+        visualize=True (oder ein Pfad) rendert nach jedem Lauf Kurs, Trades und Kapitalkurve als HTML-Datei
+        (siehe visualization.py).
+
+        labels=True (oder eine Liste von Dimensionen aus SliceAnalysis.DIMENSIONS) versieht jede Kerze vor dem Lauf
+        mit kategorialen Labels (ADX-Regime, Tageszeit, ...); `slice_metrics()` wertet danach ohne erneuten
+        Backtest je Marktphase aus.
+
+        fill_model (z.B. FillModel.QuoteFillModel) ersetzt die pauschale Slippage durch Ausführungen aus Quote-Daten:
+        Einstiege und Umkehr-Exits kreuzen den Spread, Stop-/Target-Exits liegen um den halben Spread ungünstiger
+        als das Level, dazu kommt ein Impact-Term nach Ordergröße. Kerzen ohne gültige Quote werden wie ohne
+        fill_model ausgeführt (Einstiege und Stop-/Target-Exits mit `slippage`, Umkehr-Exits zum Schlusskurs).
+
+        exit_resolution="candle" entscheidet Stop-Loss/Take-Profit anhand von High/Low der 5-Min-Kerze
+        (liegen beide in derselben Kerze, gewinnt der Stop). Mit exit_resolution="1min" wird in diesem Fall
+        in den zugrunde liegenden 1-Min-Bars (df_1min) geprüft, welches Level zuerst berührt wurde.
         """
+        if exit_resolution not in ("candle", "1min"):
+            raise ValueError(f"Ungültige exit_resolution: {exit_resolution}")
+        if exit_resolution == "1min" and df_1min is None:
+            raise ValueError("exit_resolution='1min' benötigt df_1min")
+
         self.agent = agent
         self.df_5min = df_5min
         self.df_15min = df_15min
+        self.df_1min = df_1min
+        self.exit_resolution = exit_resolution
         self.initial_balance = initial_balance
         self.slippage = slippage
         self.fee_per_trade = fee_per_trade
+        self.fill_model = fill_model
         self.visualize = visualize
+        self.labels = labels
+        self.bar_labels = None
         self.balance = initial_balance
-        self.trades = []
+        self.ledger = TradeLedger()
         self.current_trade = None
+        self._fill_bases = []  # (Einstiegs-, Exit-Basispreis vor Impact) je Trade eines Segments, nur mit fill_model
+        self.equity_curve = None
+        self.in_position = None
+        self._completed_steps = 0
+
+        if exit_resolution == "1min":
+            self._prepare_intrabar_index()
+
+    @property
+    def trades(self):
+        """Abgeschlossene Trades als Liste von Dictionaries (Kompatibilität, für Auswertungen `ledger` nutzen)."""
+        return self.ledger.to_dicts()
 
     def run_backtest(self):
         """Run the backtest over the available market data."""
-        for i in range(len(self.df_5min)):
-            current_time = self.df_5min.index[i]
-            df_5min_slice = self.df_5min.iloc[:i]
-            df_15min_slice = self.df_15min[self.df_15min.index <= current_time]
+        with profiler.stage("backtest.run"):
+            self._prepare_run()
+            self._run_steps(0, len(self.df_5min))
+            self._completed_steps = len(self.df_5min)
+            profiler.count("backtest.bars", len(self.df_5min))
+
+            with profiler.stage("backtest.metrics"):
+                return self._calculate_metrics()
+
+    def checkpoint(self):
+        """
+        Vollständiger Zustand nach einem Lauf: Kontostand, offener Trade, Trade-Journal, Anzahl verarbeiteter
+        Schritte sowie Fingerabdrücke der verarbeiteten Daten (inkl. der vorberechneten Indikator-Spalten)
+        und der Konfiguration. Agenten mit internem Zustand können ihn über `get_state`/`set_state` beisteuern.
+        """
+        if self._completed_steps == 0:
+            raise ValueError("Checkpoint erst nach run_backtest() möglich")
+        if not hasattr(self.agent, "get_params"):
+            raise ValueError(f"Checkpoint nur für Agenten mit get_params() möglich ({type(self.agent).__qualname__})")
+        return {
+            "version": CHECKPOINT_VERSION,
+            "config": self._checkpoint_config(),
+            "completed_steps": self._completed_steps,
+            "rows": {"5min": len(self.df_5min), "15min": len(self.df_15min),
+                     "1min": len(self.df_1min) if self.df_1min is not None else 0},
+            "fingerprints": self._fingerprints(len(self.df_5min), len(self.df_15min),
+                                               len(self.df_1min) if self.df_1min is not None else 0),
+            "balance": self.balance,
+            "current_trade": dict(self.current_trade) if self.current_trade is not None else None,
+            "ledger": self.ledger.to_frame(),
+            "agent_state": self.agent.get_state() if hasattr(self.agent, "get_state") else None,
+        }
+
+    def save_checkpoint(self, path):
+        """Speichert den Checkpoint des letzten Laufs (Pickle)."""
+        with open(path, "wb") as f:
+            pickle.dump(self.checkpoint(), f)
+
+    def resume_backtest(self, checkpoint):
+        """
+        Setzt einen Lauf auf angehängten Daten fort: Nur die neuen Schritte werden simuliert, die Kennzahlen
+        sind identisch zu einem vollständigen Neulauf. Passen Daten-Präfix, Konfiguration oder Format nicht zum
+        Checkpoint (z.B. neu berechnete Indikatoren oder eine geänderte letzte Kerze), wird vollständig neu gerechnet.
+
+        :param checkpoint: Checkpoint-Dictionary oder Pfad zu einer gespeicherten Checkpoint-Datei
+        """
+        if not isinstance(checkpoint, dict):
+            checkpoint = load_checkpoint(checkpoint)
+
+        reason = self._checkpoint_mismatch(checkpoint)
+        if reason is not None:
+            print(f"⚠️ Checkpoint nicht verwendbar ({reason}) - vollständiger Neulauf")
+            return self.run_backtest()
+
+        with profiler.stage("backtest.run"):
+            self.balance = checkpoint["balance"]
+            self.current_trade = dict(checkpoint["current_trade"]) if checkpoint["current_trade"] else None
+            self.ledger = TradeLedger.from_frame(checkpoint["ledger"])
+            if checkpoint["agent_state"] is not None:
+                self.agent.set_state(checkpoint["agent_state"])
+
+            self._prepare_run()
+            start = checkpoint["completed_steps"]
+            self._run_steps(start, len(self.df_5min))
+            self._completed_steps = len(self.df_5min)
+            profiler.count("backtest.bars", len(self.df_5min) - start)
+
+            with profiler.stage("backtest.metrics"):
+                return self._calculate_metrics()
+
+    def _checkpoint_config(self):
+        """Einstellungen, die für einen fortsetzbaren Lauf übereinstimmen müssen (Agent über get_params)."""
+        agent = self.agent
+        config = {"agent": type(agent).__qualname__, "agent_params": agent.get_params(),
+                  "initial_balance": self.initial_balance, "slippage": self.slippage,
+                  "fee_per_trade": self.fee_per_trade, "exit_resolution": self.exit_resolution}
+        if self.fill_model is not None:
+            config["fill_model"] = self.fill_model.config()
+        return config
+
+    def _fingerprints(self, rows_5min, rows_15min, rows_1min):
+        fingerprints = {"5min": data_fingerprint(self.df_5min, rows_5min),
+                        "15min": data_fingerprint(self.df_15min, rows_15min)}
+        if self.exit_resolution == "1min":
+            fingerprints["1min"] = data_fingerprint(self.df_1min, rows_1min)
+        return fingerprints
+
+    def _checkpoint_mismatch(self, checkpoint):
+        """Grund, warum der Checkpoint nicht zu diesem Backtester passt (None, wenn er verwendbar ist)."""
+        if checkpoint.get("version") != CHECKPOINT_VERSION:
+            return "Version"
+        if not hasattr(self.agent, "get_params"):
+            return "Agent ohne get_params"
+        if checkpoint["config"] != self._checkpoint_config():
+            return "Konfiguration"
+        rows = checkpoint["rows"]
+        if (len(self.df_5min) < rows["5min"] or len(self.df_15min) < rows["15min"]
+                or (self.exit_resolution == "1min" and len(self.df_1min) < rows["1min"])):
+            return "weniger Daten als im Checkpoint"
+        if self._fingerprints(rows["5min"], rows["15min"], rows["1min"]) != checkpoint["fingerprints"]:
+            return "Daten-Präfix geändert"
+        return None
+
+    def run_backtest_parallel(self, num_segments=None, processes=None):
+        """
+        Runs one long history in parallel: the data is split into segments that are simulated independently
+        (each starting flat), then stitched together. Where the sequential run is still in a position at a
+        segment start, it is continued from there until it is flat at a step where the segment was flat too;
+        from that synchronization point on both runs are identical and the segment's trades are adopted.
+        Balances are replayed sequentially, so the result is identical to run_backtest().
+        Requires an agent whose signals depend only on the passed market data (no internal state).
+        """
+        processes = processes or max(1, multiprocessing.cpu_count() - 1)
+        num_segments = num_segments or processes
+        num_bars = len(self.df_5min)
+        bounds = np.linspace(0, num_bars, num_segments + 1).astype(np.int64)
+        ranges = [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+        with profiler.stage("backtest.run"):
+            with profiler.stage("backtest.segments"):
+                with multiprocessing.Pool(processes, initializer=_init_segment_worker, initargs=(self,)) as pool:
+                    segments = pool.map(_run_segment, ranges)
+
+            with profiler.stage("backtest.stitch"):
+                self._prepare_run()
+                for (start, stop), segment in zip(ranges, segments):
+                    if self.current_trade is None:
+                        sync_step = start
+                    else:
+                        # Sequentiell weiterlaufen, bis beide Läufe vor demselben Schritt flat sind
+                        sync_step = self._run_steps(start, stop, sync=segment.is_flat_before)
+                        if sync_step >= stop:
+                            continue
+                    self._adopt_segment(segment, sync_step)
+            self._completed_steps = num_bars
+
+            profiler.count("backtest.bars", num_bars)
+
+            with profiler.stage("backtest.metrics"):
+                return self._calculate_metrics()
+
+    def _adopt_segment(self, segment, sync_step):
+        """
+        Übernimmt die Trades eines Segments ab `sync_step` und bucht sie mit dem laufenden Kontostand neu.
+        Mit fill_model hängt der Impact von der Ordergröße ab: die Preise werden aus den Basispreisen des
+        Segments mit dem laufenden Kontostand neu berechnet (wie im sequentiellen Lauf).
+        """
+        ledger = segment.ledger
+        fills = self._fills
+        for row in np.flatnonzero(ledger["entry_index"] + 1 >= sync_step):
+            signal = TRADE_TYPES[int(ledger["direction"][row])]
+            entry_index, exit_index = ledger["entry_index"][row], ledger["exit_index"][row]
+            if fills is None:
+                self._open_trade(signal, ledger["entry_price"][row], ledger["stop_loss"][row],
+                                 ledger["take_profit"][row], entry_index)
+                self._close_trade(ledger["exit_price"][row], exit_index)
+                continue
+            entry_base, exit_base = segment.fill_bases[row]
+            buying = signal == "BUY CALL"
+            self._open_trade(signal, fills.apply(entry_base, buying, entry_index, self.balance / entry_base),
+                             ledger["stop_loss"][row], ledger["take_profit"][row], entry_index, entry_base)
+            self._close_trade(fills.apply(exit_base, not buying, exit_index, self.current_trade['size']),
+                              exit_index, exit_base)
+        if segment.open_trade is not None:
+            trade = segment.open_trade
+            entry_price = trade['entry_price']
+            if fills is not None:
+                entry_price = fills.apply(trade['entry_base'], trade['type'] == "BUY CALL", trade['entry_index'],
+                                          self.balance / trade['entry_base'])
+            self._open_trade(trade['type'], entry_price, trade['stop_loss'], trade['take_profit'],
+                             trade['entry_index'], trade.get('entry_base'))
+
+    def _prepare_run(self):
+        """Bereitet Arrays, Fenster und Kandidaten-Schritte für `_run_steps` vor."""
+        self._prepare_arrays()
+        if self.labels and self.bar_labels is None:
+            from SliceAnalysis import DIMENSIONS, compute_labels
+
+            dimensions = DIMENSIONS if self.labels is True else self.labels
+            self.bar_labels = compute_labels(self.df_5min, self.df_15min, self._visible_15min, dimensions)
+        self._window_5min, self._window_15min = MarketWindow(self.df_5min), MarketWindow(self.df_15min)
+        lookback = self.agent.get_lookback() if hasattr(self.agent, "get_lookback") else None
+        self._lookback = lookback
+
+        # Kandidaten-Schritte: nur hier kann der Agent ein Signal liefern (None = Agent bei jedem Schritt aufrufen)
+        with profiler.stage("backtest.candidates"):
+            self._candidates = self._candidate_steps(self._window_5min, self._window_15min)
+        self._candidate_list = np.flatnonzero(self._candidates) if self._candidates is not None else None
+
+    def _run_steps(self, start, stop, sync=None):
+        """
+        Verarbeitet die Backtest-Schritte [start, stop). Schritt i entscheidet mit Kerze i-1 als letzter Kerze.
+
+        :param sync: Optionale Funktion step -> bool; ist die Position vor einem Schritt flat und liefert
+                     sync(step) True, wird dort angehalten
+        :return: Schritt, an dem angehalten wurde (stop, falls kein Synchronisationspunkt erreicht wurde)
+        """
+        candidates, candidate_list = self._candidates, self._candidate_list
+        lookback = self._lookback
+        if lookback is not None:
+            # Agent mit fester Historie: Views fester Länge statt wachsender DataFrame-Ausschnitte
+            window_5min, window_15min = self._window_5min, self._window_15min
+            lookback_5min, lookback_15min = lookback.get("5min"), lookback.get("15min")
+
+        i = start
+        while i < stop:
+            if sync is not None and self.current_trade is None and sync(i):
+                return i
 
-            if df_5min_slice.empty or df_15min_slice.empty:
+            if candidates is not None and not candidates[i]:
+                # Ohne Signalmöglichkeit zählen nur Exits: direkt zum nächsten relevanten Schritt springen
+                if self.current_trade is not None:
+                    i = self._next_exit_step(candidates, i)
+                elif sync is None:
+                    i = self._next_candidate_step(candidate_list, i)
+                if i >= stop:
+                    break
+
+            # Anzahl der 15-Min-Kerzen mit Zeitstempel <= aktuellem 5-Min-Zeitstempel
+            visible_15min = self._visible_15min[i]
+            if i == 0 or visible_15min == 0:
+                i += 1
                 continue  # Verhindert Zugriff auf leere DataFrames
 
-            # Erhalte das Trading-Signal
-            signal, stop_loss, take_profit = self.agent.get_signal(df_5min_slice, df_15min_slice)
+            if candidates is not None and not candidates[i]:
+                signal, stop_loss, take_profit = "HOLD", None, None
+            else:
+                with profiler.stage("backtest.slice"):
+                    if lookback is not None:
+                        window_5min.set_bounds(max(0, i - lookback_5min) if lookback_5min else 0, i)
+                        window_15min.set_bounds(max(0, visible_15min - lookback_15min) if lookback_15min else 0,
+                                                visible_15min)
+                        df_5min_slice, df_15min_slice = window_5min, window_15min
+                    else:
+                        df_5min_slice = self.df_5min.iloc[:i]
+                        df_15min_slice = self.df_15min.iloc[:visible_15min]
+
+                # Erhalte das Trading-Signal
+                with profiler.stage("backtest.get_signal"):
+                    signal, stop_loss, take_profit = self.agent.get_signal(df_5min_slice, df_15min_slice)
+                profiler.count("backtest.agent_calls")
 
             if signal not in ["BUY CALL", "BUY PUT", "HOLD"]:
                 raise Exception(f"Ungültiges Signal erhalten: {signal}")
 
             # Prüfe zuerst, ob der aktuelle Trade geschlossen werden muss
             if self.current_trade is not None:
-                self._check_exit_conditions(signal, df_5min_slice.iloc[-1])
+                with profiler.stage("backtest.exit_check"):
+                    self._check_exit_conditions(signal, i - 1)
 
             if self.current_trade is None and signal != "HOLD":
-                self._manage_trade(signal, stop_loss, take_profit, df_5min_slice.iloc[-1])
+                with profiler.stage("backtest.manage_trade"):
+                    self._manage_trade(signal, stop_loss, take_profit, i - 1)
+            i += 1
+
+        return stop
+
+    def _candidate_steps(self, window_5min, window_15min):
+        """
+        Fragt beim Agenten (falls vorhanden) die vektorisierten notwendigen Signalbedingungen ab.
+
+        `agent.get_candidate_mask(df_5min, df_15min, last_15min)` erhält die vollständigen Daten als
+        MarketWindow und je 5-Min-Kerze den Index der zuletzt sichtbaren 15-Min-Kerze (-1 = keine).
+        Sie liefert je 5-Min-Kerze True, wenn eine Entscheidung mit dieser Kerze als letzter Kerze ein Signal
+        ergeben kann. Für alle anderen Schritte wird get_signal nicht aufgerufen und HOLD angenommen; die Maske
+        muss daher eine notwendige Bedingung sein. Rückgabe: boolesches Array je Backtest-Schritt oder None.
+        """
+        if not hasattr(self.agent, "get_candidate_mask"):
+            return None
+
+        num_bars = len(self.df_5min)
+        # Schritt i entscheidet mit Kerze i-1 als letzter Kerze und sieht visible_15min[i] 15-Min-Kerzen
+        last_15min = np.empty(num_bars, dtype=np.int64)
+        last_15min[:-1] = self._visible_15min[1:] - 1
+        last_15min[-1:] = self._visible_15min[-1:] - 1
+        mask = np.asarray(self.agent.get_candidate_mask(window_5min, window_15min, last_15min), dtype=bool)
+
+        candidates = np.zeros(num_bars, dtype=bool)
+        candidates[1:] = mask[:-1]
+        profiler.count("backtest.candidate_steps", int(candidates.sum()))
+        return candidates
+
+    @staticmethod
+    def _next_candidate_step(candidate_steps, step):
+        """Nächster Kandidaten-Schritt >= step (oder np.iinfo(np.int64).max, falls keiner mehr folgt)."""
+        k = np.searchsorted(candidate_steps, step)
+        return candidate_steps[k] if k < len(candidate_steps) else np.iinfo(np.int64).max
+
+    def _next_exit_step(self, candidates, step, chunk=256):
+        """
+        Sucht bei offener Position ab `step` vektorisiert (in wachsenden Blöcken) den nächsten Schritt,
+        an dem Stop-Loss oder Take-Profit berührt wird oder ein Signal (Gegensignal) möglich ist.
+        """
+        trade = self.current_trade
+        num_bars = len(candidates)
+        start = step
+        while start < num_bars:
+            end = min(num_bars, start + chunk)
+            low, high = self._low[start - 1:end - 1], self._high[start - 1:end - 1]
+            if trade['type'] == "BUY CALL":
+                touched = (low <= trade['stop_loss']) | (high >= trade['take_profit'])
+            else:
+                touched = (high >= trade['stop_loss']) | (low <= trade['take_profit'])
+            events = touched | candidates[start:end]
+            if events.any():
+                return start + int(events.argmax())
+            start = end
+            chunk *= 2
+        return num_bars
 
-        return self._calculate_metrics()
+    def _prepare_arrays(self):
+        """Extrahiert einmalig die für Exits benötigten Kerzendaten und die 15-Min-Sichtbarkeit je 5-Min-Kerze."""
+        self._high = self.df_5min['high'].to_numpy(dtype=np.float64)
+        self._low = self.df_5min['low'].to_numpy(dtype=np.float64)
+        self._close = self.df_5min['close'].to_numpy(dtype=np.float64)
+        self._visible_15min = np.searchsorted(self.df_15min.index.asi8, self.df_5min.index.asi8, side="right")
+        # Quotes je Kerze (as-of), einmal je Datensatz; pro Trade nur noch Array-Zugriffe
+        self._fills = self.fill_model.align(self.df_5min, self.slippage) if self.fill_model is not None else None
 
-    def _check_exit_conditions(self, signal, last_candle):
-        """Prüft, ob der aktuelle Trade geschlossen werden muss."""
+    def _prepare_intrabar_index(self):
+        """
+        Berechnet einmalig je 5-Min-Kerze den Bereich [start, end) der zugehörigen 1-Min-Bars,
+        damit die Auflösung eines Exits nur noch einen Array-Ausschnitt betrachtet.
+        """
+        index_5min = self.df_5min.index.asi8
+        index_1min = self.df_1min.index.asi8
+        gaps = np.diff(index_5min)
+        bar_length = gaps[gaps > 0].min() if gaps.size else pd.Timedelta("5min").value
+
+        self._intrabar_start = np.searchsorted(index_1min, index_5min, side="left")
+        self._intrabar_end = np.searchsorted(index_1min, index_5min + bar_length, side="left")
+        self._low_1min = self.df_1min['low'].to_numpy(dtype=np.float64)
+        self._high_1min = self.df_1min['high'].to_numpy(dtype=np.float64)
+
+    def _stop_touched_first(self, bar_index, stop_loss, take_profit, trade_type):
+        """
+        Prüft in den 1-Min-Bars einer 5-Min-Kerze, ob der Stop-Loss vor dem Take-Profit berührt wurde.
+        Werden beide in derselben Minute berührt oder fehlen 1-Min-Daten, gewinnt (konservativ) der Stop.
+        """
+        start, end = self._intrabar_start[bar_index], self._intrabar_end[bar_index]
+        if start == end:
+            return True
+
+        low = self._low_1min[start:end]
+        high = self._high_1min[start:end]
+        if trade_type == "BUY CALL":
+            stop_hits, target_hits = low <= stop_loss, high >= take_profit
+        else:
+            stop_hits, target_hits = high >= stop_loss, low <= take_profit
+
+        first_stop = stop_hits.argmax() if stop_hits.any() else end
+        first_target = target_hits.argmax() if target_hits.any() else end
+        return first_stop <= first_target
+
+    def _check_exit_conditions(self, signal, bar_index):
+        """Prüft, ob der aktuelle Trade an der Kerze `bar_index` geschlossen werden muss."""
         trade_type = self.current_trade['type']
 
         if trade_type not in ["BUY CALL", "BUY PUT"]:
@@ -54,103 +620,197 @@ class Backtester:
         if trade_type == "BUY CALL":
             # Falls ein Trade in PUT Richtung aktiv ist, wird dieser geschlossen
             if signal == "BUY PUT":
-                self._close_trade(last_candle['close'])
+                self._exit_trade(bar_index)
                 return
+            stop_hit = self._low[bar_index] <= self.current_trade['stop_loss']
+            target_hit = self._high[bar_index] >= self.current_trade['take_profit']
+            if stop_hit and target_hit and self.exit_resolution == "1min":
+                with profiler.stage("backtest.intrabar"):
+                    stop_hit = self._stop_touched_first(bar_index, self.current_trade['stop_loss'],
+                                                        self.current_trade['take_profit'], trade_type)
             # Falls der StopLoss getroffen wurde, wird der Trade geschlossen
-            if last_candle['low'] <= self.current_trade['stop_loss']:
-                self._close_trade(self.current_trade['stop_loss'] - self.slippage)
+            if stop_hit:
+                self._exit_trade(bar_index, self.current_trade['stop_loss'])
             # Falls der TakeProfit getroffen wurde, wird der Trade geschlossen
-            elif last_candle['high'] >= self.current_trade['take_profit']:
-                self._close_trade(self.current_trade['take_profit'] - self.slippage)
+            elif target_hit:
+                self._exit_trade(bar_index, self.current_trade['take_profit'])
 
         elif trade_type == "BUY PUT":
             # Falls ein Trade in CALL Richtung aktiv ist, wird dieser geschlossen
             if signal == "BUY CALL":
-                self._close_trade(last_candle['close'])
+                self._exit_trade(bar_index)
                 return
+            stop_hit = self._high[bar_index] >= self.current_trade['stop_loss']
+            target_hit = self._low[bar_index] <= self.current_trade['take_profit']
+            if stop_hit and target_hit and self.exit_resolution == "1min":
+                with profiler.stage("backtest.intrabar"):
+                    stop_hit = self._stop_touched_first(bar_index, self.current_trade['stop_loss'],
+                                                        self.current_trade['take_profit'], trade_type)
             # Falls der StopLoss getroffen wurde, wird der Trade geschlossen
-            if last_candle['high'] >= self.current_trade['stop_loss']:
-                self._close_trade(self.current_trade['stop_loss'] + self.slippage)
+            if stop_hit:
+                self._exit_trade(bar_index, self.current_trade['stop_loss'])
             # Falls der TakeProfit getroffen wurde, wird der Trade geschlossen
-            elif last_candle['low'] <= self.current_trade['take_profit']:
-                self._close_trade(self.current_trade['take_profit'] + self.slippage)
+            elif target_hit:
+                self._exit_trade(bar_index, self.current_trade['take_profit'])
+
+    def _exit_trade(self, bar_index, level=None):
+        """
+        Schließt den aktuellen Trade an der Kerze `bar_index`: zum Markt (Umkehrsignal, level=None) oder an einem
+        Stop-/Target-Level, ungünstiger um die Slippage bzw. mit fill_model um den halben Spread plus Impact.
+        """
+        selling = self.current_trade['type'] == "BUY CALL"
+        fills = self._fills
+        if fills is None:
+            if level is None:
+                self._close_trade(self._close[bar_index], bar_index)
+            else:
+                self._close_trade(level - self.slippage if selling else level + self.slippage, bar_index)
+            return
+        if level is None:
+            if not fills.valid[bar_index]:
+                exit_base = self._close[bar_index]   # ohne Quote wie ohne fill_model: zum Schlusskurs
+            else:
+                exit_base = fills.bid[bar_index] if selling else fills.ask[bar_index]
+        else:
+            exit_base = level - fills.half_spread[bar_index] if selling else level + fills.half_spread[bar_index]
+        self._close_trade(fills.apply(exit_base, not selling, bar_index, self.current_trade['size']), bar_index,
+                          exit_base)
 
-    def _manage_trade(self, signal, stop_loss, take_profit, last_candle):
+    def _manage_trade(self, signal, stop_loss, take_profit, bar_index):
         """Verwaltet Trades und eröffnet neue, falls notwendig."""
-        entry_price = last_candle['close'] + self.slippage if signal == "BUY CALL" else last_candle['close'] - self.slippage
+        if self._fills is not None:
+            # Kauf zum Ask, Leerverkauf zum Bid; Stückzahl für den Impact aus dem Basispreis
+            buying = signal == "BUY CALL"
+            entry_base = self._fills.ask[bar_index] if buying else self._fills.bid[bar_index]
+            entry_price = self._fills.apply(entry_base, buying, bar_index, self.balance / entry_base)
+            self._open_trade(signal, entry_price, stop_loss, take_profit, bar_index, entry_base)
+            return
+        close = self._close[bar_index]
+        entry_price = close + self.slippage if signal == "BUY CALL" else close - self.slippage
+        self._open_trade(signal, entry_price, stop_loss, take_profit, bar_index)
+
+    def _open_trade(self, signal, entry_price, stop_loss, take_profit, bar_index, entry_base=None):
+        """Eröffnet einen Trade mit dem gesamten Kontostand (entry_base: Basispreis vor Impact, mit fill_model)."""
         trade_size = self.balance / entry_price
         trade = {
             'type': signal,
+            'entry_index': bar_index,
             'entry_price': entry_price,
             'stop_loss': stop_loss,
             'take_profit': take_profit,
             'size': trade_size,
             'entry_balance': self.balance
         }
+        if entry_base is not None:
+            trade['entry_base'] = entry_base
         self.current_trade = trade
         self.balance = 0
 
-    def _close_trade(self, exit_price):
-        """Schließt den aktuellen Trade mit dem gegebenen Exit-Preis und speichert das Ergebnis."""
-        profit = (exit_price - self.current_trade['entry_price']) * self.current_trade['size']
-        if self.current_trade['type'] == "BUY PUT":
+    def _close_trade(self, exit_price, bar_index, exit_base=None):
+        """Schließt den aktuellen Trade mit dem gegebenen Exit-Preis und speichert das Ergebnis im Trade-Journal."""
+        trade = self.current_trade
+        if exit_base is not None:
+            self._fill_bases.append((trade['entry_base'], exit_base))
+        profit = (exit_price - trade['entry_price']) * trade['size']
+        if trade['type'] == "BUY PUT":
             profit *= -1
 
-        profit -= self.current_trade['entry_balance'] * self.fee_per_trade
-        self.balance = self.current_trade['entry_balance'] + profit
-
-        self.current_trade['exit_price'] = exit_price
-        self.current_trade['exit_balance'] = self.balance
-        self.current_trade['closed'] = True
+        profit -= trade['entry_balance'] * self.fee_per_trade
+        self.balance = trade['entry_balance'] + profit
 
-        self.trades.append(self.current_trade)
+        self.ledger.append(TRADE_DIRECTIONS[trade['type']], trade['entry_index'], bar_index, trade['entry_price'],
+                           exit_price, trade['stop_loss'], trade['take_profit'], trade['size'],
+                           trade['entry_balance'], self.balance)
         self.current_trade = None
 
-    def _calculate_max_drawdown(self):
-        """Berechnet den maximalen Drawdown basierend auf exit_balance-Werten."""
-        if not self.trades:
-            return 0  # Kein Drawdown, falls keine Trades existieren
+    def trade_labels(self):
+        """Labels der Einstiegskerze je Trade als DataFrame (Kategorien, eine Spalte je Dimension)."""
+        if self.bar_labels is None:
+            raise ValueError("Labels nur mit Backtester(..., labels=True) nach einem Lauf verfügbar")
+        entry_index = self.ledger["entry_index"]
+        return pd.DataFrame({name: pd.Categorical.from_codes(codes[entry_index], categories)
+                             for name, (codes, categories) in self.bar_labels.items()})
 
-        # Liste aller Kapitalstände nach jedem Trade
-        balances = [self.initial_balance] + [t['exit_balance'] for t in self.trades if 'exit_balance' in t]
-        balances = np.array(balances)
+    def slice_metrics(self):
+        """Kennzahlen je Dimension und Kategorie (siehe SliceAnalysis.slice_metrics)."""
+        from SliceAnalysis import slice_metrics
 
-        # Höchstes Kapital bis zu jedem Zeitpunkt (laufendes Maximum)
-        running_max = np.maximum.accumulate(balances)
+        if self.bar_labels is None or self.equity_curve is None:
+            raise ValueError("Labels nur mit Backtester(..., labels=True) nach einem Lauf verfügbar")
+        return slice_metrics(self.ledger, self.equity_curve, self.in_position, self.bar_labels, self.initial_balance)
 
-        # Drawdowns berechnen: Wie weit fällt das Kapital vom höchsten Stand?
-        drawdowns = (running_max - balances) / running_max
+    def _render_chart(self):
+        from visualization import render_backtest
 
-        # Maximalen Drawdown als Prozentwert zurückgeben
-        max_drawdown = round(np.max(drawdowns) * 100, 2) if drawdowns.size > 0 else 0
+        path = self.visualize if isinstance(self.visualize, str) else "backtest_chart.html"
+        render_backtest(self, path, df_1min=self.df_1min)
+        print(f"🖼️ Chart gespeichert: {path}")
 
-        return max_drawdown
+    def _calculate_max_drawdown(self):
+        """Berechnet den maximalen Drawdown auf Basis der Mark-to-Market-Kapitalkurve je Kerze."""
+        if self.equity_curve is None or len(self.equity_curve) == 0:
+            return 0
+        return calculate_max_drawdown(self.equity_curve, self.initial_balance)
 
     def _calculate_metrics(self):
-        """Berechnet Performance-Kennzahlen."""
-        total_trades = len(self.trades)
-        win_trades = sum(1 for t in self.trades if 'exit_price' in t and
-                         ((t['type'] == "BUY CALL" and t['exit_price'] > t['entry_price']) or
-                          (t['type'] == "BUY PUT" and t['exit_price'] < t['entry_price'])))
+        """Berechnet Performance-Kennzahlen vektorisiert aus Trade-Journal und Kapitalkurve."""
+        self.equity_curve, self.in_position = build_equity_curve(self.ledger, self._close, self.initial_balance,
+                                                                 self.current_trade)
 
-        win_rate = round((win_trades / total_trades) * 100, 2) if total_trades > 0 else 0
+        # Offene Positionen werden zum letzten Schlusskurs bewertet
+        final_balance = self.equity_curve[-1] if len(self.equity_curve) else self.balance
+        exposure = round(float(self.in_position.mean()) * 100, 2) if len(self.in_position) else 0
+        trade_metrics = calculate_trade_metrics(self.ledger)
+        if self.visualize:
+            self._render_chart()
 
-        # Sharpe Ratio berechnen
-        returns = [(t['exit_price'] / t['entry_price'] - 1) if t['type'] == "BUY CALL"
-            else (t['entry_price'] / t['exit_price'] - 1) for t in self.trades if 'exit_price' in t]
+        return {
+            "Final Balance": round(float(final_balance), 2),
+            "Total Trades": trade_metrics["Total Trades"],
+            "Win Rate (%)": trade_metrics["Win Rate (%)"],
+            "Sharpe Ratio": trade_metrics["Sharpe Ratio"],
+            "Max Drawdown": self._calculate_max_drawdown(),
+            "Exposure (%)": exposure,
+            "Profit Factor": trade_metrics["Profit Factor"]
+        }
 
-        if len(returns) > 1 and np.std(returns) > 0:
-            sharpe_ratio = round(np.mean(returns) / np.std(returns) * np.sqrt(252), 2)
-        else:
-            sharpe_ratio = 0
 
-        # Max Drawdown berechnen
-        max_drawdown = self._calculate_max_drawdown()
+class _SegmentResult:
+    def __init__(self, ledger, open_trade, fill_bases):
+        """Ergebnis eines unabhängig (ab flacher Position) simulierten Segments."""
+        self.ledger = ledger
+        self.open_trade = open_trade
+        self.fill_bases = fill_bases
+        # Positionsintervalle in Schritten: offen vor Schritt s, wenn entry_step < s <= exit_step
+        self._entry_steps = ledger["entry_index"] + 1
+        self._exit_steps = ledger["exit_index"] + 1
+        if open_trade is not None:
+            self._entry_steps = np.append(self._entry_steps, open_trade['entry_index'] + 1)
+            self._exit_steps = np.append(self._exit_steps, np.iinfo(np.int64).max)
 
-        return {
-            "Final Balance": round(self.balance, 2),
-            "Total Trades": total_trades,
-            "Win Rate (%)": win_rate,
-            "Sharpe Ratio": sharpe_ratio,
-            "Max Drawdown": max_drawdown
-        }
+    def is_flat_before(self, step):
+        """True, wenn das Segment vor dem Schritt `step` keine Position hält."""
+        trade = np.searchsorted(self._entry_steps, step, side="left") - 1
+        return trade < 0 or self._exit_steps[trade] < step
+
+
+_segment_backtester = None
+
+
+def _init_segment_worker(backtester):
+    """Initialisiert einen Worker-Prozess einmalig mit Daten und Agent."""
+    global _segment_backtester
+    _segment_backtester = backtester
+    backtester._prepare_run()
+
+
+def _run_segment(segment_range):
+    """Simuliert ein Segment ab flacher Position (Kontostände werden später im Hauptprozess neu gebucht)."""
+    start, stop = segment_range
+    backtester = _segment_backtester
+    backtester.balance = backtester.initial_balance
+    backtester.ledger = TradeLedger()
+    backtester.current_trade = None
+    backtester._fill_bases = []
+    backtester._run_steps(start, stop)
+    return _SegmentResult(backtester.ledger, backtester.current_trade, backtester._fill_bases)
@@ -0,0 +1,347 @@
+import argparse
+import csv
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from MarketDataFetcher import MarketDataFetcher
+from backtester import Backtester
+from PortfolioBacktester import PortfolioBacktester
+from profiling import profiler, export_profile
+from RuleAgent import RuleAgent, breakout_rules
+from storage import load_frame
+
+# Größen-Presets in Handelstagen (Wochen bis Jahrzehnte)
+SIZE_PRESETS = {
+    "weeks": 10,
+    "month": 21,
+    "quarter": 63,
+    "year": 252,
+    "decade": 2520,
+}
+
+BENCHMARK_DATA_DIR = "benchmark_data"
+BENCHMARK_RESULTS_FILE = "benchmark_results.csv"
+RESULT_COLUMNS = ["timestamp", "commit", "scenario", "symbols", "days", "bars", "seconds",
+                  "bars_per_sec", "trades", "configs_per_sec", "peak_memory_mb"]
+
+# Parameter-Sets für das Optimizer-Szenario (Werte aus dem param_grid des ParameterOptimizer; als Breakout-Regeln
+# des benchmark_agent, da der MomentumBreakoutAgent mit der aktuellen Kerze in der Range nie handelt)
+BENCHMARK_CONFIGS = [
+    {"breakout_window": 10, "atr_multiplier_sl": 2.0, "atr_multiplier_tp": 4.0, "min_candle_body_ratio": 0.3,
+     "min_adx_15m": 10, "min_atr_threshold": 0.05},
+    {"breakout_window": 20, "atr_multiplier_sl": 2.5, "atr_multiplier_tp": 3.0, "min_candle_body_ratio": 0.5,
+     "min_adx_15m": 20, "min_atr_threshold": 0.1},
+    {"breakout_window": 30, "atr_multiplier_sl": 3.0, "atr_multiplier_tp": 5, "min_candle_body_ratio": 0.7,
+     "min_adx_15m": 10, "min_atr_threshold": 0.2},
+    {"breakout_window": 50, "atr_multiplier_sl": 2.0, "atr_multiplier_tp": 2.5, "min_candle_body_ratio": 0.3,
+     "min_adx_15m": 20, "min_atr_threshold": 0.05},
+]
+
+
+def generate_synthetic_1min(days, seed=0, start="2015-01-02", start_price=100.0):
+    """
+    Erzeugt deterministische 1-Minuten-OHLCV-Daten (Regular Trading Hours, 390 Bars pro Handelstag)
+    im Format der IBKR-Rohdaten (inkl. 'average' und 'barCount').
+
+    :param days: Anzahl Handelstage
+    :param seed: Seed für den Zufallsgenerator (gleicher Seed -> identische Daten)
+    :param start: Erster Handelstag
+    :param start_price: Startkurs
+    :return: DataFrame mit DatetimeIndex 'date' (US/Eastern)
+    """
+    rng = np.random.default_rng(seed)
+    trading_days = pd.bdate_range(start=start, periods=days)
+    minutes = pd.timedelta_range(start="9h30min", periods=390, freq="1min")
+    index = (trading_days.values[:, None] + minutes.values[None, :]).ravel()
+    index = pd.DatetimeIndex(index).tz_localize("US/Eastern")
+    n = len(index)
+
+    # Volatilitäts-Regime (langsamer AR-Prozess) und Trendphasen, damit ATR/ADX realistisch schwanken
+    regime = np.empty(n)
+    shocks = rng.normal(0, 0.02, n)
+    regime[0] = 0.0
+    for i in range(1, n):
+        regime[i] = 0.999 * regime[i - 1] + shocks[i]
+    volatility = 0.0006 * np.exp(regime)
+    trend = np.repeat(rng.normal(0, 0.00004, n // 390 + 1), 390)[:n]
+
+    returns = trend + volatility * rng.standard_normal(n)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.empty(n)
+    open_[0] = start_price
+    open_[1:] = close[:-1] * (1 + volatility[1:] * 0.1 * rng.standard_normal(n - 1))
+    wick = np.abs(rng.normal(0, 1, (2, n))) * volatility * close * 0.5
+    high = np.maximum(open_, close) + wick[0]
+    low = np.minimum(open_, close) - wick[1]
+
+    # U-förmiges Intraday-Volumenprofil
+    minute_of_day = np.tile(np.arange(390), n // 390 + 1)[:n]
+    profile = 1.0 + 2.0 * ((minute_of_day - 195) / 195.0) ** 2
+    volume = np.round(rng.lognormal(8.0, 0.5, n) * profile)
+
+    df = pd.DataFrame({
+        "open": np.round(open_, 2),
+        "high": np.round(high, 2),
+        "low": np.round(low, 2),
+        "close": np.round(close, 2),
+        "volume": volume,
+        "average": np.round((high + low + close) / 3, 2),
+        "barCount": np.maximum(1, volume // 50).astype(np.int64),
+    }, index=index)
+    df.index.name = "date"
+    return df
+
+
+def generate_dataset(days, num_symbols=1, seed=0, data_dir=BENCHMARK_DATA_DIR, train_ratio=0.8):
+    """
+    Schreibt synthetische Datensätze im 'saved_data'-Schema (SYM_train_5min.parquet, ...) für 1 bis N Symbole.
+    Bereits erzeugte Datensätze werden wiederverwendet, da die Daten deterministisch sind.
+
+    :return: Liste der Verzeichnisse je Symbol
+    """
+    directories = []
+    for s in range(num_symbols):
+        symbol = f"SYN{s}"
+        directory = os.path.join(data_dir, f"{days}d_seed{seed}")
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(os.path.join(directory, f"{symbol}_test_15min.parquet")):
+            df_1min = generate_synthetic_1min(days, seed=seed + s, start_price=100.0 + 50 * s)
+            MarketDataFetcher(symbol, days, train_ratio, save_dir=directory).process_data(df_1min)
+        directories.append(directory)
+    return directories
+
+
+def load_dataset(directory, symbol="SYN0", split="train"):
+    """Lädt 1-, 5- und 15-Minuten-Daten eines generierten Datensatzes."""
+    return tuple(load_frame(os.path.join(directory, f"{symbol}_{split}_{tf}.parquet"))
+                 for tf in ("1min", "5min", "15min"))
+
+
+def benchmark_agent(**params):
+    """
+    Agent der Szenarien: Breakout-Regeln des MomentumBreakoutAgent, Range ohne die aktuelle Kerze. Nur so entstehen
+    Trades und Trade-Verwaltung, Journal, 1-Minuten-Exits und Zusammenführung werden mitgemessen.
+    """
+    return RuleAgent(**breakout_rules(exclude_current=True, **params))
+
+
+# 📌 Szenarien: jede Funktion liefert (Anzahl verarbeiteter Bars, Anzahl Konfigurationen, Anzahl Trades bzw. Signale)
+def scenario_indicators(data):
+    df_1min = data["df_1min"][["open", "high", "low", "close", "volume"]].copy()
+    MarketDataFetcher("SYN0", data["days"], 0.8)._calculate_indicators(df_1min)
+    return len(df_1min), 0, 0
+
+
+def scenario_get_signal(data, calls=500):
+    df_5min, df_15min = data["df_5min"], data["df_15min"]
+    agent = benchmark_agent()
+    positions = np.linspace(1, len(df_5min) - 1, min(calls, len(df_5min) - 1)).astype(int)
+    signals = 0
+    for i in positions:
+        current_time = df_5min.index[i]
+        signal, _, _ = agent.get_signal(df_5min.iloc[:i], df_15min[df_15min.index <= current_time])
+        signals += signal != "HOLD"
+    return len(positions), 0, signals
+
+
+def scenario_backtest(data):
+    backtester = Backtester(benchmark_agent(), data["df_5min"], data["df_15min"])
+    backtester.run_backtest()
+    return len(data["df_5min"]), 0, len(backtester.ledger)
+
+
+def scenario_backtest_intrabar(data):
+    backtester = Backtester(benchmark_agent(), data["df_5min"], data["df_15min"], df_1min=data["df_1min"],
+                            exit_resolution="1min")
+    backtester.run_backtest()
+    return len(data["df_5min"]), 0, len(backtester.ledger)
+
+
+def scenario_backtest_parallel(data):
+    backtester = Backtester(benchmark_agent(), data["df_5min"], data["df_15min"])
+    backtester.run_backtest_parallel()
+    return len(data["df_5min"]), 0, len(backtester.ledger)
+
+
+def scenario_portfolio(data, num_symbols=20):
+    # Universum aus Kopien desselben Symbols: misst die Skalierung des Portfolio-Durchlaufs mit der Symbolanzahl
+    universe = {f"SYN{s}": (data["df_5min"], data["df_15min"]) for s in range(num_symbols)}
+    backtester = PortfolioBacktester(benchmark_agent(), universe, max_positions=5)
+    backtester.run_backtest()
+    return num_symbols * len(data["df_5min"]), 0, len(backtester.ledger)
+
+
+def scenario_optimizer(data):
+    trades = 0
+    for params in BENCHMARK_CONFIGS:
+        backtester = Backtester(benchmark_agent(**params), data["df_5min"], data["df_15min"])
+        backtester.run_backtest()
+        trades += len(backtester.ledger)
+    return len(data["df_5min"]) * len(BENCHMARK_CONFIGS), len(BENCHMARK_CONFIGS), trades
+
+
+SCENARIOS = {
+    "indicators": scenario_indicators,
+    "get_signal": scenario_get_signal,
+    "backtest": scenario_backtest,
+    "backtest_intrabar": scenario_backtest_intrabar,
+    "backtest_parallel": scenario_backtest_parallel,
+    "portfolio": scenario_portfolio,
+    "optimizer": scenario_optimizer,
+}
+
+
+def startup_commands(directory, symbol="SYN0"):
+    """Kaltstart-Messungen: Kommandozeilen von main.py (offline, gegen den generierten Datensatz)."""
+    data = [f"--data-5min={os.path.join(directory, f'{symbol}_train_5min.parquet')}",
+            f"--data-15min={os.path.join(directory, f'{symbol}_train_15min.parquet')}"]
+    return {
+        "startup_help": ["--help"],
+        "startup_validate": ["validate", f"--data-dir={directory}"],
+        "startup_backtest": ["backtest", *data],
+    }
+
+
+def measure_startup(name, arguments, repeat=1):
+    """Misst die Laufzeit von `python main.py ...` als eigener Prozess (bester von `repeat` Läufen)."""
+    main_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, main_script, *arguments], check=True, stdout=subprocess.DEVNULL)
+        best = min(best, time.perf_counter() - start)
+    return {"scenario": name, "bars": 0, "seconds": round(best, 4), "bars_per_sec": 0, "trades": 0,
+            "configs_per_sec": 0, "peak_memory_mb": 0}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_scenario(name, data, repeat=1):
+    """
+    Führt ein Szenario `repeat`-mal zeitgemessen aus (bester Lauf zählt) und misst den Spitzenspeicher
+    in einem zusätzlichen Lauf mit tracemalloc, damit die Zeitmessung nicht verfälscht wird.
+    """
+    func = SCENARIOS[name]
+    best = float("inf")
+    bars = configs = trades = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        bars, configs, trades = func(data)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "scenario": name,
+        "bars": bars,
+        "seconds": round(best, 4),
+        "bars_per_sec": round(bars / best, 1) if best > 0 else 0,
+        "trades": int(trades),
+        "configs_per_sec": round(configs / best, 3) if best > 0 and configs else 0,
+        "peak_memory_mb": round(peak / 1024 ** 2, 2),
+    }
+
+
+def save_results(results, path=BENCHMARK_RESULTS_FILE):
+    """Hängt Ergebnisse an die Ergebnisdatei an, damit Läufe über die Zeit vergleichbar bleiben."""
+    if os.path.exists(path):
+        existing = pd.read_csv(path)
+        if list(existing.columns) != RESULT_COLUMNS:
+            existing.reindex(columns=RESULT_COLUMNS).to_csv(path, index=False)  # ältere Läufe ohne neue Spalten
+    write_header = not os.path.exists(path)
+    with open(path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        if write_header:
+            writer.writeheader()
+        writer.writerows(results)
+
+
+def compare_results(path=BENCHMARK_RESULTS_FILE):
+    """Vergleicht je Szenario und Datensatzgröße den letzten Lauf mit dem vorherigen."""
+    df = pd.read_csv(path)
+    for (scenario, days, symbols), group in df.groupby(["scenario", "days", "symbols"]):
+        if len(group) < 2:
+            continue
+        previous, latest = group.iloc[-2], group.iloc[-1]
+        if scenario.startswith("startup_"):
+            change = (latest["seconds"] / previous["seconds"] - 1) * 100 if previous["seconds"] else 0
+            print(f"📊 {scenario}: {previous['seconds']:.3f}s -> {latest['seconds']:.3f}s ({change:+.1f}%) "
+                  f"[{previous['commit']} -> {latest['commit']}]")
+            continue
+        change = (latest["bars_per_sec"] / previous["bars_per_sec"] - 1) * 100 if previous["bars_per_sec"] else 0
+        print(f"📊 {scenario} ({days}d, {symbols} Symbol(e)): {previous['bars_per_sec']:.0f} -> "
+              f"{latest['bars_per_sec']:.0f} Bars/s ({change:+.1f}%), Trades {previous['trades']:.0f} -> "
+              f"{latest['trades']:.0f} [{previous['commit']} -> {latest['commit']}]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline-Benchmarks für Backtester, Agent, Indikatoren und Optimizer")
+    parser.add_argument("--size", choices=SIZE_PRESETS.keys(), default="weeks", help="Datensatzgröße (Preset)")
+    parser.add_argument("--days", type=int, help="Anzahl Handelstage (überschreibt --size)")
+    parser.add_argument("--symbols", type=int, default=1, help="Anzahl synthetischer Symbole")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Anzahl zeitgemessener Wiederholungen je Szenario")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS.keys(), default=list(SCENARIOS))
+    parser.add_argument("--output", default=BENCHMARK_RESULTS_FILE)
+    parser.add_argument("--compare", action="store_true", help="Nur gespeicherte Läufe vergleichen")
+    parser.add_argument("--profile", action="store_true", help="Stufen-Profil nach benchmark_profile.json schreiben")
+    parser.add_argument("--startup", action="store_true",
+                        help="Zusätzlich Kaltstartzeiten der Offline-Befehle von main.py messen")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(args.output)
+        return
+
+    if args.profile:
+        profiler.enable()
+
+    days = args.days or SIZE_PRESETS[args.size]
+    print(f"🔄 Erzeuge synthetische Daten: {days} Handelstage, {args.symbols} Symbol(e)...")
+    directories = generate_dataset(days, args.symbols, args.seed)
+
+    timestamp = datetime.now().isoformat(timespec="seconds")
+    commit = _git_commit()
+    results = []
+    for s, directory in enumerate(directories):
+        df_1min, df_5min, df_15min = load_dataset(directory, symbol=f"SYN{s}")
+        data = {"days": days, "df_1min": df_1min, "df_5min": df_5min, "df_15min": df_15min}
+        for name in args.scenarios:
+            result = run_scenario(name, data, args.repeat)
+            print(f"⏱️ SYN{s} {name}: {result['seconds']:.3f}s - {result['bars_per_sec']:.0f} Bars/s - "
+                  f"{result['trades']} Trades - {result['configs_per_sec']} Configs/s - "
+                  f"Peak {result['peak_memory_mb']} MB")
+            results.append({"timestamp": timestamp, "commit": commit, "symbols": args.symbols, "days": days,
+                            **result})
+
+    if args.startup:
+        for name, arguments in startup_commands(directories[0]).items():
+            result = measure_startup(name, arguments, args.repeat)
+            print(f"⏱️ {name}: {result['seconds']:.3f}s")
+            results.append({"timestamp": timestamp, "commit": commit, "symbols": args.symbols, "days": days,
+                            **result})
+
+    save_results(results, args.output)
+    if args.profile:
+        export_profile("benchmark_profile.json", profiler.snapshot())
+    print(f"✅ Benchmark abgeschlossen! Ergebnisse gespeichert: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+
+# 📌 Latenzmessung im Live-Pfad: je Stufe und Symbol ein Histogramm mit fester Speichergröße (HDR-artige
+# log-lineare Buckets) in einem Ringpuffer von Zeitfenstern, Verzögerungszähler und Alarme bei Schwellwerten.
+# Stufen einer Entscheidung (jeweils Dauer seit der vorherigen Stufe, "total" seit Kerzenschluss) sowie die
+# Rundlaufzeiten der Orders aus dem OrderManager:
+STAGES = ("received", "indicators", "signal", "order", "total", "order_ack", "order_fill")
+
+# Log-lineare Buckets: 2^SUB_BITS Unterteilungen je Zweierpotenz (relativer Fehler < 2^-(SUB_BITS-1) = 6.25 %)
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS
+HALF_COUNT = SUB_COUNT >> 1
+MAX_BITS = 41  # Werte bis 2^41 ns (ca. 36 Minuten), größere landen im letzten Bucket
+NUM_BUCKETS = (MAX_BITS - SUB_BITS + 1) * HALF_COUNT + HALF_COUNT
+
+
+def bucket_index(nanoseconds):
+    if nanoseconds < SUB_COUNT:
+        return nanoseconds if nanoseconds > 0 else 0
+    shift = nanoseconds.bit_length() - SUB_BITS
+    index = (shift << (SUB_BITS - 1)) + (nanoseconds >> shift)
+    return index if index < NUM_BUCKETS else NUM_BUCKETS - 1
+
+
+def bucket_upper_bound(index):
+    """Größter Wert (ns), der in den Bucket `index` fällt."""
+    if index < SUB_COUNT:
+        return index
+    shift = (index >> (SUB_BITS - 1)) - 1
+    return (((index & (HALF_COUNT - 1)) + HALF_COUNT + 1) << shift) - 1
+
+
+class _Window:
+    __slots__ = ("epoch", "counts", "count", "total", "max")
+
+    def __init__(self):
+        self.epoch = -1
+        self.counts = [0] * NUM_BUCKETS
+        self.count = self.total = self.max = 0
+
+    def reset(self, epoch):
+        self.epoch = epoch
+        counts = self.counts
+        for i in range(NUM_BUCKETS):
+            counts[i] = 0
+        self.count = self.total = self.max = 0
+
+
+class RollingHistogram:
+    __slots__ = ("windows", "interval_ns")
+
+    def __init__(self, slots, interval_ns):
+        """Ringpuffer aus `slots` Histogrammen je `interval_ns`; das älteste Fenster wird wiederverwendet."""
+        self.windows = [_Window() for _ in range(slots)]
+        self.interval_ns = interval_ns
+
+    def record(self, nanoseconds, now_ns):
+        epoch = now_ns // self.interval_ns
+        window = self.windows[epoch % len(self.windows)]
+        if window.epoch != epoch:
+            window.reset(epoch)
+        # bucket_index inline (Hot Path)
+        if nanoseconds < SUB_COUNT:
+            index = nanoseconds
+        else:
+            shift = nanoseconds.bit_length() - SUB_BITS
+            index = (shift << (SUB_BITS - 1)) + (nanoseconds >> shift)
+            if index >= NUM_BUCKETS:
+                index = NUM_BUCKETS - 1
+        window.counts[index] += 1
+        window.count += 1
+        window.total += nanoseconds
+        if nanoseconds > window.max:
+            window.max = nanoseconds
+
+    def merged(self, now_ns):
+        """Summe der Fenster der letzten `slots` Intervalle: (Bucket-Zähler, Anzahl, Summe, Maximum)."""
+        epoch = now_ns // self.interval_ns
+        counts = [0] * NUM_BUCKETS
+        count = total = maximum = 0
+        for window in self.windows:
+            if epoch - len(self.windows) < window.epoch <= epoch and window.count:
+                counts = [a + b for a, b in zip(counts, window.counts)]
+                count += window.count
+                total += window.total
+                maximum = max(maximum, window.max)
+        return counts, count, total, maximum
+
+
+def percentiles(counts, count, quantiles=(0.5, 0.9, 0.99)):
+    """Perzentile (ns, obere Bucket-Grenze) aus Bucket-Zählern."""
+    targets = [max(1, int(q * count + 0.5)) for q in quantiles]
+    results = []
+    cumulative = 0
+    index = 0
+    for target in targets:
+        while index < NUM_BUCKETS and cumulative + counts[index] < target:
+            cumulative += counts[index]
+            index += 1
+        results.append(bucket_upper_bound(min(index, NUM_BUCKETS - 1)))
+    return results
+
+
+class DecisionTrace:
+    __slots__ = ("monitor", "symbol", "bar_close_ns", "last_ns")
+
+    def __init__(self, monitor, symbol, bar_close_ns):
+        self.monitor = monitor
+        self.symbol = symbol
+        self.bar_close_ns = bar_close_ns
+        self.last_ns = bar_close_ns
+
+    def mark(self, stage):
+        """Verbucht die Dauer seit der vorherigen Stufe (bzw. seit Kerzenschluss) für `stage`."""
+        now = time.time_ns()
+        self.monitor.record(stage, self.symbol, now - self.last_ns, now)
+        self.last_ns = now
+
+    def finish(self):
+        """Schließt die Entscheidung ab: Gesamtverzögerung seit Kerzenschluss und Verzögerungszähler."""
+        now = time.time_ns()
+        self.monitor.record("total", self.symbol, now - self.bar_close_ns, now)
+        return now - self.bar_close_ns
+
+
+class LatencyMonitor:
+    def __init__(self, window=60.0, slots=6, lag_threshold_ms=1000.0):
+        """
+        Instrumentierung des Live-Pfads (Kerzenschluss -> Kerze empfangen -> Indikatoren -> get_signal -> Order).
+
+        Je (Stufe, Symbol) ein RollingHistogram mit `slots` Fenstern über insgesamt `window` Sekunden, Speicher
+        fest je Paar. Verbuchen kostet wenige Mikrosekunden (ein Lock, eine Bucket-Berechnung).
+
+        :param lag_threshold_ms: Entscheidungen mit höherer Gesamtverzögerung zählen als verspätet
+        """
+        self.interval_ns = int(window / slots * 1e9)
+        self.slots = slots
+        self.lag_threshold_ns = int(lag_threshold_ms * 1e6)
+        self.histograms = {}
+        self.lag = {}       # Symbol -> [Entscheidungen, verspätet, maximale Verzögerung ns]
+        self.alarms = {}    # Stufe -> Liste von Alarmen
+        self._lock = threading.Lock()
+
+    def trace(self, symbol, bar_close_ns):
+        """
+        Beginnt die Messung einer Entscheidung ab Kerzenschluss (Unix-Zeit in ns, Start der Kerze + Kerzenlänge).
+        Danach je Stufe `mark(stage)` aufrufen und zum Schluss `finish()`.
+        """
+        return DecisionTrace(self, symbol, bar_close_ns)
+
+    def record(self, stage, symbol, nanoseconds, now_ns=None):
+        """Verbucht eine Dauer (ns) für Stufe und Symbol."""
+        if now_ns is None:
+            now_ns = time.time_ns()
+        nanoseconds = nanoseconds if nanoseconds > 0 else 0
+        key = (stage, symbol)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = RollingHistogram(self.slots, self.interval_ns)
+            histogram.record(nanoseconds, now_ns)
+            if stage == "total":
+                lag = self.lag.get(symbol)
+                if lag is None:
+                    lag = self.lag[symbol] = [0, 0, 0]
+                lag[0] += 1
+                if nanoseconds > self.lag_threshold_ns:
+                    lag[1] += 1
+                if nanoseconds > lag[2]:
+                    lag[2] = nanoseconds
+        alarms = self.alarms.get(stage)
+        if alarms:
+            for alarm in alarms:
+                if nanoseconds > alarm.threshold_ns:
+                    alarm.trigger(stage, symbol, nanoseconds, now_ns)
+
+    def add_alarm(self, stage, threshold_ms, callback, cooldown=10.0):
+        """
+        Ruft callback(stage, symbol, milliseconds) auf, wenn eine Dauer der Stufe den Schwellwert überschreitet
+        (je Symbol höchstens einmal pro `cooldown` Sekunden).
+        """
+        alarm = _Alarm(threshold_ms, callback, cooldown)
+        self.alarms.setdefault(stage, []).append(alarm)
+        return alarm
+
+    def snapshot(self):
+        """Perzentile je Stufe und Symbol (ms) über das aktuelle Zeitfenster, Verzögerungszähler und Alarme."""
+        now = time.time_ns()
+        with self._lock:
+            merged = {key: histogram.merged(now) for key, histogram in self.histograms.items()}
+            lag = {symbol: list(values) for symbol, values in self.lag.items()}
+        stages = {}
+        for (stage, symbol), (counts, count, total, maximum) in merged.items():
+            if not count:
+                continue
+            p50, p90, p99 = (min(value, maximum) for value in percentiles(counts, count))
+            stages.setdefault(stage, {})[symbol] = {
+                "count": count, "mean_ms": round(total / count / 1e6, 3), "p50_ms": round(p50 / 1e6, 3),
+                "p90_ms": round(p90 / 1e6, 3), "p99_ms": round(p99 / 1e6, 3), "max_ms": round(maximum / 1e6, 3)}
+        return {
+            "time": now / 1e9,
+            "pid": os.getpid(),
+            "stages": stages,
+            "lag": {symbol: {"decisions": n, "late": late, "max_ms": round(maximum / 1e6, 3)}
+                    for symbol, (n, late, maximum) in lag.items()},
+            "alarms": {stage: sum(alarm.fired for alarm in alarms) for stage, alarms in self.alarms.items()},
+        }
+
+
+class _Alarm:
+    __slots__ = ("threshold_ns", "callback", "cooldown_ns", "last_fired", "fired")
+
+    def __init__(self, threshold_ms, callback, cooldown):
+        self.threshold_ns = int(threshold_ms * 1e6)
+        self.callback = callback
+        self.cooldown_ns = int(cooldown * 1e9)
+        self.last_fired = {}
+        self.fired = 0
+
+    def trigger(self, stage, symbol, nanoseconds, now_ns):
+        last = self.last_fired.get(symbol)
+        if last is not None and now_ns - last < self.cooldown_ns:
+            return
+        self.last_fired[symbol] = now_ns
+        self.fired += 1
+        self.callback(stage, symbol, nanoseconds / 1e6)
+
+
+class SnapshotExporter:
+    def __init__(self, monitor, target, interval=10.0):
+        """
+        Schreibt periodisch Snapshots des Monitors als JSON-Zeilen in einem Hintergrund-Thread.
+
+        :param target: Dateipfad (wird fortgeschrieben), "udp://host:port" oder "unix:///pfad" (Datagramm-Socket)
+        """
+        self.monitor = monitor
+        self.target = target
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.export()  # letzter Stand
+
+    def export(self):
+        data = json.dumps(self.monitor.snapshot())
+        if self.target.startswith("udp://"):
+            host, _, port = self.target[len("udp://"):].rpartition(":")
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.sendto(data.encode(), (host, int(port)))
+        elif self.target.startswith("unix://"):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.sendto(data.encode(), self.target[len("unix://"):])
+        else:
+            with open(self.target, "a") as f:
+                f.write(data + "\n")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"⚠️ Latenz-Snapshot nicht exportiert: {e}")
+
+
+def print_snapshot(snapshot):
+    for stage, symbols in snapshot["stages"].items():
+        for symbol, s in symbols.items():
+            print(f"   ⏱️ {stage:<11} {symbol:<6} n={s['count']:<7} p50 {s['p50_ms']:>9.3f} ms  "
+                  f"p99 {s['p99_ms']:>9.3f} ms  max {s['max_ms']:>9.3f} ms")
+    for symbol, lag in snapshot["lag"].items():
+        print(f"   🐢 {symbol:<6} {lag['late']} von {lag['decisions']} Entscheidungen verspätet "
+              f"(max {lag['max_ms']:.3f} ms)")
+
+
+def benchmark(iterations=200000, symbols=("SPY", "QQQ", "IWM")):
+    """Kosten je Verbuchung und je vollständig gemessener Entscheidung (4 Stufen + Gesamt) in Mikrosekunden."""
+    monitor = LatencyMonitor()
+    monitor.add_alarm("total", 1e9, lambda *args: None)
+    start = time.perf_counter()
+    for i in range(iterations):
+        monitor.record("signal", symbols[i % len(symbols)], 1000 + i)
+    per_record = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for i in range(iterations // 5):
+        trace = monitor.trace(symbols[i % len(symbols)], time.time_ns() - 2_000_000)
+        trace.mark("received")
+        trace.mark("indicators")
+        trace.mark("signal")
+        trace.mark("order")
+        trace.finish()
+    per_decision = (time.perf_counter() - start) / (iterations // 5) * 1e6
+    return {"record_us": round(per_record, 3), "decision_us": round(per_decision, 3)}, monitor.snapshot()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Latenz-Histogramme des Live-Pfads")
+    parser.add_argument("--benchmark", action="store_true", help="Overhead der Instrumentierung messen")
+    parser.add_argument("--follow", help="Snapshot-Datei eines laufenden Prozesses ausgeben (letzte Zeile)")
+    args = parser.parse_args(argv)
+
+    if args.follow:
+        with open(args.follow) as f:
+            lines = f.readlines()
+        if lines:
+            print_snapshot(json.loads(lines[-1]))
+    else:
+        costs, snapshot = benchmark()
+        print(f"📊 Verbuchung {costs['record_us']} µs, Entscheidung (5 Messpunkte) {costs['decision_us']} µs")
+        print_snapshot(snapshot)
+
+
+if __name__ == "__main__":
+    main()
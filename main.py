@@ -1,3 +1,196 @@
-from MarketDataFetcher import MarketDataFetcher
+import argparse
+import json
+import sys
 
-MarketDataFetcher("SPY", 15*30, 0.8).process_and_save_data()
\ No newline at end of file
+# 📌 Einheitlicher Einstiegspunkt. Schwere Abhängigkeiten (pandas, ib_insync, Backtester, Optimizer) werden erst
+# im jeweiligen Unterbefehl importiert, damit `--help` und die Offline-Befehle schnell starten.
+
+
+def cmd_fetch(args):
+    """Lädt 1-Min-Daten von IBKR (oder verarbeitet eine gespeicherte Rohdatei) und speichert alle Zeitebenen."""
+    from MarketDataFetcher import MarketDataFetcher
+
+    fetcher = MarketDataFetcher(args.symbol, args.days, args.train_ratio, save_dir=args.save_dir,
+                                data_format=args.format, data_service=args.data_service)
+    if args.from_parquet:
+        fetcher.process_parquet(args.from_parquet, args.chunk_rows)
+    else:
+        fetcher.process_and_save_data(pipelined=args.pipelined)
+
+
+def cmd_validate(args):
+    from validation import validate_directory, validate_file, print_report
+
+    if args.files:
+        reports = [validate_file(path) for path in args.files]
+        for report in reports:
+            print_report(report)
+    else:
+        reports = validate_directory(args.data_dir)
+    if not reports:
+        print(f"⚠️ Keine Dateien gefunden in {args.data_dir}")
+        return 1
+    return 1 if any(report["errors"] for report in reports) else 0
+
+
+def _load_backtester(args, agent_params):
+    from backtester import Backtester
+    from MomentumBreakoutAgent import MomentumBreakoutAgent
+    from storage import load_frame
+
+    df_1min = load_frame(args.data_1min) if args.data_1min else None
+    fill_model = None
+    if args.quotes:
+        from FillModel import QuoteFillModel
+
+        fill_model = QuoteFillModel(load_frame(args.quotes), args.impact)
+    return Backtester(MomentumBreakoutAgent(**agent_params), load_frame(args.data_5min),
+                      load_frame(args.data_15min), initial_balance=args.balance, df_1min=df_1min,
+                      exit_resolution="1min" if df_1min is not None else "candle", labels=args.slices,
+                      fill_model=fill_model)
+
+
+def _run(backtester, args):
+    if args.resume:
+        metrics = backtester.resume_backtest(args.resume)
+    elif args.processes > 1:
+        metrics = backtester.run_backtest_parallel(processes=args.processes)
+    else:
+        metrics = backtester.run_backtest()
+    print(f"📊 Ergebnis: {metrics}")
+    if args.checkpoint:
+        backtester.save_checkpoint(args.checkpoint)
+        print(f"💾 Checkpoint gespeichert: {args.checkpoint}")
+    if args.trades:
+        backtester.ledger.to_frame().to_csv(args.trades, index=False)
+        print(f"💾 {len(backtester.ledger)} Trades gespeichert: {args.trades}")
+    if args.slices:
+        print(backtester.slice_metrics().to_string())
+    if args.options:
+        from OptionOverlay import option_metrics, price_trades
+
+        result = price_trades(backtester.ledger, backtester.df_5min)
+        print(f"📈 Optionen ({args.allocation:.0%} des Kapitals je Trade):")
+        print(option_metrics(result, backtester.initial_balance, args.allocation, backtester.fee_per_trade)
+              .to_string(index=False))
+    return 0
+
+
+def cmd_backtest(args):
+    return _run(_load_backtester(args, dict(args.param)), args)
+
+
+def cmd_optimize(args):
+    from ParameterOptimizer import main as optimize
+
+    optimize(args.optimizer_args)
+
+
+def cmd_data_service(args):
+    from MarketDataService import main as data_service
+
+    data_service(args.service_args)
+
+
+def cmd_replay(args):
+    """Spielt eine Konfiguration aus den Optimierungsergebnissen erneut ab (standardmäßig auf den Testdaten)."""
+    import pandas as pd
+    from MomentumBreakoutAgent import MomentumBreakoutAgent
+
+    df_results = pd.read_csv(args.results).sort_values(args.sort, ascending=False)
+    agent_params = {name: value.item() if hasattr(value, "item") else value
+                    for name, value in df_results.iloc[args.row].items()
+                    if name in MomentumBreakoutAgent.__init__.__code__.co_varnames}
+    print(f"🔁 Konfiguration {args.row} (nach {args.sort}): {agent_params}")
+    return _run(_load_backtester(args, agent_params), args)
+
+
+def _parse_param(text):
+    """name=wert, der Wert wird als JSON gelesen (Zahlen, true/false), sonst als Text übernommen."""
+    name, _, value = text.partition("=")
+    if not name or not value:
+        raise argparse.ArgumentTypeError(f"Erwartet name=wert: {text}")
+    try:
+        return name, json.loads(value)
+    except json.JSONDecodeError:
+        return name, value
+
+
+def _add_backtest_arguments(parser, split):
+    parser.add_argument("--data-5min", default=f"saved_data/SPY_{split}_5min.parquet")
+    parser.add_argument("--data-15min", default=f"saved_data/SPY_{split}_15min.parquet")
+    parser.add_argument("--data-1min", help="1-Min-Daten für exit_resolution='1min'")
+    parser.add_argument("--balance", type=float, default=10000)
+    parser.add_argument("--quotes", help="Quote-Daten (bid_price/ask_price) für spread-bewusste Fills")
+    parser.add_argument("--impact", type=float, default=1.0, help="Impact-Koeffizient der Quote-Fills")
+    parser.add_argument("--processes", type=int, default=1, help=">1 = segmentierter Parallel-Lauf")
+    parser.add_argument("--checkpoint", help="Checkpoint nach dem Lauf speichern")
+    parser.add_argument("--resume", help="Lauf ab einem gespeicherten Checkpoint fortsetzen")
+    parser.add_argument("--trades", help="Trade-Journal als CSV speichern")
+    parser.add_argument("--slices", action="store_true",
+                        help="Kennzahlen je ADX-Regime, Tageszeit, Wochentag und Volatilität ausgeben")
+    parser.add_argument("--options", action="store_true", help="Signale zusätzlich als Optionen bewerten")
+    parser.add_argument("--allocation", type=float, default=0.1, help="Anteil des Kapitals als Optionsprämie")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="TradeHive - Daten, Backtests und Optimierung")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fetch = commands.add_parser("fetch", help="Marktdaten laden, Indikatoren berechnen und speichern")
+    fetch.add_argument("--symbol", default="SPY")
+    fetch.add_argument("--days", type=int, default=15 * 30)
+    fetch.add_argument("--train-ratio", type=float, default=0.8)
+    fetch.add_argument("--save-dir", default="saved_data")
+    # Wie storage.FORMATS (hier ausgeschrieben, damit --help ohne pyarrow startet)
+    fetch.add_argument("--format", choices=["parquet", "parquet-tuned", "feather", "feather-lz4", "feather-zstd"],
+                       default="parquet", help="Speicherformat der Ausgabedateien")
+    fetch.add_argument("--pipelined", action="store_true", help="Download, Parsing und Schreiben überlappen")
+    fetch.add_argument("--from-parquet", help="Gespeicherte 1-Min-Rohdaten statt IBKR verarbeiten (offline)")
+    fetch.add_argument("--chunk-rows", type=int, help="Blockweise Verarbeitung für --from-parquet")
+    fetch.add_argument("--data-service", metavar="ADRESSE",
+                       help="Über einen laufenden Marktdaten-Dienst laden statt eigener IB-Verbindung")
+    fetch.set_defaults(func=cmd_fetch)
+
+    validate = commands.add_parser("validate", help="Gespeicherte Marktdaten prüfen")
+    validate.add_argument("files", nargs="*", help="Parquet-/Arrow-Dateien (Standard: alle in --data-dir)")
+    validate.add_argument("--data-dir", default="saved_data")
+    validate.set_defaults(func=cmd_validate)
+
+    backtest = commands.add_parser("backtest", help="Backtest des MomentumBreakoutAgent")
+    _add_backtest_arguments(backtest, "train")
+    backtest.add_argument("--param", type=_parse_param, action="append", default=[], metavar="NAME=WERT",
+                          help="Agent-Parameter, mehrfach angebbar")
+    backtest.set_defaults(func=cmd_backtest)
+
+    # Die Optionen des Optimizers werden unverändert an ParameterOptimizer.main weitergereicht
+    optimize = commands.add_parser("optimize", add_help=False, help="Parameteroptimierung (Optionen: optimize -h)")
+    optimize.set_defaults(func=cmd_optimize)
+
+    data_service = commands.add_parser("data-service", add_help=False,
+                                       help="Marktdaten-Dienst mit IB-Sitzungs-Pool (Optionen: data-service -h)")
+    data_service.set_defaults(func=cmd_data_service)
+
+    replay = commands.add_parser("replay", help="Konfiguration aus den Optimierungsergebnissen erneut abspielen")
+    _add_backtest_arguments(replay, "test")
+    replay.add_argument("--results", default="optimization_results.csv")
+    replay.add_argument("--row", type=int, default=0, help="Zeile der Ergebnisdatei (nach --sort sortiert)")
+    replay.add_argument("--sort", default="sharpe_ratio", help="Spalte, nach der absteigend sortiert wird")
+    replay.set_defaults(func=cmd_replay)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.command == "optimize":
+        args.optimizer_args = extra
+    elif args.command == "data-service":
+        args.service_args = extra
+    elif extra:
+        parser.error(f"Unbekannte Argumente: {' '.join(extra)}")
+    return args.func(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import json
+import os
+import threading
+import time
+
+
+class _Stage:
+    """Kontextmanager, der die Laufzeit einer benannten Stufe im Profiler verbucht (nicht re-entrant, je Thread)."""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullStage:
+    """Kontextmanager ohne Wirkung, wird bei deaktiviertem Profiler zurückgegeben."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Profiler:
+    def __init__(self, enabled=False):
+        """
+        Sammelt je Stufe Anzahl, Gesamt-, Minimal- und Maximalzeit sowie einfache Zähler (z.B. verarbeitete Bars).
+        Ist der Profiler deaktiviert, liefert `stage()` einen geteilten No-op-Kontextmanager.
+        Stufen werden je Thread zwischengespeichert, Verbuchungen sind per Lock geschützt (z.B. Pipeline-Threads).
+        """
+        self.enabled = enabled
+        self.stats = {}
+        self.counters = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def stage(self, name):
+        """Kontextmanager zum Messen der Stufe `name`."""
+        if not self.enabled:
+            return _NULL_STAGE
+        key = (name, threading.get_ident())
+        stage = self._stages.get(key)
+        if stage is None:
+            stage = self._stages[key] = _Stage(self, name)
+        return stage
+
+    def add(self, name, seconds, count=1):
+        """Verbucht eine extern gemessene Dauer für die Stufe `name`."""
+        with self._lock:
+            entry = self.stats.get(name)
+            if entry is None:
+                self.stats[name] = [count, seconds, seconds, seconds]
+                return
+            entry[0] += count
+            entry[1] += seconds
+            if seconds < entry[2]:
+                entry[2] = seconds
+            if seconds > entry[3]:
+                entry[3] = seconds
+
+    def count(self, name, n=1):
+        """Erhöht den Zähler `name` um `n`."""
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        self.stats.clear()
+        self.counters.clear()
+
+    def snapshot(self):
+        """Liefert die gesammelten Werte als JSON-serialisierbares Dictionary."""
+        return {
+            "pid": os.getpid(),
+            "stages": {name: {"count": c, "total_s": total, "min_s": lo, "max_s": hi}
+                       for name, (c, total, lo, hi) in self.stats.items()},
+            "counters": dict(self.counters),
+        }
+
+    def merge(self, snapshot):
+        """Addiert einen Snapshot (z.B. aus einem Worker-Prozess) zu den eigenen Werten."""
+        for name, s in snapshot["stages"].items():
+            entry = self.stats.get(name)
+            if entry is None:
+                self.stats[name] = [s["count"], s["total_s"], s["min_s"], s["max_s"]]
+            else:
+                entry[0] += s["count"]
+                entry[1] += s["total_s"]
+                entry[2] = min(entry[2], s["min_s"])
+                entry[3] = max(entry[3], s["max_s"])
+        for name, n in snapshot["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+def merge_snapshots(snapshots):
+    """Fasst mehrere Snapshots zu einem zusammen."""
+    total = Profiler()
+    for snapshot in snapshots:
+        total.merge(snapshot)
+    return total.snapshot()
+
+
+def export_profile(path, total, workers=None, **extra):
+    """
+    Schreibt ein maschinenlesbares Profil (JSON) mit Gesamtwerten, Werten je Worker und
+    abgeleiteten Kennzahlen (mittlere Dauer je Stufe, Bars pro Sekunde im Backtest).
+    """
+    stages = total["stages"]
+    for s in stages.values():
+        s["mean_us"] = round(s["total_s"] / s["count"] * 1e6, 3) if s["count"] else 0
+
+    backtest_time = stages.get("backtest.run", {}).get("total_s", 0)
+    bars = total["counters"].get("backtest.bars", 0)
+    throughput = {"backtest_bars_per_sec": round(bars / backtest_time, 1) if backtest_time else 0}
+
+    profile = {"total": total, "workers": workers or {}, "throughput": throughput, **extra}
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=2)
+    return profile
+
+
+# Globaler Profiler; per Umgebungsvariable TRADEHIVE_PROFILE=1 auch in Worker-Prozessen aktivierbar
+profiler = Profiler(enabled=os.environ.get("TRADEHIVE_PROFILE") == "1")
@@ -0,0 +1,193 @@
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# 📌 Speicherformate für Marktdaten. Alle Formate speichern denselben DataFrame (inkl. Zeitzonen-Index) und
+# werden beim Laden am Dateiinhalt erkannt, Konsumenten brauchen nur `load_frame` statt `pd.read_parquet`.
+FORMATS = {
+    # Standard von pandas (Snappy, ein Row-Group je 1 Mio. Zeilen, Statistiken für alle Spalten)
+    "parquet": {"kind": "parquet", "options": {}},
+    # Ohne Kompression (Dictionary-Kodierung der Preise bleibt, Datei kaum größer als mit Snappy), Row-Groups mit
+    # 65536 Zeilen und Statistiken nur für den Zeitstempel (Row-Group-Filter nach Zeitraum)
+    "parquet-tuned": {"kind": "parquet", "options": {"compression": "none", "row_group_size": 65536,
+                                                     "write_statistics": ["date"]}},
+    # Arrow IPC (Feather v2): unkomprimiert per Memory-Map ohne Dekodierung lesbar
+    "feather": {"kind": "ipc", "options": {"compression": "uncompressed"}},
+    "feather-lz4": {"kind": "ipc", "options": {"compression": "lz4"}},
+    "feather-zstd": {"kind": "ipc", "options": {"compression": "zstd"}},
+}
+DEFAULT_FORMAT = "parquet"
+EXTENSIONS = {"parquet": ".parquet", "ipc": ".arrow"}
+_MAGIC = {b"PAR1": "parquet", b"ARROW1": "ipc"}
+
+
+def file_extension(data_format):
+    return EXTENSIONS[FORMATS[data_format]["kind"]]
+
+
+def detect_kind(path):
+    """Erkennt Parquet bzw. Arrow IPC an den ersten Bytes (unabhängig von der Dateiendung)."""
+    with open(path, "rb") as f:
+        head = f.read(6)
+    for magic, kind in _MAGIC.items():
+        if head.startswith(magic):
+            return kind
+    raise ValueError(f"Unbekanntes Dateiformat: {path}")
+
+
+def resolve_path(path):
+    """
+    Liefert `path`, falls vorhanden, sonst eine Datei gleichen Namens mit einer anderen bekannten Endung
+    (z.B. SPY_train_5min.arrow für SPY_train_5min.parquet nach einer Konvertierung mit --replace).
+    """
+    if os.path.exists(path):
+        return path
+    stem = os.path.splitext(path)[0]
+    for extension in EXTENSIONS.values():
+        if os.path.exists(stem + extension):
+            return stem + extension
+    raise FileNotFoundError(path)
+
+
+def read_table(path, columns=None):
+    """Liest eine Datei beliebigen Formats als pyarrow.Table (Arrow IPC per Memory-Map)."""
+    path = resolve_path(path)
+    if detect_kind(path) == "ipc":
+        return feather.read_table(path, columns=columns, memory_map=True)
+    return pq.read_table(path, columns=columns, use_pandas_metadata=True)
+
+
+def load_frame(path, columns=None):
+    """Lädt einen gespeicherten DataFrame (Ersatz für pd.read_parquet, Format wird automatisch erkannt)."""
+    return read_table(path, columns).to_pandas()
+
+
+def save_frame(df, path, data_format=DEFAULT_FORMAT):
+    """Speichert einen DataFrame im gewählten Format; `path` ohne Endung, die Endung folgt aus dem Format."""
+    path = path + file_extension(data_format)
+    writer = FrameWriter(path, pa.Schema.from_pandas(df), data_format)
+    writer.write(df)
+    writer.close()
+    return path
+
+
+class FrameWriter:
+    def __init__(self, path, schema, data_format=DEFAULT_FORMAT):
+        """Inkrementelles Schreiben (Block für Block) im gewählten Format, z.B. für die blockweise Verarbeitung."""
+        spec = FORMATS[data_format]
+        self.path = path
+        self.schema = schema
+        self.options = dict(spec["options"])
+        if spec["kind"] == "parquet":
+            self.row_group_size = self.options.pop("row_group_size", None)
+            self._writer = pq.ParquetWriter(path, schema, **self.options)
+        else:
+            self.row_group_size = None
+            ipc_options = pa.ipc.IpcWriteOptions(compression=None if self.options["compression"] == "uncompressed"
+                                                 else self.options["compression"])
+            self._writer = pa.ipc.new_file(path, schema, options=ipc_options)
+
+    def write(self, df):
+        table = pa.Table.from_pandas(df, schema=self.schema)
+        if self.row_group_size is None:
+            self._writer.write_table(table)
+        else:
+            self._writer.write_table(table, row_group_size=self.row_group_size)
+
+    def close(self):
+        self._writer.close()
+
+
+def convert_file(path, data_format, output_dir=None, replace=False):
+    """
+    Schreibt eine gespeicherte Datei im Format `data_format` neu (gleicher Name, Endung je nach Format).
+    Mit `replace` wird die Quelldatei anschließend entfernt, damit Konsumenten über `resolve_path` das neue
+    Format verwenden.
+    """
+    df = load_frame(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    directory = output_dir or os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Über eine temporäre Datei schreiben, damit eine gleichnamige Quelldatei erst am Ende ersetzt wird
+    staging = tempfile.mkdtemp(dir=directory)
+    try:
+        written = save_frame(df, os.path.join(staging, stem), data_format)
+        target = os.path.join(directory, os.path.basename(written))
+        os.replace(written, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    if replace and os.path.abspath(target) != os.path.abspath(path):
+        os.remove(path)
+    return target
+
+
+def benchmark_formats(path, formats=None, repeat=5):
+    """
+    Vergleicht Dateigröße, Schreib- und Ladezeit (Table und DataFrame) einer Datei in allen Formaten.
+    Die Ladezeit ist der beste von `repeat` Läufen bei warmem Dateisystem-Cache (typisch für wiederholte
+    Backtests); jede Variante wird gegen das Original auf Gleichheit geprüft.
+    """
+    df = load_frame(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for data_format in formats or FORMATS:
+            start = time.perf_counter()
+            written = save_frame(df, os.path.join(directory, f"{stem}_{data_format}"), data_format)
+            write_seconds = time.perf_counter() - start
+
+            load_frame(written)  # Aufwärmen (Dateisystem-Cache, erste Konvertierung)
+            table_seconds = frame_seconds = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                table = read_table(written)
+                table_seconds = min(table_seconds, time.perf_counter() - start)
+                start = time.perf_counter()
+                loaded = load_frame(written)
+                frame_seconds = min(frame_seconds, time.perf_counter() - start)
+
+            results.append({"format": data_format, "size_mb": round(os.path.getsize(written) / 1024 ** 2, 2),
+                            "write_ms": round(write_seconds * 1000, 2), "table_ms": round(table_seconds * 1000, 2),
+                            "load_ms": round(frame_seconds * 1000, 2), "identical": loaded.equals(df)})
+            del table, loaded
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Speicherformate der Marktdaten konvertieren und vergleichen")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="Dateien in ein anderes Format umschreiben")
+    convert.add_argument("files", nargs="+")
+    convert.add_argument("--format", choices=FORMATS, required=True)
+    convert.add_argument("--output-dir", help="Zielverzeichnis (Standard: neben der Quelldatei)")
+    convert.add_argument("--replace", action="store_true", help="Quelldatei nach der Konvertierung entfernen")
+
+    bench = commands.add_parser("benchmark", help="Lade- und Schreibzeiten aller Formate messen")
+    bench.add_argument("files", nargs="+")
+    bench.add_argument("--formats", nargs="+", choices=FORMATS)
+    bench.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        for path in args.files:
+            target = convert_file(path, args.format, args.output_dir, args.replace)
+            print(f"✅ {path} -> {target}")
+    else:
+        for path in args.files:
+            print(f"⏱️ {path}:")
+            for result in benchmark_formats(path, args.formats, args.repeat):
+                print(f"   {result['format']:<14} {result['size_mb']:>8.2f} MB - Schreiben {result['write_ms']:>8.2f} ms"
+                      f" - Table {result['table_ms']:>8.2f} ms - DataFrame {result['load_ms']:>8.2f} ms"
+                      f"{'' if result['identical'] else ' ⚠️ Abweichung'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from MarketDataService import MarketDataClient, MarketDataService, ReplayIB, SessionPool
+
+CLIENT_IDS = [31, 32]
+
+
+def make_frames(symbols=("AAA", "BBB"), days=3):
+    """Deterministische 1-Min-Kerzen (Regular Trading Hours) je Symbol."""
+    frames = {}
+    for s, symbol in enumerate(symbols):
+        index = pd.DatetimeIndex([day + pd.Timedelta(hours=9, minutes=30 + i)
+                                  for day in pd.bdate_range("2024-03-04", periods=days) for i in range(390)],
+                                 name="date").tz_localize("US/Eastern")
+        close = 100.0 + 50 * s + np.sin(np.arange(len(index)) / 30)
+        frames[symbol] = pd.DataFrame({"open": close, "high": close + 0.05, "low": close - 0.05, "close": close,
+                                       "volume": 100.0}, index=index)
+    return frames
+
+
+@pytest.fixture
+def service():
+    """MarketDataService auf ReplayIB in einem eigenen Event-Loop (Thread); Clients greifen synchron zu."""
+    frames = make_frames()
+    ibs = []
+
+    def ib_factory():
+        ibs.append(ReplayIB(frames, latency=0.3, bar_interval=0.02))
+        return ibs[-1]
+
+    address = os.path.join(tempfile.mkdtemp(), "marketdata.sock")
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    async def start():
+        pool = SessionPool(client_ids=CLIENT_IDS, ib_factory=ib_factory, request_interval=0.0,
+                           contract_factory=lambda symbol: SimpleNamespace(symbol=symbol))
+        await pool.start()
+        service = MarketDataService(pool, cache_entries=2, live_cache_seconds=0.5)
+        return service, asyncio.ensure_future(service.serve(address))
+
+    service, _ = asyncio.run_coroutine_threadsafe(start(), loop).result(5)
+    while not os.path.exists(address):
+        time.sleep(0.01)
+    yield SimpleNamespace(service=service, address=address, ibs=ibs)
+
+    async def stop():
+        # Server, Verbindungen und Streams beenden, bevor der Loop stoppt
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        service.pool.close()
+
+    asyncio.run_coroutine_threadsafe(stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Bedingung nicht rechtzeitig erfüllt"
+        time.sleep(0.01)
+
+
+def historical(address, **request):
+    with MarketDataClient(address, timeout=10) as client:
+        return client.historical("AAA", duration="1 D", bar_size="5 mins", **request)
+
+
+def test_client_ids_assigned_by_pool(service):
+    assert sorted(ib.client_id for ib in service.ibs) == CLIENT_IDS
+    with MarketDataClient(service.address, timeout=5) as client:
+        sessions = client.stats()["sessions"]
+    assert [(s["client_id"], s["connected"]) for s in sessions] == [(31, True), (32, True)]
+
+
+def test_concurrent_identical_requests_share_one_ib_call(service):
+    end = "20240305 16:00:00 US/Eastern"
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(lambda _: historical(service.address, end=end), range(4)))
+
+    counts = service.service.counts
+    assert counts["historical"] == 4
+    assert counts["ib_requests"] == 1
+    assert counts["shared"] == 3
+    assert sum(ib.requests for ib in service.ibs) == 1
+    assert all(result == results[0] for result in results)
+    assert len(results[0]) == 78
+
+    # Danach aus dem Cache, ohne weiteren IB-Aufruf
+    assert historical(service.address, end=end) == results[0]
+    assert counts["cache_hits"] == 1
+    assert counts["ib_requests"] == 1
+
+
+def test_cache_is_lru_bounded(service):
+    ends = ["20240304 16:00:00 US/Eastern", "20240305 16:00:00 US/Eastern", "20240306 16:00:00 US/Eastern"]
+    for end in ends[:2]:
+        historical(service.address, end=end)
+    historical(service.address, end=ends[0])   # zuletzt verwendet: ends[1] wird als Nächstes verdrängt
+    historical(service.address, end=ends[2])
+    counts = service.service.counts
+    assert (counts["ib_requests"], counts["cache_hits"], len(service.service.cache)) == (3, 1, 2)
+
+    historical(service.address, end=ends[0])
+    assert (counts["ib_requests"], counts["cache_hits"]) == (3, 2)
+    historical(service.address, end=ends[1])
+    assert (counts["ib_requests"], counts["cache_hits"]) == (4, 2)
+
+
+def test_live_requests_expire(service):
+    historical(service.address)
+    historical(service.address)
+    counts = service.service.counts
+    assert (counts["ib_requests"], counts["cache_hits"]) == (1, 1)
+    time.sleep(0.6)
+    historical(service.address)
+    assert (counts["ib_requests"], counts["cache_hits"]) == (2, 1)
+
+
+def test_stream_fan_out_and_unsubscribe(service):
+    clients = [MarketDataClient(service.address, timeout=5) for _ in range(3)]
+    try:
+        streams = [client.stream("AAA") for client in clients]
+        first = [next(stream) for stream in streams]
+        assert all(bar["close"] > 0 for bar in first)
+        later = [[next(stream)["date"] for _ in range(3)] for stream in streams]
+        assert all(dates == sorted(dates) for dates in later)
+
+        counts = service.service.counts
+        assert counts["subscriptions"] == 3
+        assert counts["ib_subscriptions"] == 1
+        with MarketDataClient(service.address, timeout=5) as observer:
+            assert observer.stats()["streams"] == {"AAA TRADES True": 3}
+
+        # Abmelden einzelner Abonnenten hält das IB-Abonnement, der letzte beendet es
+        streams[0].close()
+        wait_for(lambda: len(next(iter(service.service.streams.values())).subscribers) == 2)
+        assert next(streams[1])["close"] > 0
+        streams[1].close()
+        streams[2].close()
+        wait_for(lambda: not service.service.streams)
+        assert sum(session.streams for session in service.service.pool.sessions) == 0
+        assert counts["ib_subscriptions"] == 1
+    finally:
+        for client in clients:
+            client.close()
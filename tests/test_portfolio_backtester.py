@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from PortfolioBacktester import PortfolioBacktester
+
+
+class AlwaysLongAgent:
+    """Kauft bei jedem Signalaufruf mit Stop-Loss und Take-Profit weit außerhalb der Kursspanne."""
+
+    def get_signal(self, df_5min, df_15min):
+        close = float(df_5min["close"][-1])
+        return "BUY CALL", close - 1000, close + 1000
+
+
+def make_bars(start, periods, price=100.0):
+    index = pd.date_range(start, periods=periods, freq="5min", tz="US/Eastern", name="date")
+    close = price + np.sin(np.arange(periods) / 5)
+    df_5min = pd.DataFrame({"open": close, "high": close + 0.1, "low": close - 0.1, "close": close,
+                            "volume": 1000.0}, index=index)
+    df_15min = df_5min.resample("15min").agg({"open": "first", "high": "max", "low": "min", "close": "last",
+                                              "volume": "sum"})
+    return df_5min, df_15min
+
+
+def test_positions_close_at_end_of_symbol_data():
+    # Aufeinanderfolgende Zeiträume ohne Überlappung: die Position des ersten Symbols wird nie ausgestoppt und muss
+    # am Datenende schließen, damit der einzige Platz (max_positions=1) und das Kapital frei werden
+    universe = {"A": make_bars("2024-01-02 09:30", 60), "B": make_bars("2024-01-03 09:30", 60, price=200.0),
+                "C": make_bars("2024-01-04 09:30", 60, price=300.0)}
+    backtester = PortfolioBacktester(AlwaysLongAgent(), universe, max_positions=1)
+    backtester.run_backtest()
+
+    summary = backtester.symbol_summary()
+    assert not backtester.position.any()
+    assert (summary["trades"] == 1).all()
+    symbols, exits = backtester.ledger["symbol"], backtester.ledger["exit_index"]
+    for s, (df_5min, _) in enumerate(universe.values()):
+        assert exits[symbols == s].tolist() == [len(df_5min) - 1]
@@ -0,0 +1,111 @@
+import glob
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from storage import EXTENSIONS, detect_kind
+
+# Erwartete Spalten der gespeicherten Marktdaten (1-Min-Daten enthalten zusätzlich average/barCount)
+REQUIRED_COLUMNS = ["open", "high", "low", "close", "volume", "EMA_20", "EMA_50", "ATR_14", "Momentum_14", "ADX_14"]
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+TIMESTAMP_COLUMN = "date"
+# Abstände ab dieser Länge gelten als Sitzungswechsel (Nacht/Wochenende), darunter als Lücke im Handelstag
+SESSION_BREAK_NS = 4 * 3600 * 10 ** 9
+
+
+def validate_file(path):
+    """
+    Prüft eine gespeicherte Marktdaten-Datei (Parquet oder Arrow IPC), ohne pandas zu laden (nur pyarrow/NumPy,
+    schneller Kaltstart).
+
+    Geprüft werden: Pflichtspalten, fehlende Werte, streng steigende Zeitstempel (Duplikate/Rücksprünge),
+    Lücken innerhalb eines Handelstages (bezogen auf den häufigsten Zeitabstand) und OHLC-Konsistenz.
+
+    :return: Dictionary mit Kennzahlen und der Liste `errors` (leer = Datei in Ordnung)
+    """
+    errors = []
+    report = {"path": path, "rows": 0, "errors": errors}
+    try:
+        table = _read_table(path)
+    except (OSError, ValueError, pa.ArrowException) as e:
+        errors.append(f"Datei nicht lesbar: {e}")
+        return report
+    report["rows"] = table.num_rows
+
+    missing = [name for name in [TIMESTAMP_COLUMN, *REQUIRED_COLUMNS] if name not in table.column_names]
+    if missing:
+        errors.append(f"Fehlende Spalten: {missing}")
+
+    nulls = {name: int(table.column(name).null_count + np.isnan(_values(table, name)).sum())
+             for name in REQUIRED_COLUMNS if name in table.column_names}
+    nulls = {name: count for name, count in nulls.items() if count}
+    if nulls:
+        errors.append(f"Fehlende Werte: {nulls}")
+
+    if TIMESTAMP_COLUMN in table.column_names and table.num_rows > 1:
+        timestamps = _to_numpy(table.column(TIMESTAMP_COLUMN).cast(pa.int64()), np.int64)
+        diffs = np.diff(timestamps)
+        values, counts = np.unique(diffs, return_counts=True)
+        interval = int(values[counts.argmax()])
+        report["interval_min"] = interval / 60e9
+        report["sessions"] = int((diffs >= SESSION_BREAK_NS).sum()) + 1
+
+        not_increasing = int((diffs <= 0).sum())
+        if not_increasing:
+            errors.append(f"{not_increasing} doppelte oder nicht steigende Zeitstempel")
+        gaps = int(((diffs > interval) & (diffs < SESSION_BREAK_NS)).sum())
+        if gaps:
+            errors.append(f"{gaps} Lücken innerhalb eines Handelstages")
+
+    if all(name in table.column_names for name in PRICE_COLUMNS):
+        open_, high, low, close = (_values(table, name) for name in PRICE_COLUMNS)
+        inconsistent = int(((high < np.maximum(open_, close)) | (low > np.minimum(open_, close)) | (low <= 0)).sum())
+        if inconsistent:
+            errors.append(f"{inconsistent} Kerzen mit inkonsistenten OHLC-Werten")
+    return report
+
+
+def _read_table(path):
+    if detect_kind(path) == "ipc":
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        return table.select([name for name in [TIMESTAMP_COLUMN, *REQUIRED_COLUMNS] if name in table.column_names])
+    # ParquetFile statt read_table: read_table lädt pyarrow.dataset und damit pandas
+    parquet_file = pq.ParquetFile(path)
+    columns = [name for name in [TIMESTAMP_COLUMN, *REQUIRED_COLUMNS] if name in parquet_file.schema_arrow.names]
+    return parquet_file.read(columns=columns)
+
+
+def _values(table, name):
+    return _to_numpy(table.column(name).cast(pa.float64()), np.float64)
+
+
+def _to_numpy(column, dtype):
+    """Direkt aus den Arrow-Puffern (to_numpy() würde pandas importieren); fehlende Werte zählt null_count."""
+    return np.concatenate([np.frombuffer(chunk.buffers()[1], dtype=dtype)[chunk.offset:chunk.offset + len(chunk)]
+                           for chunk in column.chunks]) if column.num_chunks else np.empty(0, dtype)
+
+
+def validate_directory(directory="saved_data"):
+    """Prüft alle Marktdaten-Dateien (Parquet/Arrow) eines Verzeichnisses und gibt die Berichte aus."""
+    reports = []
+    paths = sorted(path for extension in EXTENSIONS.values()
+                   for path in glob.glob(os.path.join(directory, "*" + extension)))
+    for path in paths:
+        report = validate_file(path)
+        reports.append(report)
+        print_report(report)
+    return reports
+
+
+def print_report(report):
+    info = f"{report['rows']} Zeilen"
+    if "interval_min" in report:
+        info += f", {report['interval_min']:g}-Min-Takt, {report['sessions']} Handelstage"
+    if report["errors"]:
+        print(f"⚠️ {report['path']} ({info}):")
+        for error in report["errors"]:
+            print(f"   - {error}")
+    else:
+        print(f"✅ {report['path']} ({info})")
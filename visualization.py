@@ -0,0 +1,303 @@
+import argparse
+import html
+import json
+import os
+import time
+
+import numpy as np
+
+# 📌 Darstellung langer Backtests: Kurs, Trades und Kapitalkurve werden einmalig als Memory-Map-Arrays mit einer
+# Min/Max-Pyramide (je Stufe Faktor PYRAMID_FACTOR gröber) abgelegt. Jede Ansicht (Zeitraum, Breite in Pixeln)
+# liest nur die passende Stufe des sichtbaren Bereichs, der Aufwand hängt von der Breite ab, nicht von der
+# Datenmenge. Ausgabe als eigenständige HTML-Datei mit SVG (keine Plot-Bibliothek nötig).
+PYRAMID_FACTOR = 8
+DEFAULT_WIDTH = 1600
+MIN_LEVEL_ROWS = 2 * DEFAULT_WIDTH
+PANEL_HEIGHTS = {"price": 360, "equity": 200}
+MARGIN = 60
+
+
+# 📌 Downsampling
+def minmax_buckets(values_low, values_high, buckets):
+    """
+    Min/Max je Bucket (gleich große Abschnitte), vollständig vektorisiert.
+
+    :return: (Startindex, Minimum, Maximum) je Bucket
+    """
+    num_rows = len(values_low)
+    buckets = max(1, min(buckets, num_rows))
+    starts = (np.arange(buckets) * num_rows) // buckets
+    return starts, np.minimum.reduceat(values_low, starts), np.maximum.reduceat(values_high, starts)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Largest-Triangle-Three-Buckets: wählt `threshold` Punkte, die die Form der Kurve erhalten (erster und letzter
+    Punkt immer enthalten). Die Buckets werden als gepolsterte Matrix gebildet; nur die Abhängigkeit vom zuvor
+    gewählten Punkt läuft als Schleife über die Buckets.
+    """
+    num_points = len(y)
+    if threshold >= num_points or threshold < 3:
+        return np.arange(num_points)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Innere Punkte 1..n-2 auf threshold-2 Buckets verteilt
+    edges = 1 + (np.arange(threshold - 1) * (num_points - 2)) // (threshold - 2)
+    starts, ends = edges[:-1], edges[1:]
+    sizes = ends - starts
+    width = int(sizes.max())
+    index = np.minimum(starts[:, None] + np.arange(width), ends[:, None] - 1)
+    bucket_x, bucket_y = x[index], y[index]
+
+    # Mittelwert des jeweils nächsten Buckets (für den letzten: der letzte Punkt)
+    next_x = np.append(np.add.reduceat(x[1:-1], starts - 1) / sizes, x[-1])[1:]
+    next_y = np.append(np.add.reduceat(y[1:-1], starts - 1) / sizes, y[-1])[1:]
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, num_points - 1
+    ax, ay = x[0], y[0]
+    for bucket in range(threshold - 2):
+        bx, by = bucket_x[bucket], bucket_y[bucket]
+        area = np.abs((ax - next_x[bucket]) * (by - ay) - (ax - bx) * (next_y[bucket] - ay))
+        choice = index[bucket, int(area.argmax())]
+        selected[bucket + 1] = choice
+        ax, ay = x[choice], y[choice]
+    return selected
+
+
+# 📌 Memory-Map-Ablage mit Min/Max-Pyramide
+class ChartStore:
+    def __init__(self, directory):
+        """Öffnet eine mit `ChartStore.build` angelegte Ablage; alle Arrays werden per Memory-Map gelesen."""
+        self.directory = directory
+        with open(os.path.join(directory, "chart.json")) as f:
+            self.meta = json.load(f)
+        self._arrays = {}
+
+    def array(self, name):
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.directory, name + ".npy"), mmap_mode="r")
+        return self._arrays[name]
+
+    @classmethod
+    def build(cls, directory, series, trades=None, title="", timezone="UTC"):
+        """
+        Legt Serien und Trades als .npy-Dateien an.
+
+        :param series: Dictionary Name -> (Zeitstempel ns, Minimum, Maximum); für Linien Minimum = Maximum
+        :param trades: Optionales Dictionary mit Arrays entry_time, exit_time (ns), entry_price, exit_price, direction
+        """
+        os.makedirs(directory, exist_ok=True)
+        meta = {"title": title, "timezone": timezone, "series": {}, "trades": trades is not None}
+        for name, (timestamps, low, high) in series.items():
+            timestamps = np.asarray(timestamps, dtype=np.int64)
+            low = np.asarray(low, dtype=np.float64)
+            high = np.asarray(high, dtype=np.float64)
+            level = 0
+            while True:
+                for part, values in (("time", timestamps), ("low", low), ("high", high)):
+                    np.save(os.path.join(directory, f"{name}_L{level}_{part}.npy"), values)
+                if len(timestamps) < MIN_LEVEL_ROWS * PYRAMID_FACTOR // 2:
+                    break
+                # Nächste Stufe: je PYRAMID_FACTOR Zeilen ein Eintrag (Zeitstempel der ersten Zeile)
+                starts = np.arange(0, len(timestamps), PYRAMID_FACTOR)
+                timestamps = timestamps[starts]
+                low, high = np.minimum.reduceat(low, starts), np.maximum.reduceat(high, starts)
+                level += 1
+            meta["series"][name] = {"levels": level + 1, "rows": int(len(series[name][0]))}
+        if trades is not None:
+            for part in ("entry_time", "exit_time", "entry_price", "exit_price", "direction"):
+                np.save(os.path.join(directory, f"trades_{part}.npy"), np.asarray(trades[part]))
+        with open(os.path.join(directory, "chart.json"), "w") as f:
+            json.dump(meta, f)
+        return cls(directory)
+
+    def time_range(self):
+        ends = [(self.array(f"{name}_L0_time")[0], self.array(f"{name}_L0_time")[-1])
+                for name, info in self.meta["series"].items() if info["rows"]]
+        return int(min(start for start, _ in ends)), int(max(end for _, end in ends))
+
+    def view(self, name, start=None, end=None, width=DEFAULT_WIDTH):
+        """
+        Ausschnitt einer Serie für `width` Pixel: wählt die gröbste Pyramidenstufe mit mindestens zwei Werten je
+        Pixel und bildet darauf Min/Max-Buckets. Liest nur den sichtbaren Teil der Stufe.
+
+        :return: (Zeitstempel, Minimum, Maximum) mit höchstens `width` Einträgen (weniger, wenn weniger Daten)
+        """
+        timestamps = self.array(f"{name}_L0_time")
+        first = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        last = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="right"))
+        if last <= first:
+            return np.empty(0, np.int64), np.empty(0), np.empty(0)
+
+        level = 0
+        while (level + 1 < self.meta["series"][name]["levels"]
+               and (last - first) // PYRAMID_FACTOR ** (level + 1) >= 2 * width):
+            level += 1
+        scale = PYRAMID_FACTOR ** level
+        rows = slice(first // scale, -(-last // scale))
+        level_time = np.asarray(self.array(f"{name}_L{level}_time")[rows])
+        low = np.asarray(self.array(f"{name}_L{level}_low")[rows])
+        high = np.asarray(self.array(f"{name}_L{level}_high")[rows])
+        if len(level_time) <= width:
+            return level_time, low, high
+        starts, low, high = minmax_buckets(low, high, width)
+        return level_time[starts], low, high
+
+    def line(self, name, start=None, end=None, width=DEFAULT_WIDTH):
+        """Ausschnitt als Linie: Min/Max-Vorauswahl aus der Pyramide, danach LTTB auf `width` Punkte (MinMaxLTTB)."""
+        timestamps, low, high = self.view(name, start, end, 4 * width)
+        if len(timestamps) == 0 or np.array_equal(low, high):
+            x, y = timestamps, low
+        else:
+            # Minimum und Maximum je Bucket als Punkte (Reihenfolge innerhalb des Buckets unbekannt)
+            x, y = np.repeat(timestamps, 2), np.column_stack((low, high)).ravel()
+        selected = lttb_indices(x, y, width)
+        return x[selected], y[selected]
+
+    def trades(self, start=None, end=None, max_markers=DEFAULT_WIDTH):
+        """Trades, deren Einstieg im Ausschnitt liegt (bei sehr vielen Trades gleichmäßig ausgedünnt)."""
+        if not self.meta["trades"]:
+            return None
+        entry_time = self.array("trades_entry_time")
+        first = 0 if start is None else int(np.searchsorted(entry_time, start, side="left"))
+        last = len(entry_time) if end is None else int(np.searchsorted(entry_time, end, side="right"))
+        step = max(1, -(-(last - first) // max_markers))
+        rows = slice(first, last, step)
+        return {part: np.asarray(self.array(f"trades_{part}")[rows])
+                for part in ("entry_time", "exit_time", "entry_price", "exit_price", "direction")}
+
+
+def build_backtest_store(backtester, directory, df_1min=None, title="Backtest"):
+    """Legt Kurs (1-Min-Daten, falls angegeben, sonst 5-Min-Kerzen), Kapitalkurve und Trades eines Backtests ab."""
+    df_price = df_1min if df_1min is not None else backtester.df_5min
+    index_5min = backtester.df_5min.index.asi8
+    ledger = backtester.ledger
+    series = {
+        "price": (df_price.index.asi8, df_price["low"].to_numpy(), df_price["high"].to_numpy()),
+        "close": (df_price.index.asi8, df_price["close"].to_numpy(), df_price["close"].to_numpy()),
+        "equity": (index_5min, backtester.equity_curve, backtester.equity_curve),
+    }
+    trades = {"entry_time": index_5min[ledger["entry_index"]], "exit_time": index_5min[ledger["exit_index"]],
+              "entry_price": ledger["entry_price"], "exit_price": ledger["exit_price"],
+              "direction": ledger["direction"]}
+    return ChartStore.build(directory, series, trades, title, str(backtester.df_5min.index.tz or "UTC"))
+
+
+# 📌 SVG/HTML
+def _scale(values, low, high, pixels, invert=False):
+    span = high - low if high > low else 1.0
+    scaled = (np.asarray(values, dtype=np.float64) - low) / span * pixels
+    return pixels - scaled if invert else scaled
+
+
+def _points(x, y):
+    return " ".join(f"{a:.1f},{b:.1f}" for a, b in zip(x, y))
+
+
+def render_svg(store, start=None, end=None, width=DEFAULT_WIDTH):
+    """Ein SVG mit Kursband, Schlusskurs-Linie, Trade-Markern und Kapitalkurve für den Zeitraum [start, end]."""
+    data_start, data_end = store.time_range()
+    start = data_start if start is None else start
+    end = data_end if end is None else end
+    plot_width = width - 2 * MARGIN
+
+    def x_pixels(timestamps):
+        return MARGIN + _scale(timestamps, start, end, plot_width)
+
+    parts = []
+    top = 20
+    price_time, price_low, price_high = store.view("price", start, end, plot_width)
+    close_time, close = store.line("close", start, end, plot_width)
+    trades = store.trades(start, end)
+    if len(price_time):
+        height = PANEL_HEIGHTS["price"]
+        low, high = float(price_low.min()), float(price_high.max())
+
+        def y_price(values):
+            return top + _scale(values, low, high, height, invert=True)
+
+        band_x = x_pixels(price_time)
+        parts.append(f'<polygon fill="#cfd8e3" stroke="none" points="'
+                     f'{_points(band_x, y_price(price_high))} {_points(band_x[::-1], y_price(price_low)[::-1])}"/>')
+        parts.append(f'<polyline fill="none" stroke="#34495e" stroke-width="1" '
+                     f'points="{_points(x_pixels(close_time), y_price(close))}"/>')
+        if trades is not None:
+            for entry_t, exit_t, entry_p, exit_p, direction in zip(*(trades[k] for k in (
+                    "entry_time", "exit_time", "entry_price", "exit_price", "direction"))):
+                color = "#27ae60" if direction > 0 else "#c0392b"
+                ex, ey = x_pixels(entry_t), y_price(entry_p)
+                xx, xy = x_pixels(exit_t), y_price(exit_p)
+                parts.append(f'<line x1="{ex:.1f}" y1="{ey:.1f}" x2="{xx:.1f}" y2="{xy:.1f}" stroke="{color}" '
+                             f'stroke-opacity="0.5"/><circle cx="{ex:.1f}" cy="{ey:.1f}" r="3" fill="{color}"/>'
+                             f'<circle cx="{xx:.1f}" cy="{xy:.1f}" r="2" fill="none" stroke="{color}"/>')
+        parts.append(_axis_labels(top, height, low, high))
+        top += height + 30
+
+    equity_time, equity = store.line("equity", start, end, plot_width)
+    if len(equity_time):
+        height = PANEL_HEIGHTS["equity"]
+        low, high = float(equity.min()), float(equity.max())
+        parts.append(f'<polyline fill="none" stroke="#2980b9" stroke-width="1.2" points="'
+                     f'{_points(x_pixels(equity_time), top + _scale(equity, low, high, height, invert=True))}"/>')
+        parts.append(_axis_labels(top, height, low, high))
+        top += height + 30
+
+    label = f"{_format_time(start)} – {_format_time(end)}"
+    parts.append(f'<text x="{MARGIN}" y="{top}" font-size="12" fill="#555">{html.escape(label)}</text>')
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{top + 10}" '
+            f'font-family="sans-serif">{"".join(parts)}</svg>')
+
+
+def _axis_labels(top, height, low, high):
+    return (f'<text x="4" y="{top + 10}" font-size="11" fill="#555">{high:.2f}</text>'
+            f'<text x="4" y="{top + height}" font-size="11" fill="#555">{low:.2f}</text>'
+            f'<rect x="{MARGIN}" y="{top}" width="0.5" height="{height}" fill="#999"/>')
+
+
+def _format_time(nanoseconds):
+    return time.strftime("%Y-%m-%d %H:%M", time.gmtime(nanoseconds / 1e9)) + " UTC"
+
+
+def render_html(store, path, ranges=(None,), width=DEFAULT_WIDTH):
+    """
+    Schreibt eine HTML-Datei mit einer Ansicht je Zeitraum (None = gesamter Zeitraum, sonst (start, end) in ns).
+    """
+    figures = [render_svg(store, *(view or (None, None)), width=width) for view in ranges]
+    title = html.escape(store.meta.get("title", ""))
+    with open(path, "w") as f:
+        f.write(f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{title}</title></head>"
+                f"<body><h3 style='font-family:sans-serif'>{title}</h3>{''.join(figures)}</body></html>")
+    return path
+
+
+def render_backtest(backtester, path="backtest_chart.html", directory=None, df_1min=None, ranges=(None,)):
+    """Baut die Ablage eines abgeschlossenen Backtests (Standard: neben der HTML-Datei) und rendert sie."""
+    directory = directory or os.path.splitext(path)[0] + "_data"
+    store = build_backtest_store(backtester, directory, df_1min)
+    return render_html(store, path, ranges)
+
+
+def main(argv=None):
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Kurs, Trades und Kapitalkurve eines Backtests darstellen")
+    parser.add_argument("store", help="Verzeichnis einer Chart-Ablage (build_backtest_store)")
+    parser.add_argument("--output", default="backtest_chart.html")
+    parser.add_argument("--range", nargs=2, action="append", metavar=("START", "ENDE"),
+                        help="Zusätzliche Ansicht, z.B. --range 2024-03-01 2024-03-08 (mehrfach angebbar)")
+    parser.add_argument("--width", type=int, default=DEFAULT_WIDTH)
+    args = parser.parse_args(argv)
+
+    start_time = time.perf_counter()
+    store = ChartStore(args.store)
+    timezone = store.meta.get("timezone", "UTC")
+    ranges = [None] + [(pd.Timestamp(start, tz=timezone).value, pd.Timestamp(end, tz=timezone).value)
+                       for start, end in args.range or []]
+    render_html(store, args.output, ranges, args.width)
+    print(f"🖼️ {args.output} ({len(ranges)} Ansichten, {time.perf_counter() - start_time:.3f} s)")
+
+
+if __name__ == "__main__":
+    main()